@@ -1,47 +1,62 @@
 import json
 import os
+import urllib.error
 import urllib.parse
 import urllib.request
 import psycopg2
-from datetime import datetime, timedelta
-import jwt
+from serializer import fetch_one, loads
+from responses import compress_response, error_response, json_response, options_response
+from ratelimit import client_ip, rate_limit
+from tokens import issue_token, verify_token
+from dbrouter import get_db_connection, get_router
+from resilience import Unavailable, get_breaker, unavailable_response
+
+RATE_LIMITS = {
+    'ip': (60, 2.0),
+    'register': (5, 1 / 60),
+    'login': (10, 1 / 6),
+    'login_email': (5, 1 / 30)
+}
+
+TOKEN_TTL_SECONDS = 30 * 24 * 3600
+YANDEX_TIMEOUT_SECONDS = 5
 
 def handler(event: dict, context) -> dict:
     """API для авторизации через Яндекс ID и регистрации пользователей"""
+    return compress_response(event, route_request(event))
+
+def route_request(event: dict) -> dict:
+    """Маршрутизация запроса к обработчику"""
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return options_response('GET, POST, OPTIONS', 'Content-Type, Authorization, X-Read-Primary-Until')
     
     path = event.get('params', {}).get('path', '')
+    ip = client_ip(event)
+    
+    limited = rate_limit('ip', ip, RATE_LIMITS)
+    if limited:
+        return limited
+    
+    if path != '/yandex/login':
+        try:
+            get_router().check(read_only=path == '/me')
+        except Unavailable as e:
+            return unavailable_response(e)
     
     if path == '/yandex/login':
         return yandex_login(event)
     elif path == '/yandex/callback':
         return yandex_callback(event)
     elif method == 'POST' and path == '/register':
-        return register_user(event)
+        return rate_limit('register', ip, RATE_LIMITS) or register_user(event)
     elif method == 'POST' and path == '/login':
-        return login_user(event)
+        return rate_limit('login', ip, RATE_LIMITS) or login_user(event)
     elif method == 'GET' and path == '/me':
         return get_current_user(event)
     
-    return {
-        'statusCode': 404,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'error': 'Endpoint not found'}),
-        'isBase64Encoded': False
-    }
+    return error_response('Endpoint not found', 404)
 
 def yandex_login(event: dict) -> dict:
     """Перенаправление на Яндекс OAuth"""
@@ -58,12 +73,7 @@ def yandex_login(event: dict) -> dict:
         f'redirect_uri={urllib.parse.quote(redirect_uri)}'
     )
     
-    return {
-        'statusCode': 200,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'auth_url': auth_url}),
-        'isBase64Encoded': False
-    }
+    return json_response({'auth_url': auth_url})
 
 def yandex_callback(event: dict) -> dict:
     """Обработка callback от Яндекс OAuth"""
@@ -88,8 +98,7 @@ def yandex_callback(event: dict) -> dict:
     
     try:
         req = urllib.request.Request(token_url, data=token_data, method='POST')
-        with urllib.request.urlopen(req) as response:
-            token_response = json.loads(response.read().decode())
+        token_response = yandex_request(req)
         
         access_token = token_response.get('access_token')
         
@@ -98,9 +107,7 @@ def yandex_callback(event: dict) -> dict:
             info_url,
             headers={'Authorization': f'OAuth {access_token}'}
         )
-        
-        with urllib.request.urlopen(info_req) as response:
-            user_info = json.loads(response.read().decode())
+        user_info = yandex_request(info_req)
         
         yandex_id = user_info.get('id')
         email = user_info.get('default_email')
@@ -115,8 +122,9 @@ def yandex_callback(event: dict) -> dict:
             (yandex_id,)
         )
         user = cur.fetchone()
+        created = user is None
         
-        if not user:
+        if created:
             cur.execute(
                 f"""INSERT INTO {os.environ.get('MAIN_DB_SCHEMA')}.users 
                 (email, first_name, last_name, yandex_id) 
@@ -131,23 +139,40 @@ def yandex_callback(event: dict) -> dict:
         
         jwt_token = create_jwt_token({'user_id': user[0], 'email': user[1]})
         
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({
-                'token': jwt_token,
-                'user': {'id': user[0], 'email': user[1]}
-            }),
-            'isBase64Encoded': False
-        }
+        response = json_response({
+            'token': jwt_token,
+            'user': {'id': user[0], 'email': user[1]}
+        })
+        return get_router().stick(response, user[0]) if created else response
     
+    except Unavailable as e:
+        return unavailable_response(e)
     except Exception as e:
         return error_response(f'OAuth error: {str(e)}', 500)
 
+def yandex_request(req: urllib.request.Request) -> dict:
+    """JSON-ответ Яндекса через предохранитель yandex; ответы 4xx — ошибка запроса, а не сбой Яндекса"""
+    breaker = get_breaker('yandex')
+    breaker.check()
+    try:
+        with urllib.request.urlopen(req, timeout=YANDEX_TIMEOUT_SECONDS) as response:
+            data = json.loads(response.read().decode())
+    except urllib.error.HTTPError as e:
+        if e.code >= 500:
+            breaker.failure()
+        else:
+            breaker.success()
+        raise
+    except OSError:
+        breaker.failure()
+        raise
+    breaker.success()
+    return data
+
 def register_user(event: dict) -> dict:
     """Регистрация нового пользователя"""
     try:
-        body = json.loads(event.get('body', '{}'))
+        body = loads(event.get('body', '{}'))
         email = body.get('email')
         first_name = body.get('first_name')
         last_name = body.get('last_name')
@@ -183,15 +208,10 @@ def register_user(event: dict) -> dict:
         
         jwt_token = create_jwt_token({'user_id': user[0], 'email': user[1]})
         
-        return {
-            'statusCode': 201,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({
-                'token': jwt_token,
-                'user': {'id': user[0], 'email': user[1]}
-            }),
-            'isBase64Encoded': False
-        }
+        return get_router().stick(json_response({
+            'token': jwt_token,
+            'user': {'id': user[0], 'email': user[1]}
+        }, 201), user[0])
     
     except Exception as e:
         return error_response(str(e), 500)
@@ -199,12 +219,16 @@ def register_user(event: dict) -> dict:
 def login_user(event: dict) -> dict:
     """Вход пользователя по email"""
     try:
-        body = json.loads(event.get('body', '{}'))
+        body = loads(event.get('body', '{}'))
         email = body.get('email')
         
         if not email:
             return error_response('Email is required', 400)
         
+        limited = rate_limit('login_email', str(email).lower(), RATE_LIMITS)
+        if limited:
+            return limited
+        
         conn = get_db_connection()
         cur = conn.cursor()
         
@@ -222,15 +246,10 @@ def login_user(event: dict) -> dict:
         
         jwt_token = create_jwt_token({'user_id': user[0], 'email': user[1]})
         
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({
-                'token': jwt_token,
-                'user': {'id': user[0], 'email': user[1]}
-            }),
-            'isBase64Encoded': False
-        }
+        return json_response({
+            'token': jwt_token,
+            'user': {'id': user[0], 'email': user[1]}
+        })
     
     except Exception as e:
         return error_response(str(e), 500)
@@ -248,7 +267,7 @@ def get_current_user(event: dict) -> dict:
         payload = verify_jwt_token(token)
         user_id = payload.get('user_id')
         
-        conn = get_db_connection()
+        conn = get_db_connection(read_only=not get_router().sticky_request(event), user_id=user_id)
         cur = conn.cursor()
         
         cur.execute(
@@ -257,49 +276,27 @@ def get_current_user(event: dict) -> dict:
             (user_id,)
         )
         
-        user = cur.fetchone()
+        user = fetch_one(cur)
         cur.close()
         conn.close()
         
         if not user:
             return error_response('User not found', 404)
         
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({
-                'id': user[0],
-                'email': user[1],
-                'first_name': user[2],
-                'last_name': user[3],
-                'birth_date': str(user[4]) if user[4] else None
-            }),
-            'isBase64Encoded': False
-        }
+        return json_response(user)
     
+    except Unavailable as e:
+        return unavailable_response(e)
+    except psycopg2.OperationalError:
+        # БД недоступна — это не повод разлогинивать пользователя
+        return error_response('Database is temporarily unavailable', 503)
     except Exception as e:
         return error_response(f'Invalid token: {str(e)}', 401)
 
-def get_db_connection():
-    """Подключение к БД"""
-    return psycopg2.connect(os.environ.get('DATABASE_URL'))
-
 def create_jwt_token(payload: dict) -> str:
     """Создать JWT токен"""
-    secret = os.environ.get('JWT_SECRET', 'volm-secret-key-2024')
-    payload['exp'] = datetime.utcnow() + timedelta(days=30)
-    return jwt.encode(payload, secret, algorithm='HS256')
+    return issue_token(payload, TOKEN_TTL_SECONDS)
 
 def verify_jwt_token(token: str) -> dict:
     """Проверить JWT токен"""
-    secret = os.environ.get('JWT_SECRET', 'volm-secret-key-2024')
-    return jwt.decode(token, secret, algorithms=['HS256'])
-
-def error_response(message: str, status_code: int) -> dict:
-    """Генерация ответа с ошибкой"""
-    return {
-        'statusCode': status_code,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'error': message}),
-        'isBase64Encoded': False
-    }
+    return verify_token(token)
@@ -0,0 +1,60 @@
+# Копия backend/core/serializer.py: правьте оригинал и запускайте tools/vendor_core.py
+"""Сериализация строк БД и ответов в JSON"""
+import json
+from datetime import date, datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    """Приведение дат к ISO 8601 для json"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    def dumps(obj) -> str:
+        """Сериализация в компактный JSON через orjson"""
+        return orjson.dumps(obj, default=_default).decode()
+    
+    loads = orjson.loads
+else:
+    _encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False, default=_default)
+    
+    def dumps(obj) -> str:
+        """Сериализация в компактный JSON через stdlib"""
+        return _encoder.encode(obj)
+    
+    loads = json.loads
+
+
+def row_keys(cursor) -> tuple:
+    """Ключи JSON для текущей формы результата курсора"""
+    return tuple(column[0] for column in cursor.description)
+
+
+def fetch_all(cursor) -> list:
+    """Все строки курсора в виде списка словарей"""
+    keys = row_keys(cursor)
+    return [dict(zip(keys, row)) for row in cursor.fetchall()]
+
+
+def fetch_one(cursor):
+    """Одна строка курсора в виде словаря или None"""
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip(row_keys(cursor), row))
+
+
+def sql_isoformat(column: str) -> str:
+    """SQL-выражение, дающее ту же строку, что datetime.isoformat() для timestamptz"""
+    return (
+        f"""(to_char({column}, 'YYYY-MM-DD"T"HH24:MI:SS')"""
+        f""" || CASE WHEN to_char({column}, 'US') = '000000' THEN '' ELSE to_char({column}, '.US') END"""
+        f""" || to_char({column}, 'TZH:TZM'))"""
+    )
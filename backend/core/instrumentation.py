@@ -0,0 +1,14 @@
+"""Замеры обработки запроса и состояние предохранителей в заголовке Server-Timing"""
+import time
+from resilience import tripped
+
+def server_timing(response: dict, name: str, started: float) -> dict:
+    """Добавить к Server-Timing ответа метрику name: миллисекунды с started (time.perf_counter)
+    
+    Незакрытые предохранители инстанса добавляются как breaker-<зависимость>;desc=open|half_open.
+    """
+    elapsed = (time.perf_counter() - started) * 1000
+    headers = response.setdefault('headers', {})
+    metric = ', '.join([f'{name};dur={elapsed:.2f}'] + [f'breaker-{dependency};desc={state}' for dependency, state in tripped().items()])
+    headers['Server-Timing'] = f"{headers['Server-Timing']}, {metric}" if headers.get('Server-Timing') else metric
+    return response
@@ -0,0 +1,142 @@
+"""Предохранители (circuit breaker) для зависимостей функций: Postgres, Telegram, внешние API
+
+После BREAKER_FAILURES сбоев подряд предохранитель зависимости открывается, и вызовы
+сразу получают Unavailable вместо ожидания таймаута; обработчик отвечает 503 с Retry-After.
+Через BREAKER_RESET_SECONDS пропускается один пробный вызов (поток или задача asyncio,
+занявшие пробу, могут проверять предохранитель повторно), остальные по-прежнему получают Unavailable. Успех пробы
+закрывает предохранитель, сбой открывает его заново; проба без исхода освобождается через
+BREAKER_RESET_SECONDS. Состояние живёт в памяти инстанса.
+"""
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+from responses import error_response
+
+DEFAULT_FAILURES = 5
+DEFAULT_RESET_SECONDS = 15
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class Unavailable(Exception):
+    """Зависимость за открытым предохранителем"""
+    
+    def __init__(self, dependency: str, retry_after: float):
+        super().__init__(f'{dependency} is unavailable')
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+def caller() -> tuple:
+    """Кто делает вызов: поток и, внутри цикла событий, задача asyncio"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return threading.get_ident(), id(task) if task is not None else None
+
+class CircuitBreaker:
+    """Счётчик сбоев подряд одной зависимости"""
+    
+    def __init__(self, name: str, failures: int, reset_seconds: float):
+        self.name = name
+        self.max_failures = failures
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.prober = None
+        self.probe_started = 0.0
+        self.lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        return OPEN if self.retry_after() else HALF_OPEN
+    
+    def retry_after(self) -> float:
+        """Секунды до пробного вызова; 0, если вызывать можно"""
+        opened_at = self.opened_at
+        if opened_at is None:
+            return 0.0
+        return max(0.0, opened_at + self.reset_seconds - time.monotonic())
+    
+    def check(self) -> None:
+        """Unavailable, если предохранитель открыт или пробу уже делает другой поток"""
+        if self.opened_at is None:
+            return
+        with self.lock:
+            retry_after = self.retry_after()
+            if retry_after:
+                raise Unavailable(self.name, retry_after)
+            if self.opened_at is None:
+                return
+            now = time.monotonic()
+            prober = caller()
+            probe_left = self.probe_started + self.reset_seconds - now
+            if self.prober not in (None, prober) and probe_left > 0:
+                raise Unavailable(self.name, probe_left)
+            self.prober = prober
+            self.probe_started = now
+    
+    def success(self) -> None:
+        """Вызов прошёл: сбросить счётчик и закрыть предохранитель"""
+        if self.failures == 0 and self.opened_at is None:
+            return
+        with self.lock:
+            if self.opened_at is not None:
+                print(f'Circuit breaker {self.name}: closed')
+            self.failures = 0
+            self.opened_at = None
+            self.prober = None
+    
+    def failure(self) -> None:
+        """Вызов не прошёл; открыть предохранитель после max_failures сбоев подряд или неудачной пробы"""
+        with self.lock:
+            self.failures += 1
+            self.prober = None
+            # Сбои вызовов, начатых до открытия, не продлевают паузу; неудачная проба — продлевает.
+            if self.failures >= self.max_failures and (self.opened_at is None or not self.retry_after()):
+                print(f'Circuit breaker {self.name}: open after {self.failures} failures')
+                self.opened_at = time.monotonic()
+    
+    @contextmanager
+    def guard(self, failures: tuple = (Exception,)):
+        """Выполнить блок через предохранитель; исключения failures считаются сбоями зависимости"""
+        self.check()
+        try:
+            yield
+        except failures:
+            self.failure()
+            raise
+        self.success()
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Предохранитель зависимости name, общий для инстанса"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    name,
+                    int(os.environ.get('BREAKER_FAILURES') or DEFAULT_FAILURES),
+                    float(os.environ.get('BREAKER_RESET_SECONDS') or DEFAULT_RESET_SECONDS)
+                )
+                _breakers[name] = breaker
+    return breaker
+
+def tripped() -> dict:
+    """Состояния незакрытых предохранителей инстанса: {имя: 'open' | 'half_open'}"""
+    return {name: breaker.state for name, breaker in list(_breakers.items()) if breaker.opened_at is not None}
+
+def unavailable_response(error: Unavailable) -> dict:
+    """503 с Retry-After для вызова, отклонённого предохранителем"""
+    response = error_response(f'{error.dependency} is temporarily unavailable', 503)
+    response['headers']['Retry-After'] = str(max(1, round(error.retry_after)))
+    return response
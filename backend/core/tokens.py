@@ -0,0 +1,158 @@
+"""Выпуск и проверка JWT (HS256) с несколькими активными ключами
+
+Ключи задаются в JWT_KEYS как "kid:secret,kid:secret": первым подписываются новые токены,
+остальные только проверяются, что позволяет менять ключ без разлогинивания. JWT_SECRET
+остаётся ключом для токенов без kid. Проверка не обращается к БД: HMAC считается
+заранее подготовленным верификатором ключа, а уже проверенные токены берутся из кеша
+инстанса до истечения exp.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+ALGORITHM = 'HS256'
+MIN_SECRET_BYTES = 32
+MAX_CACHED_TOKENS = 10000
+
+class InvalidToken(Exception):
+    """Токен не прошёл проверку"""
+
+class KeyRing:
+    """Ключи подписи и по одному готовому HMAC-верификатору на kid"""
+    
+    def __init__(self, keys: dict, signing_kid):
+        for kid, secret in keys.items():
+            if len(secret.encode('utf-8')) < MIN_SECRET_BYTES:
+                raise ValueError(f'JWT key {kid or "JWT_SECRET"} is shorter than {MIN_SECRET_BYTES} bytes')
+        self.keys = keys
+        self.signing_kid = signing_kid
+        self.verifiers = {kid: hmac.new(secret.encode('utf-8'), digestmod=hashlib.sha256) for kid, secret in keys.items()}
+        self.headers = {}
+        self.verified = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def sign(self, payload: dict) -> str:
+        """Подписать payload активным ключом"""
+        if not self.keys:
+            raise ValueError('JWT_KEYS or JWT_SECRET must be configured')
+        # PyJWT нужен только для выпуска: импорт здесь не удлиняет холодный старт проверки.
+        import jwt
+        headers = {'kid': self.signing_kid} if self.signing_kid else None
+        return jwt.encode(payload, self.keys[self.signing_kid], algorithm=ALGORITHM, headers=headers)
+    
+    def verify(self, token: str) -> dict:
+        """Claims проверенного токена; InvalidToken, если подпись, алгоритм или exp не подходят"""
+        now = time.time()
+        with self.lock:
+            cached = self.verified.get(token)
+        if cached is not None and cached[0] > now:
+            return dict(cached[1])
+        
+        try:
+            header, payload, signature = token.split('.')
+            kid = self.header_kid(header)
+            verifier = self.verifiers.get(kid)
+            if verifier is None:
+                raise InvalidToken(f'Unknown key id: {kid}')
+            mac = verifier.copy()
+            mac.update(f'{header}.{payload}'.encode('ascii'))
+            if not hmac.compare_digest(mac.digest(), b64decode(signature)):
+                raise InvalidToken('Signature verification failed')
+            claims = _loads(b64decode(payload))
+        except (ValueError, TypeError, UnicodeError) as e:
+            raise InvalidToken(f'Malformed token: {e}')
+        
+        if not isinstance(claims, dict):
+            raise InvalidToken('Malformed token: payload is not an object')
+        exp = claims.get('exp')
+        if not isinstance(exp, (int, float)) or exp <= now:
+            raise InvalidToken('Token has expired' if isinstance(exp, (int, float)) else 'Token has no expiration')
+        nbf = claims.get('nbf')
+        if isinstance(nbf, (int, float)) and nbf > now:
+            raise InvalidToken('Token is not yet valid')
+        
+        with self.lock:
+            self.verified[token] = (exp, claims)
+            if len(self.verified) > MAX_CACHED_TOKENS:
+                self.verified.popitem(last=False)
+        return dict(claims)
+    
+    def header_kid(self, header: str):
+        """kid из заголовка токена; заголовки повторяются, поэтому разбор кешируется"""
+        kid = self.headers.get(header, self)
+        if kid is not self:
+            return kid
+        parsed = _loads(b64decode(header))
+        if not isinstance(parsed, dict) or parsed.get('alg') != ALGORITHM:
+            raise InvalidToken('Unsupported algorithm')
+        kid = parsed.get('kid')
+        if len(self.headers) < MAX_CACHED_TOKENS:
+            self.headers[header] = kid
+        return kid
+
+def b64decode(segment: str) -> bytes:
+    """base64url без выравнивания, как в JWT"""
+    return base64.urlsafe_b64decode(segment + '=' * (-len(segment) % 4))
+
+def parse_keys(value: str) -> list:
+    """Пары (kid, secret) из строки JWT_KEYS"""
+    keys = []
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        kid, sep, secret = item.partition(':')
+        if not sep or not kid or not secret:
+            raise ValueError('JWT_KEYS must look like "kid:secret,kid:secret"')
+        keys.append((kid, secret))
+    return keys
+
+_keyring = None
+_keyring_source = None
+
+def get_keyring() -> KeyRing:
+    """Ключи инстанса; пересоздаются, только если поменялись переменные окружения"""
+    global _keyring, _keyring_source
+    source = (os.environ.get('JWT_KEYS') or '', os.environ.get('JWT_SECRET') or '')
+    if _keyring is None or source != _keyring_source:
+        pairs = parse_keys(source[0])
+        keys = dict(pairs)
+        if source[1]:
+            keys[None] = source[1]
+        _keyring = KeyRing(keys, pairs[0][0] if pairs else None)
+        _keyring_source = source
+    return _keyring
+
+def issue_token(claims: dict, expires_in: int) -> str:
+    """Подписанный токен с claims, iat и exp через expires_in секунд"""
+    now = int(time.time())
+    return get_keyring().sign({**claims, 'iat': now, 'exp': now + expires_in})
+
+def verify_token(token: str) -> dict:
+    """Claims валидного токена или InvalidToken"""
+    try:
+        keyring = get_keyring()
+    except ValueError as e:
+        raise InvalidToken(str(e))
+    return keyring.verify(token)
+
+def bearer_user_id(headers: dict):
+    """user_id из заголовка X-Authorization: Bearer или None"""
+    auth_header = (headers or {}).get('X-Authorization', '')
+    if not auth_header.startswith('Bearer '):
+        return None
+    try:
+        return verify_token(auth_header[len('Bearer '):]).get('user_id')
+    except InvalidToken:
+        return None
@@ -0,0 +1,261 @@
+# Копия backend/core/dbrouter.py: правьте оригинал и запускайте tools/vendor_core.py
+"""Подключения к БД: пулы инстанса, чтения на реплики DATABASE_READ_URL, записи на DATABASE_URL
+
+close() возвращает подключение в пул инстанса вместо закрытия, поэтому обработчики
+по-прежнему открывают и закрывают подключение на запрос. Реплики отстают от основной БД:
+пользователь, который только что писал, ещё DB_STICKY_SECONDS читает с основной, чтобы
+увидеть свои изменения. Окно помнит инстанс, где прошла запись, а клиент получает его конец
+в заголовке X-Read-Primary-Until (мс Unix-времени) и присылает обратно с чтениями —
+так окно соблюдает и любой другой инстанс (sticky_request).
+Без DATABASE_READ_URL все запросы идут на DATABASE_URL, как раньше.
+
+Подключение ограничено DB_CONNECT_TIMEOUT_SECONDS, запрос — DB_STATEMENT_TIMEOUT_MS
+(statement_timeout сессии). Ошибки подключения и запросов (OperationalError) считает
+предохранитель своей БД: postgres у основной, postgres-replica-N у реплик (см. resilience).
+Отмена запроса по statement_timeout сбоем не считается: сервер ответил, медленен сам запрос.
+"""
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+import psycopg2
+import psycopg2.errors
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, cursor as BaseCursor
+from resilience import Unavailable, get_breaker
+from responses import get_header
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_STICKY_SECONDS = 5
+MAX_IDLE_SECONDS = 60
+MAX_STICKY_USERS = 10000
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 3
+DEFAULT_STATEMENT_TIMEOUT_MS = 10000
+STICKY_HEADER = 'X-Read-Primary-Until'
+
+def read_urls() -> list:
+    """Адреса реплик из DATABASE_READ_URL, через запятую"""
+    return [url.strip() for url in (os.environ.get('DATABASE_READ_URL') or '').split(',') if url.strip()]
+
+def connect_timeout() -> int:
+    """Таймаут подключения в секундах"""
+    return int(os.environ.get('DB_CONNECT_TIMEOUT_SECONDS') or DEFAULT_CONNECT_TIMEOUT_SECONDS)
+
+def statement_timeout_ms() -> int:
+    """statement_timeout сессии в миллисекундах; 0 — без ограничения"""
+    return int(os.environ.get('DB_STATEMENT_TIMEOUT_MS') or DEFAULT_STATEMENT_TIMEOUT_MS)
+
+def guarded_cursor(breaker):
+    """Класс курсора, который сообщает предохранителю об исходе каждого запроса"""
+    
+    class GuardedCursor(BaseCursor):
+        def execute(self, query, vars=None):
+            try:
+                result = super().execute(query, vars)
+            except psycopg2.errors.QueryCanceled:
+                # Сервер ответил и отменил медленный запрос по statement_timeout: БД доступна.
+                breaker.success()
+                raise
+            except psycopg2.OperationalError:
+                breaker.failure()
+                raise
+            breaker.success()
+            return result
+    
+    return GuardedCursor
+
+class PooledConnection:
+    """Подключение из пула; всё, кроме close(), уходит в подключение psycopg2"""
+    
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+    
+    @property
+    def closed(self) -> bool:
+        return self._conn is None or bool(self._conn.closed)
+    
+    def close(self) -> None:
+        """Вернуть подключение в пул; повторный вызов ничего не делает"""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.put(conn)
+
+class ConnectionPool:
+    """Простаивающие подключения к одному адресу, не больше size
+    
+    Занятых подключений может быть сколько угодно: сверх size они открываются и закрываются
+    на запрос. Подключение, простоявшее дольше MAX_IDLE_SECONDS, не переиспользуется —
+    сервер или балансировщик мог его уже закрыть.
+    """
+    
+    def __init__(self, dsn: str, size: int, readonly: bool = False, name: str = 'postgres'):
+        self.dsn = dsn
+        self.size = size
+        self.readonly = readonly
+        self.breaker = get_breaker(name)
+        self.cursor_class = guarded_cursor(self.breaker)
+        self.idle = []
+        self.lock = threading.Lock()
+    
+    def get(self) -> PooledConnection:
+        """Подключение из пула или новое; Unavailable, пока предохранитель БД открыт"""
+        self.breaker.check()
+        now = time.monotonic()
+        conn = None
+        with self.lock:
+            while self.idle and conn is None:
+                returned_at, candidate = self.idle.pop()
+                if now - returned_at < MAX_IDLE_SECONDS and not candidate.closed:
+                    conn = candidate
+                else:
+                    candidate.close()
+        if conn is None:
+            conn = self.connect()
+        return PooledConnection(self, conn)
+    
+    def connect(self):
+        """Новое подключение с таймаутами"""
+        options = {'connect_timeout': connect_timeout()}
+        if statement_timeout_ms():
+            options['options'] = f'-c statement_timeout={statement_timeout_ms()}'
+        try:
+            conn = psycopg2.connect(self.dsn, **options)
+        except psycopg2.OperationalError:
+            self.breaker.failure()
+            raise
+        self.breaker.success()
+        conn.cursor_factory = self.cursor_class
+        if self.readonly:
+            conn.set_session(readonly=True)
+        return conn
+    
+    def put(self, conn) -> None:
+        """Откатить незавершённую транзакцию и оставить подключение в пуле, если есть место"""
+        if conn.closed:
+            return
+        if conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                conn.close()
+                return
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append((time.monotonic(), conn))
+                return
+        conn.close()
+
+class RecentWriters:
+    """user_id → момент, до которого его чтения идут на основную БД"""
+    
+    def __init__(self, window: float, max_users: int = MAX_STICKY_USERS):
+        self.window = window
+        self.max_users = max_users
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def wrote(self, user_id) -> None:
+        """Пользователь только что изменил данные"""
+        if user_id is None or self.window <= 0:
+            return
+        with self.lock:
+            self.entries[user_id] = time.monotonic() + self.window
+            self.entries.move_to_end(user_id)
+            if len(self.entries) > self.max_users:
+                self.entries.popitem(last=False)
+    
+    def sticky(self, user_id) -> bool:
+        """Читать ли пользователю с основной БД"""
+        with self.lock:
+            until = self.entries.get(user_id)
+            if until is None:
+                return False
+            if until < time.monotonic():
+                del self.entries[user_id]
+                return False
+            return True
+
+class Router:
+    """Основная БД для записей, реплики по кругу для чтений"""
+    
+    def __init__(self, primary_url: str, replica_urls: list, pool_size: int, sticky_seconds: float):
+        self.primary = ConnectionPool(primary_url, pool_size)
+        self.replicas = [ConnectionPool(url, pool_size, readonly=True, name=f'postgres-replica-{i}')
+                         for i, url in enumerate(replica_urls, start=1)]
+        self.next_replica = itertools.cycle(self.replicas)
+        self.writers = RecentWriters(sticky_seconds)
+    
+    def connection(self, read_only: bool = False, user_id=None):
+        """Подключение для запроса; недоступная реплика пропускается, без реплик чтение идёт на основную БД"""
+        if read_only and self.replicas and not self.sticky(user_id):
+            for _ in self.replicas:
+                try:
+                    return next(self.next_replica).get()
+                except (psycopg2.OperationalError, Unavailable):
+                    pass
+        return self.primary.get()
+    
+    def check(self, read_only: bool = False) -> None:
+        """Unavailable, если основная БД, а для чтений и все реплики, за открытыми предохранителями"""
+        pools = [self.primary, *self.replicas] if read_only else [self.primary]
+        waits = [pool.breaker.retry_after() for pool in pools]
+        if all(waits):
+            raise Unavailable(self.primary.breaker.name, min(waits))
+    
+    def sticky(self, user_id) -> bool:
+        """Пользователь недавно писал, и его чтения идут на основную БД"""
+        return self.writers.sticky(user_id)
+    
+    def wrote(self, user_id) -> None:
+        """Следующие DB_STICKY_SECONDS чтения пользователя идут на основную БД"""
+        self.writers.wrote(user_id)
+    
+    def stick(self, response: dict, user_id) -> dict:
+        """Запомнить запись пользователя и отдать клиенту конец окна в X-Read-Primary-Until"""
+        self.wrote(user_id)
+        if self.replicas and self.writers.window > 0:
+            until = time.time() + self.writers.window
+            response.setdefault('headers', {})[STICKY_HEADER] = str(int(until * 1000))
+        return response
+    
+    def sticky_request(self, event: dict) -> bool:
+        """Клиент прислал X-Read-Primary-Until из ответа на свою запись, и окно ещё не кончилось
+        
+        Значение дальше окна от текущего момента не принимается: заголовок задаёт клиент.
+        """
+        try:
+            until = int(get_header(event, STICKY_HEADER)) / 1000
+        except ValueError:
+            return False
+        now = time.time()
+        return now < until <= now + self.writers.window + 1
+
+_router = None
+_router_source = None
+
+def get_router() -> Router:
+    """Маршрутизатор инстанса; пересоздаётся, только если поменялись переменные окружения"""
+    global _router, _router_source
+    source = tuple(os.environ.get(name) or '' for name in ('DATABASE_URL', 'DATABASE_READ_URL', 'DB_POOL_SIZE', 'DB_STICKY_SECONDS'))
+    if _router is None or source != _router_source:
+        _router = Router(
+            os.environ.get('DATABASE_URL'),
+            read_urls(),
+            int(source[2] or DEFAULT_POOL_SIZE),
+            float(source[3] or DEFAULT_STICKY_SECONDS)
+        )
+        _router_source = source
+    return _router
+
+def get_db_connection(read_only: bool = False, user_id: int = None):
+    """Подключение к БД из пула инстанса; чтения — к реплике, если user_id недавно не писал"""
+    return get_router().connection(read_only, user_id)
+
+def get_schema() -> str:
+    """Префикс схемы MAIN_DB_SCHEMA для запросов, например 'public.'"""
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+    return f'{schema}.' if schema else ''
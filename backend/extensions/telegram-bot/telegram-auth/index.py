@@ -7,30 +7,37 @@ Flow:
 2. Bot generates unique auth link and sends to user
 3. User clicks link -> frontend exchanges token for JWT
 4. Refresh tokens stored hashed (SHA256) in DB
+
+Refresh tokens rotate on every use. All tokens descending from one login form a
+family; presenting an already rotated token revokes the whole family. Revoked
+families are kept in an in-memory set synced incrementally from the DB, so a
+refresh costs a single indexed UPDATE on refresh_tokens.
 """
 
 import json
 import os
 import hashlib
 import secrets
+import time
 from datetime import datetime, timezone, timedelta
 from typing import Optional
-import psycopg2
-import jwt
+from dbrouter import get_db_connection, get_schema
+from resilience import Unavailable, unavailable_response
+from responses import json_response, options_response
+from tokens import get_keyring, issue_token
 
 
 # =============================================================================
 # CONFIGURATION
 # =============================================================================
 
-def get_db_connection():
-    return psycopg2.connect(os.environ["DATABASE_URL"])
-
-
-def get_schema() -> str:
-    """Get database schema prefix."""
-    schema = os.environ.get("MAIN_DB_SCHEMA", "public")
-    return f"{schema}." if schema else ""
+ACCESS_TOKEN_SECONDS = 900
+REFRESH_TOKEN_DAYS = 30
+DEFAULT_REUSE_GRACE_SECONDS = 10
+DEFAULT_REVOCATION_SYNC_SECONDS = 5
+REVOCATION_RELOAD_SECONDS = 3600
+# Revocations committed late can carry a revoked_at slightly older than the watermark.
+REVOCATION_SYNC_OVERLAP = timedelta(minutes=1)
 
 
 def get_env(key: str) -> str:
@@ -52,13 +59,12 @@ def generate_token(length: int = 32) -> str:
     return secrets.token_urlsafe(length)
 
 
-def create_jwt(user_id: int, secret: str, expires_in: int = 900) -> str:
-    payload = {
-        "user_id": user_id,
-        "exp": datetime.now(timezone.utc) + timedelta(seconds=expires_in),
-        "iat": datetime.now(timezone.utc),
-    }
-    return jwt.encode(payload, secret, algorithm="HS256")
+def generate_family_id() -> str:
+    return secrets.token_hex(16)
+
+
+def create_jwt(user_id: int, expires_in: int = ACCESS_TOKEN_SECONDS) -> str:
+    return issue_token({"user_id": user_id}, expires_in)
 
 
 # =============================================================================
@@ -188,27 +194,43 @@ def create_or_update_user(
     }
 
 
-def save_refresh_token(cursor, user_id: int, token_hash: str, expires_at: datetime) -> None:
+def save_refresh_token(cursor, user_id: int, token_hash: str, expires_at: datetime, family_id: str) -> None:
     """Save hashed refresh token to DB."""
     schema = get_schema()
     cursor.execute(f"""
-        INSERT INTO {schema}refresh_tokens (user_id, token_hash, expires_at)
-        VALUES (%s, %s, %s)
-    """, (user_id, token_hash, expires_at))
+        INSERT INTO {schema}refresh_tokens (user_id, token_hash, expires_at, family_id)
+        VALUES (%s, %s, %s, %s)
+    """, (user_id, token_hash, expires_at, family_id))
+
+
+def rotate_refresh_token(cursor, token_hash: str) -> Optional[dict]:
+    """Mark a live, not yet rotated refresh token as used. None if it is unknown, expired or rotated."""
+    schema = get_schema()
+    cursor.execute(f"""
+        UPDATE {schema}refresh_tokens
+        SET rotated_at = NOW()
+        WHERE token_hash = %s AND rotated_at IS NULL AND expires_at > NOW()
+        RETURNING user_id, family_id
+    """, (token_hash,))
+
+    row = cursor.fetchone()
+    if row:
+        return {"user_id": row[0], "family_id": row[1]}
+    return None
 
 
 def find_refresh_token(cursor, token_hash: str) -> Optional[dict]:
-    """Find refresh token by hash."""
+    """Find refresh token by hash, including rotated ones."""
     schema = get_schema()
     cursor.execute(f"""
-        SELECT user_id, expires_at
+        SELECT user_id, family_id, EXTRACT(EPOCH FROM NOW() - rotated_at)::float8
         FROM {schema}refresh_tokens
         WHERE token_hash = %s AND expires_at > NOW()
     """, (token_hash,))
 
     row = cursor.fetchone()
     if row:
-        return {"user_id": row[0], "expires_at": row[1]}
+        return {"user_id": row[0], "family_id": row[1], "rotated_seconds_ago": row[2]}
     return None
 
 
@@ -238,39 +260,124 @@ def get_user_by_id(cursor, user_id: int) -> Optional[dict]:
     return None
 
 
+def revoke_family(cursor, family_id: str, user_id: int, reason: str) -> None:
+    """Revoke one token family."""
+    schema = get_schema()
+    cursor.execute(f"""
+        INSERT INTO {schema}revoked_token_families (family_id, user_id, reason, expires_at)
+        VALUES (%s, %s, %s, NOW() + %s * INTERVAL '1 day')
+        ON CONFLICT (family_id) DO NOTHING
+    """, (family_id, user_id, reason, REFRESH_TOKEN_DAYS + 1))
+
+
+def revoke_user_families(cursor, user_id: int, reason: str) -> list:
+    """Revoke every live token family of a user in one statement."""
+    schema = get_schema()
+    cursor.execute(f"""
+        INSERT INTO {schema}revoked_token_families (family_id, user_id, reason, expires_at)
+        SELECT DISTINCT family_id, user_id, %s, NOW() + %s * INTERVAL '1 day'
+        FROM {schema}refresh_tokens
+        WHERE user_id = %s AND family_id IS NOT NULL AND expires_at > NOW()
+        ON CONFLICT (family_id) DO NOTHING
+        RETURNING family_id
+    """, (reason, REFRESH_TOKEN_DAYS + 1, user_id))
+    families = [row[0] for row in cursor.fetchall()]
+
+    # Tokens issued before families existed cannot be revoked by family.
+    cursor.execute(
+        f"DELETE FROM {schema}refresh_tokens WHERE user_id = %s AND family_id IS NULL",
+        (user_id,),
+    )
+    return families
+
+
+def load_revoked_families(cursor, since: Optional[datetime]) -> list:
+    """Unexpired revoked families, optionally only those revoked after `since`."""
+    schema = get_schema()
+    if since is None:
+        cursor.execute(f"""
+            SELECT family_id, revoked_at
+            FROM {schema}revoked_token_families
+            WHERE expires_at > NOW()
+        """)
+    else:
+        cursor.execute(f"""
+            SELECT family_id, revoked_at
+            FROM {schema}revoked_token_families
+            WHERE revoked_at > %s
+        """, (since,))
+    return cursor.fetchall()
+
+
 def cleanup_expired_refresh_tokens(cursor) -> None:
-    """Remove expired refresh tokens."""
+    """Remove expired refresh tokens and revocations that outlived them."""
     schema = get_schema()
     cursor.execute(f"DELETE FROM {schema}refresh_tokens WHERE expires_at < NOW()")
+    cursor.execute(f"DELETE FROM {schema}revoked_token_families WHERE expires_at < NOW()")
 
 
 # =============================================================================
-# CORS HELPERS
+# REVOKED FAMILIES CACHE
 # =============================================================================
 
-def get_cors_headers() -> dict:
-    allowed_origins = os.environ.get("ALLOWED_ORIGINS", "*")
-    return {
-        "Access-Control-Allow-Origin": allowed_origins,
-        "Access-Control-Allow-Methods": "POST, OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type",
-    }
+class RevokedFamilies:
+    """
+    Per-instance set of revoked token families.
 
+    Loaded in full on first use and every REVOCATION_RELOAD_SECONDS (dropping expired
+    entries), otherwise topped up with revocations newer than the last one seen at
+    most every REVOCATION_SYNC_SECONDS. Revocations made by this instance apply at once;
+    those made elsewhere are picked up within the sync interval.
+    """
 
-def cors_response(status: int, body: dict) -> dict:
-    return {
-        "statusCode": status,
-        "headers": {**get_cors_headers(), "Content-Type": "application/json"},
-        "body": json.dumps(body),
-    }
+    def __init__(self, sync_seconds: float):
+        self.sync_seconds = sync_seconds
+        self.families = set()
+        self.watermark = None
+        self.loaded_at = 0.0
+        self.synced_at = 0.0
+
+    def sync(self, cursor) -> None:
+        now = time.monotonic()
+        if self.watermark is None or now - self.loaded_at > REVOCATION_RELOAD_SECONDS:
+            rows = load_revoked_families(cursor, None)
+            self.families = {row[0] for row in rows}
+            self.watermark = datetime.now(timezone.utc)
+            self.loaded_at = now
+        elif now - self.synced_at >= self.sync_seconds:
+            rows = load_revoked_families(cursor, self.watermark - REVOCATION_SYNC_OVERLAP)
+            self.families.update(row[0] for row in rows)
+        else:
+            return
+        self.synced_at = now
+        if rows:
+            self.watermark = max(self.watermark, max(row[1] for row in rows))
 
+    def add(self, family_id: str) -> None:
+        self.families.add(family_id)
 
-def options_response() -> dict:
-    return {
-        "statusCode": 204,
-        "headers": get_cors_headers(),
-        "body": "",
-    }
+    def __contains__(self, family_id: str) -> bool:
+        return family_id in self.families
+
+
+_revoked_families = None
+
+
+def get_revoked_families() -> RevokedFamilies:
+    """Revoked families cache of this instance."""
+    global _revoked_families
+    if _revoked_families is None:
+        sync_seconds = float(os.environ.get("REVOCATION_SYNC_SECONDS") or DEFAULT_REVOCATION_SYNC_SECONDS)
+        _revoked_families = RevokedFamilies(sync_seconds)
+    return _revoked_families
+
+
+def issue_refresh_token(cursor, user_id: int, family_id: str) -> str:
+    """Create a new refresh token in the given family and return it in plain text."""
+    refresh_token = generate_token(48)
+    refresh_expires = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_DAYS)
+    save_refresh_token(cursor, user_id, hash_token(refresh_token), refresh_expires, family_id)
+    return refresh_token
 
 
 # =============================================================================
@@ -285,12 +392,12 @@ def handle_callback(cursor, body: dict) -> dict:
     """
     token = body.get("token")
     if not token:
-        return cors_response(400, {"error": "Missing token"})
+        return json_response({"error": "Missing token"}, 400)
 
     token_data = get_auth_token(cursor, token)
 
     if not token_data:
-        return cors_response(404, {"error": "Token not found"})
+        return json_response({"error": "Token not found"}, 404)
 
     # Check if expired (handle both naive and aware datetime from DB)
     expires_at = token_data["expires_at"]
@@ -299,20 +406,18 @@ def handle_callback(cursor, body: dict) -> dict:
     if expires_at.tzinfo is None:
         expires_at = expires_at.replace(tzinfo=timezone.utc)
     if expires_at < now:
-        return cors_response(410, {"error": "Token expired"})
+        return json_response({"error": "Token expired"}, 410)
 
     # Check if already used
     if token_data["used"]:
-        return cors_response(410, {"error": "Token already used"})
+        return json_response({"error": "Token already used"}, 410)
 
     # Check if user data exists
     if not token_data["telegram_id"]:
-        return cors_response(400, {"error": "Token not authenticated"})
+        return json_response({"error": "Token not authenticated"}, 400)
 
-    # Get JWT secret
-    jwt_secret = get_env("JWT_SECRET")
-    if len(jwt_secret) < 32:
-        return cors_response(500, {"error": "Server configuration error"})
+    # Fail on missing or weak signing keys before touching the user
+    get_keyring()
 
     # Create or update user
     user = create_or_update_user(
@@ -328,17 +433,13 @@ def handle_callback(cursor, body: dict) -> dict:
     mark_token_used(cursor, token)
 
     # Generate tokens
-    access_token = create_jwt(user["id"], jwt_secret)
-    refresh_token = generate_token(48)
-    refresh_token_hash = hash_token(refresh_token)
-    refresh_expires = datetime.now(timezone.utc) + timedelta(days=30)
+    access_token = create_jwt(user["id"])
+    refresh_token = issue_refresh_token(cursor, user["id"], generate_family_id())
 
-    save_refresh_token(cursor, user["id"], refresh_token_hash, refresh_expires)
-
-    return cors_response(200, {
+    return json_response({
         "access_token": access_token,
         "refresh_token": refresh_token,
-        "expires_in": 900,
+        "expires_in": ACCESS_TOKEN_SECONDS,
         "user": user,
     })
 
@@ -346,44 +447,105 @@ def handle_callback(cursor, body: dict) -> dict:
 def handle_refresh(cursor, body: dict) -> dict:
     """
     POST ?action=refresh
-    Refresh access token using refresh token.
+    Exchange refresh token for a new access token and a new refresh token.
     """
     refresh_token = body.get("refresh_token")
     if not refresh_token:
-        return cors_response(400, {"error": "Missing refresh_token"})
+        return json_response({"error": "Missing refresh_token"}, 400)
 
-    jwt_secret = get_env("JWT_SECRET")
+    get_keyring()
     token_hash = hash_token(refresh_token)
+    revoked = get_revoked_families()
+    revoked.sync(cursor)
 
-    token_data = find_refresh_token(cursor, token_hash)
+    token_data = rotate_refresh_token(cursor, token_hash)
     if not token_data:
-        return cors_response(401, {"error": "Invalid or expired refresh token"})
+        return reject_refresh_token(cursor, token_hash, revoked)
+
+    # Tokens issued before families existed start a family on first rotation
+    family_id = token_data["family_id"] or generate_family_id()
+    if family_id in revoked:
+        return json_response({"error": "Refresh token revoked"}, 401)
 
     user = get_user_by_id(cursor, token_data["user_id"])
     if not user:
-        return cors_response(401, {"error": "User not found"})
+        return json_response({"error": "User not found"}, 401)
 
-    # Generate new access token
-    access_token = create_jwt(user["id"], jwt_secret)
+    # Generate new access token and the next refresh token of the family
+    access_token = create_jwt(user["id"])
+    new_refresh_token = issue_refresh_token(cursor, user["id"], family_id)
 
-    return cors_response(200, {
+    return json_response({
         "access_token": access_token,
-        "expires_in": 900,
+        "refresh_token": new_refresh_token,
+        "expires_in": ACCESS_TOKEN_SECONDS,
         "user": user,
     })
 
 
+def reject_refresh_token(cursor, token_hash: str, revoked: RevokedFamilies) -> dict:
+    """
+    Answer a refresh with a token that could not be rotated.
+    An already rotated token is a reuse: its family is revoked (for a legacy token
+    without a family, every family of the user), unless the rotation happened within
+    the grace period (two tabs refreshing at once).
+    """
+    token_data = find_refresh_token(cursor, token_hash)
+    if not token_data or token_data["rotated_seconds_ago"] is None:
+        return json_response({"error": "Invalid or expired refresh token"}, 401)
+
+    family_id = token_data["family_id"]
+    grace = float(os.environ.get("REFRESH_REUSE_GRACE_SECONDS") or DEFAULT_REUSE_GRACE_SECONDS)
+    if token_data["rotated_seconds_ago"] <= grace and family_id not in revoked:
+        return json_response({"error": "Refresh token already rotated"}, 409)
+
+    if family_id is None:
+        # A token issued before families existed: its rotation started a new family
+        # we cannot trace back to it, so every session of the user is revoked.
+        for user_family in revoke_user_families(cursor, token_data["user_id"], "reuse"):
+            revoked.add(user_family)
+        print(f"Refresh token reuse detected: user {token_data['user_id']}, legacy token, all sessions revoked")
+    elif family_id not in revoked:
+        revoke_family(cursor, family_id, token_data["user_id"], "reuse")
+        revoked.add(family_id)
+        print(f"Refresh token reuse detected: user {token_data['user_id']}, family {family_id}")
+    return json_response({"error": "Refresh token reuse detected"}, 401)
+
+
 def handle_logout(cursor, body: dict) -> dict:
     """
     POST ?action=logout
-    Invalidate refresh token.
+    Revoke the refresh token's family. With "all": true revoke every session of the user.
     """
     refresh_token = body.get("refresh_token")
-    if refresh_token:
-        token_hash = hash_token(refresh_token)
+    if not refresh_token:
+        return json_response({"success": True})
+
+    token_hash = hash_token(refresh_token)
+    token_data = find_refresh_token(cursor, token_hash)
+    if not token_data:
+        return json_response({"success": True})
+
+    revoked = get_revoked_families()
+    family_id = token_data["family_id"]
+
+    if body.get("all"):
+        # Only a current token may end every session of its user
+        revoked.sync(cursor)
+        if token_data["rotated_seconds_ago"] is not None or family_id in revoked:
+            return json_response({"error": "Invalid or expired refresh token"}, 401)
+        families = revoke_user_families(cursor, token_data["user_id"], "logout_all")
+    elif family_id:
+        revoke_family(cursor, family_id, token_data["user_id"], "logout")
+        families = [family_id]
+    else:
         delete_refresh_token(cursor, token_hash)
+        families = []
+
+    for family in families:
+        revoked.add(family)
 
-    return cors_response(200, {"success": True})
+    return json_response({"success": True})
 
 
 # =============================================================================
@@ -396,7 +558,7 @@ def handler(event, context):
 
     # Handle CORS preflight
     if method == "OPTIONS":
-        return options_response()
+        return options_response("POST, OPTIONS", "Content-Type", 204)
 
     # Parse query params
     params = event.get("queryStringParameters") or {}
@@ -409,7 +571,7 @@ def handler(event, context):
         try:
             body = json.loads(raw_body) if raw_body else {}
         except json.JSONDecodeError:
-            return cors_response(400, {"error": "Invalid JSON"})
+            return json_response({"error": "Invalid JSON"}, 400)
 
     conn = None
     try:
@@ -428,18 +590,20 @@ def handler(event, context):
         elif action == "logout" and method == "POST":
             response = handle_logout(cursor, body)
         else:
-            response = cors_response(400, {"error": f"Unknown action: {action}"})
+            response = json_response({"error": f"Unknown action: {action}"}, 400)
 
         conn.commit()
         return response
 
+    except Unavailable as e:
+        return unavailable_response(e)
     except ValueError as e:
-        return cors_response(500, {"error": "Server configuration error"})
+        return json_response({"error": "Server configuration error"}, 500)
     except Exception as e:
         if conn:
             conn.rollback()
         print(f"Error: {e}")
-        return cors_response(500, {"error": "Internal server error"})
+        return json_response({"error": "Internal server error"}, 500)
     finally:
         if conn:
             conn.close()
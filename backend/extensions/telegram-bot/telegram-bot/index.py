@@ -3,19 +3,41 @@ Telegram Bot Function
 
 Обрабатывает:
 1. Webhook от Telegram для авторизации через /start web_auth
+   и команд управления роботами (/robots, /status, /start_clean, /pause, /stop)
 2. Отправку уведомлений через API (action=send, action=send-photo)
 3. Тестовые сообщения (action=test)
+4. Рассылку накопленных уведомлений о роботах (action=flush-notifications, по таймеру)
+5. Дообработку апдейтов из очереди telegram_updates (action=drain-updates, по таймеру)
+
+Webhook записывает апдейт в telegram_updates и только потом отвечает Telegram; повторные
+доставки отсекаются первичным ключом update_id. Обрабатывает апдейты пул фоновых потоков
+инстанса; у /start web_auth отдельные потоки, чтобы ссылка для входа не ждала очереди команд.
+Апдейты, которые инстанс не успел обработать (заморожен или остановлен), забирает
+action=drain-updates. Время до ответа — в Server-Timing.
 """
 
 import json
 import os
 import uuid
 import hashlib
+import html
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 from typing import Optional
 
-import psycopg2
+import requests
 import telebot
+import dbrouter
+from dbrouter import get_schema
+from instrumentation import server_timing
+from resilience import Unavailable, get_breaker, unavailable_response
+from responses import json_response, options_response
+from tokens import issue_token
 
 
 # =============================================================================
@@ -30,9 +52,60 @@ def get_bot_token() -> str:
     return token
 
 
-def get_bot() -> telebot.TeleBot:
-    """Create bot instance."""
-    return telebot.TeleBot(get_bot_token())
+DEFAULT_TELEGRAM_TIMEOUT_SECONDS = 10
+
+
+class GuardedBot:
+    """
+    TeleBot behind the telegram circuit breaker.
+
+    Network errors, timeouts and 5xx from the Bot API count as failures; other API errors
+    (blocked bot, bad chat_id) mean Telegram answered and count as successes.
+    """
+
+    def __init__(self, bot: telebot.TeleBot):
+        self.bot = bot
+
+    def __getattr__(self, name):
+        method = getattr(self.bot, name)
+        if not callable(method):
+            return method
+
+        def call(*args, **kwargs):
+            breaker = get_breaker("telegram")
+            breaker.check()
+            try:
+                result = method(*args, **kwargs)
+            except requests.RequestException:
+                breaker.failure()
+                raise
+            except telebot.apihelper.ApiTelegramException as e:
+                if e.error_code >= 500:
+                    breaker.failure()
+                else:
+                    breaker.success()
+                raise
+            breaker.success()
+            return result
+
+        return call
+
+
+_bot = None
+
+
+def get_bot() -> GuardedBot:
+    """Bot instance, shared by requests and workers of this instance."""
+    global _bot
+    if _bot is None:
+        timeout = float(os.environ.get("TELEGRAM_TIMEOUT_SECONDS") or DEFAULT_TELEGRAM_TIMEOUT_SECONDS)
+        telebot.apihelper.CONNECT_TIMEOUT = timeout
+        telebot.apihelper.READ_TIMEOUT = timeout
+        if os.environ.get("TELEGRAM_API_URL"):
+            # Local Bot API stub for load tests, e.g. benchmarks/fake_bot_api.py
+            telebot.apihelper.API_URL = os.environ["TELEGRAM_API_URL"]
+        _bot = GuardedBot(telebot.TeleBot(get_bot_token(), threaded=False))
+    return _bot
 
 
 def get_default_chat_id() -> str:
@@ -40,44 +113,29 @@ def get_default_chat_id() -> str:
     return os.environ.get("TELEGRAM_CHAT_ID", "")
 
 
-def get_schema() -> str:
-    """Get database schema prefix."""
-    schema = os.environ.get("MAIN_DB_SCHEMA", "public")
-    return f"{schema}." if schema else ""
-
-
 # =============================================================================
-# CORS HELPERS
+# DATABASE OPERATIONS
 # =============================================================================
 
-def get_cors_headers() -> dict:
-    allowed_origins = os.environ.get("ALLOWED_ORIGINS", "*")
-    return {
-        "Access-Control-Allow-Origin": allowed_origins,
-        "Access-Control-Allow-Methods": "POST, OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type, X-Telegram-Bot-Api-Secret-Token",
-    }
-
+_local = threading.local()
 
-def cors_response(status: int, body: dict) -> dict:
-    return {
-        "statusCode": status,
-        "headers": {**get_cors_headers(), "Content-Type": "application/json"},
-        "body": json.dumps(body),
-    }
 
+def get_db_connection():
+    """Connection of the current thread, kept open between updates."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or conn.closed:
+        conn = dbrouter.get_db_connection()
+        _local.conn = conn
+    return conn
 
-def options_response() -> dict:
-    return {
-        "statusCode": 204,
-        "headers": get_cors_headers(),
-        "body": "",
-    }
 
+def close_db_connection() -> None:
+    """Drop the current thread's connection after an error; the next call reconnects."""
+    conn = getattr(_local, "conn", None)
+    _local.conn = None
+    if conn is not None and not conn.closed:
+        conn.close()
 
-# =============================================================================
-# DATABASE OPERATIONS
-# =============================================================================
 
 def save_auth_token(
     telegram_id: str,
@@ -90,7 +148,7 @@ def save_auth_token(
     token_hash = hashlib.sha256(token.encode()).hexdigest()
     schema = get_schema()
 
-    conn = psycopg2.connect(os.environ["DATABASE_URL"])
+    conn = get_db_connection()
     try:
         cursor = conn.cursor()
         cursor.execute(f"""
@@ -108,8 +166,10 @@ def save_auth_token(
             datetime.now(timezone.utc) + timedelta(minutes=5)
         ))
         conn.commit()
-    finally:
-        conn.close()
+        cursor.close()
+    except Exception:
+        close_db_connection()
+        raise
 
     return token
 
@@ -143,36 +203,577 @@ def handle_web_auth(chat_id: int, user: dict) -> None:
 def handle_start(chat_id: int) -> None:
     """Обработка команды /start без параметров."""
     bot = get_bot()
-    bot.send_message(chat_id, "Привет! Используйте кнопку «Войти через Telegram» на сайте.")
+    bot.send_message(
+        chat_id,
+        "Привет! Используйте кнопку «Войти через Telegram» на сайте.\n\n"
+        "После входа роботами можно управлять отсюда:\n"
+        "/robots — список роботов\n"
+        "/status [имя] — состояние\n"
+        "/start_clean [имя] — начать мойку\n"
+        "/pause [имя] — пауза\n"
+        "/stop [имя] — остановить"
+    )
+
+
+# =============================================================================
+# ROBOT COMMANDS
+# =============================================================================
+
+DEFAULT_ACCOUNT_TTL_SECONDS = 60
+MAX_CACHED_ACCOUNTS = 10000
+ROBOTS_TOKEN_SECONDS = 300
+ROBOTS_API_TIMEOUT = 10
+
+CONTROL_COMMANDS = {"/start_clean": "start", "/pause": "pause", "/stop": "stop"}
+ACTION_LABELS = {"start": "▶️ Мыть", "pause": "⏸ Пауза", "stop": "⏹ Стоп"}
+TASK_LABELS = {"cleaning": "моет", "paused": "на паузе", "idle": "ожидает"}
+
+
+class AccountCache:
+    """
+    LRU с TTL, общий для потоков: telegram_id → пользователь и его роботы, чтобы команды
+    не искали их в БД на каждое сообщение; user_id → токен robots API (get_token_cache).
+    """
+
+    def __init__(self, ttl: float, max_accounts: int = MAX_CACHED_ACCOUNTS):
+        self.ttl = ttl
+        self.max_accounts = max_accounts
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, telegram_id: str) -> Optional[dict]:
+        with self.lock:
+            entry = self.entries.get(telegram_id)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            self.entries.move_to_end(telegram_id)
+            return entry[1]
+
+    def put(self, telegram_id: str, account: dict) -> None:
+        with self.lock:
+            self.entries[telegram_id] = (time.monotonic() + self.ttl, account)
+            self.entries.move_to_end(telegram_id)
+            if len(self.entries) > self.max_accounts:
+                self.entries.popitem(last=False)
+
+
+_account_cache = None
+_token_cache = None
+
+
+def get_account_cache() -> AccountCache:
+    """Account cache of this instance."""
+    global _account_cache
+    if _account_cache is None:
+        ttl = float(os.environ.get("BOT_ACCOUNT_TTL_SECONDS") or DEFAULT_ACCOUNT_TTL_SECONDS)
+        _account_cache = AccountCache(ttl)
+    return _account_cache
+
+
+def get_token_cache() -> AccountCache:
+    """robots API tokens of this instance, reused until their last minute."""
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = AccountCache(ROBOTS_TOKEN_SECONDS - 60)
+    return _token_cache
 
 
-def process_webhook(body: dict) -> dict:
-    """Обработка webhook от Telegram."""
+def find_account(telegram_id: str) -> Optional[dict]:
+    """Пользователь по telegram_id и доступные ему роботы одним запросом."""
+    schema = get_schema()
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT u.id, r.id, r.name
+            FROM {schema}users u
+            LEFT JOIN {schema}robots r
+              ON (r.archived IS NULL OR r.archived = false)
+             AND ((r.org_id IS NULL AND r.user_id = u.id)
+                  OR r.org_id IN (SELECT m.org_id FROM {schema}organization_members m WHERE m.user_id = u.id))
+            WHERE u.telegram_id = %s
+            ORDER BY u.id, r.name, r.id
+        """, (telegram_id,))
+        rows = cursor.fetchall()
+        conn.commit()
+        cursor.close()
+    except Exception:
+        close_db_connection()
+        raise
+
+    if not rows:
+        return None
+    user_id = rows[0][0]
+    robots = [{"id": row[1], "name": row[2]} for row in rows if row[0] == user_id and row[1] is not None]
+    return {"user_id": user_id, "robots": robots}
+
+
+def get_account(telegram_id: str, refresh: bool = False) -> Optional[dict]:
+    """Аккаунт из кеша или из БД. Незнакомые telegram_id не кешируются: пользователь мог только что войти на сайт."""
+    cache = get_account_cache()
+    account = None if refresh else cache.get(telegram_id)
+    if account is None:
+        account = find_account(telegram_id)
+        if account is not None:
+            cache.put(telegram_id, account)
+    return account
+
+
+def load_robot_states(user_id: int, robot_ids: list) -> list:
+    """
+    Текущее состояние роботов по id. Список id берётся из кеша аккаунтов, поэтому
+    доступ пользователя к роботам проверяется заново, как в find_account.
+    """
+    schema = get_schema()
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT r.id, r.name, r.status, r.battery_level, r.current_task
+            FROM {schema}robots r
+            WHERE r.id = ANY(%s::integer[])
+              AND (r.archived IS NULL OR r.archived = false)
+              AND ((r.org_id IS NULL AND r.user_id = %s)
+                   OR r.org_id IN (SELECT m.org_id FROM {schema}organization_members m WHERE m.user_id = %s))
+            ORDER BY r.name, r.id
+        """, (robot_ids, user_id, user_id))
+        rows = cursor.fetchall()
+        conn.commit()
+        cursor.close()
+    except Exception:
+        close_db_connection()
+        raise
+
+    return [
+        {"id": row[0], "name": row[1], "status": row[2], "battery_level": row[3], "current_task": row[4]}
+        for row in rows
+    ]
+
+
+def robots_token(user_id: int) -> str:
+    """Короткоживущий токен пользователя для robots API, переиспользуется до последней минуты."""
+    cache = get_token_cache()
+    token = cache.get(user_id)
+    if token is None:
+        token = issue_token({"user_id": user_id}, ROBOTS_TOKEN_SECONDS)
+        cache.put(user_id, token)
+    return token
+
+
+def call_robots_api(method: str, path: str, user_id: int, body: Optional[dict] = None, idempotency_key: Optional[str] = None) -> tuple:
+    """Запрос к функции robots от имени пользователя: (статус, JSON ответа)."""
+    url = os.environ["ROBOTS_API_URL"].rstrip("/") + path
+    headers = {"Authorization": f"Bearer {robots_token(user_id)}", "Content-Type": "application/json"}
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, headers=headers, method=method)
+
+    breaker = get_breaker("robots-api")
+    breaker.check()
+    try:
+        with urllib.request.urlopen(request, timeout=ROBOTS_API_TIMEOUT) as response:
+            result = response.status, json.loads(response.read() or b"{}")
+    except urllib.error.HTTPError as e:
+        if e.code >= 500:
+            breaker.failure()
+        else:
+            breaker.success()
+        try:
+            payload = json.loads(e.read() or b"{}")
+        except ValueError:
+            payload = {}
+        return e.code, payload
+    except OSError:
+        breaker.failure()
+        raise
+    breaker.success()
+    return result
+
+
+def format_robot(robot: dict, markup: bool = True) -> str:
+    """Строка состояния робота, в HTML или простым текстом."""
+    task = TASK_LABELS.get(robot.get("current_task"), robot.get("current_task") or "—")
+    name = f"<b>{html.escape(robot['name'])}</b>" if markup else robot["name"]
+    line = f"{name}: {task}"
+    if robot.get("status") and robot["status"] != "online":
+        line += f" ({robot['status']})"
+    if robot.get("battery_level") is not None:
+        line += f" · 🔋 {robot['battery_level']}%"
+    if robot.get("cleaning_minutes_left") is not None:
+        line += f" · ~{robot['cleaning_minutes_left']} мин мойки"
+    return line
+
+
+def robots_keyboard(robots: list, actions: tuple) -> telebot.types.InlineKeyboardMarkup:
+    """Кнопки действий по строке на робота; callback_data — ctl:<id>:<action>."""
+    keyboard = telebot.types.InlineKeyboardMarkup()
+    for robot in robots:
+        keyboard.row(*[
+            telebot.types.InlineKeyboardButton(
+                f"{robot['name']}: {ACTION_LABELS[action]}" if len(actions) == 1 else ACTION_LABELS[action],
+                callback_data=f"ctl:{robot['id']}:{action}",
+            )
+            for action in actions
+        ])
+    return keyboard
+
+
+def match_robots(robots: list, name: str) -> list:
+    """Роботы по имени: точное совпадение без учёта регистра, иначе по началу имени."""
+    name = name.strip().lower()
+    if not name:
+        return robots
+    exact = [robot for robot in robots if robot["name"].lower() == name]
+    return exact or [robot for robot in robots if robot["name"].lower().startswith(name)]
+
+
+def control(account: dict, robot_id: int, action: str, idempotency_key: str, markup: bool = True) -> str:
+    """Команда роботу через robots API; текст результата для пользователя."""
+    try:
+        status, payload = call_robots_api(
+            "POST", f"/{robot_id}/control", account["user_id"], {"action": action}, idempotency_key
+        )
+    except Unavailable:
+        return "Управление роботами временно недоступно, попробуйте через минуту."
+    except OSError as e:
+        # Таймаут или отказ в соединении: отвечаем пользователю, апдейт не повторяем.
+        print(f"Robots API {action} for robot {robot_id} failed: {e}")
+        return "Сервис временно недоступен, попробуйте позже."
+    if status != 200:
+        error = payload.get("error", status)
+        return f"Не получилось: {html.escape(str(error)) if markup else error}"
+    return format_robot(payload, markup)
+
+
+def handle_robot_command(chat_id: int, user: dict, command: str, argument: str, update_id) -> None:
+    """Команды /robots, /status, /start_clean, /pause, /stop."""
+    bot = get_bot()
+    account = get_account(str(user.get("id", "")))
+    if account is None:
+        bot.send_message(chat_id, "Сначала войдите на сайт через Telegram — после этого роботы появятся здесь.")
+        return
+    if not account["robots"]:
+        bot.send_message(chat_id, "У вас пока нет роботов.")
+        return
+
+    robots = match_robots(account["robots"], argument)
+    if not robots:
+        bot.send_message(chat_id, "Робот с таким именем не найден. Список: /robots")
+        return
+
+    if command in ("/robots", "/status"):
+        states = load_robot_states(account["user_id"], [robot["id"] for robot in robots])
+        if not states:
+            # Доступ к роботам отозвали после того, как аккаунт попал в кеш.
+            get_account(str(user.get("id", "")), refresh=True)
+            bot.send_message(chat_id, "Робот с таким именем не найден. Список: /robots")
+            return
+        keyboard = robots_keyboard(states, ("start", "pause", "stop")) if command == "/robots" else None
+        bot.send_message(chat_id, "\n".join(format_robot(robot) for robot in states), parse_mode="HTML", reply_markup=keyboard)
+        return
+
+    action = CONTROL_COMMANDS[command]
+    if len(robots) > 1:
+        bot.send_message(chat_id, "Какой робот?", reply_markup=robots_keyboard(robots, (action,)))
+        return
+
+    text = control(account, robots[0]["id"], action, f"telegram-{update_id}")
+    bot.send_message(chat_id, text, parse_mode="HTML")
+
+
+def handle_callback_query(callback: dict) -> None:
+    """Нажатие кнопки ctl:<id>:<action>: команда роботу и ответ всплывающим уведомлением."""
+    bot = get_bot()
+    try:
+        prefix, robot_id, action = (callback.get("data") or "").split(":")
+        robot_id = int(robot_id)
+    except ValueError:
+        bot.answer_callback_query(callback["id"])
+        return
+    if prefix != "ctl" or action not in ACTION_LABELS:
+        bot.answer_callback_query(callback["id"])
+        return
+
+    telegram_id = str(callback.get("from", {}).get("id", ""))
+    account = get_account(telegram_id)
+    if account is not None and robot_id not in {robot["id"] for robot in account["robots"]}:
+        # Робота могли добавить после того, как аккаунт попал в кеш.
+        account = get_account(telegram_id, refresh=True)
+    if account is None or robot_id not in {robot["id"] for robot in account["robots"]}:
+        bot.answer_callback_query(callback["id"], "Робот не найден", show_alert=True)
+        return
+
+    text = control(account, robot_id, action, f"telegram-callback-{callback['id']}", markup=False)
+    bot.answer_callback_query(callback["id"], text)
+
+
+def process_update(body: dict) -> None:
+    """
+    Обработка одного апдейта Telegram (в фоновом потоке).
+    Unavailable пробрасывается: апдейт остаётся необработанным и будет повторён.
+    """
+    if body.get("callback_query"):
+        try:
+            handle_callback_query(body["callback_query"])
+        except Unavailable:
+            raise
+        except telebot.apihelper.ApiTelegramException as e:
+            print(f"Telegram API error: {e}")
+        return
+
     message = body.get("message")
 
     if not message:
-        return {"statusCode": 200, "body": json.dumps({"ok": True})}
+        return
 
     text = message.get("text", "")
     user = message.get("from", {})
     chat_id = message.get("chat", {}).get("id")
 
     if not chat_id:
-        return {"statusCode": 200, "body": json.dumps({"ok": True})}
+        return
+
+    command, _, argument = text.partition(" ")
+    # В группах команды приходят как /status@bot_name
+    command = command.split("@", 1)[0].lower()
 
     try:
-        if text.startswith("/start"):
-            parts = text.split(" ", 1)
-            if len(parts) > 1 and parts[1] == "web_auth":
+        if command == "/start":
+            if argument == "web_auth":
                 handle_web_auth(chat_id, user)
             else:
                 handle_start(chat_id)
+        elif command == "/robots" or command == "/status" or command in CONTROL_COMMANDS:
+            handle_robot_command(chat_id, user, command, argument, body.get("update_id"))
+    except Unavailable:
+        raise
     except telebot.apihelper.ApiTelegramException as e:
         print(f"Telegram API error: {e}")
     except Exception as e:
         print(f"Error processing webhook: {e}")
 
-    return {"statusCode": 200, "body": json.dumps({"ok": True})}
+
+# =============================================================================
+# WEBHOOK QUEUE
+# =============================================================================
+
+DEFAULT_WORKERS = 4
+PRIORITY_WORKERS = 1
+MAX_PENDING_UPDATES = 1000
+UPDATE_LEASE_SECONDS = 60
+MAX_UPDATE_ATTEMPTS = 5
+DRAIN_BATCH_SIZE = 100
+KEEP_UPDATES_HOURS = 24
+
+
+def store_update(update: dict) -> bool:
+    """
+    Записать апдейт в telegram_updates до ответа Telegram.
+    False — апдейт с таким update_id уже был (повторная доставка).
+    """
+    schema = get_schema()
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""INSERT INTO {schema}telegram_updates (update_id, payload) VALUES (%s, %s)
+            ON CONFLICT (update_id) DO NOTHING""",
+            (update["update_id"], json.dumps(update)),
+        )
+        stored = cursor.rowcount == 1
+        conn.commit()
+        cursor.close()
+    except Exception:
+        close_db_connection()
+        raise
+    return stored
+
+
+def claim_updates(update_id: Optional[int] = None, limit: int = 1) -> list:
+    """
+    Взять необработанные апдейты в работу на UPDATE_LEASE_SECONDS: один по update_id
+    или до limit самых старых, чья аренда истекла. Апдейт, не обработанный
+    за MAX_UPDATE_ATTEMPTS попыток, больше не берётся.
+    """
+    schema = get_schema()
+    conn = get_db_connection()
+    condition = "update_id = %s" if update_id is not None else "TRUE"
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            UPDATE {schema}telegram_updates
+            SET locked_until = NOW() + make_interval(secs => %s), attempts = attempts + 1
+            WHERE update_id IN (
+                SELECT update_id FROM {schema}telegram_updates
+                WHERE {condition} AND processed_at IS NULL AND attempts < %s
+                  AND (locked_until IS NULL OR locked_until < NOW())
+                ORDER BY update_id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING payload
+        """, (UPDATE_LEASE_SECONDS, *([update_id] if update_id is not None else []), MAX_UPDATE_ATTEMPTS, limit))
+        rows = cursor.fetchall()
+        conn.commit()
+        cursor.close()
+    except Exception:
+        close_db_connection()
+        raise
+    return [payload for (payload,) in rows]
+
+
+def finish_update(update_id: int) -> None:
+    """Отметить апдейт обработанным."""
+    schema = get_schema()
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"UPDATE {schema}telegram_updates SET processed_at = NOW(), locked_until = NULL WHERE update_id = %s",
+            (update_id,),
+        )
+        conn.commit()
+        cursor.close()
+    except Exception:
+        close_db_connection()
+        raise
+
+
+def run_update(update: dict) -> bool:
+    """
+    Обработать взятый апдейт и отметить его. При недоступности Telegram или БД
+    апдейт остаётся в таблице и будет взят снова после истечения аренды.
+    """
+    try:
+        process_update(update)
+        finish_update(update["update_id"])
+        return True
+    except Unavailable as e:
+        print(f"Update {update.get('update_id')} postponed: {e}")
+    except Exception as e:
+        print(f"Error processing update {update.get('update_id')}: {e}")
+    return False
+
+
+class UpdateQueue:
+    """
+    Background workers for webhook updates.
+
+    Every update is already stored in telegram_updates when it is submitted, so this
+    is only the fast path: a worker claims the row, processes it and marks it done.
+    Updates left behind by a frozen or stopped instance, or not submitted because
+    MAX_PENDING_UPDATES are waiting, are picked up by action=drain-updates.
+    Priority updates (/start web_auth: the user is waiting for the login link on the
+    site) have their own workers and do not wait behind a backlog of commands.
+    """
+
+    def __init__(self, workers: int, max_pending: int = MAX_PENDING_UPDATES):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="telegram-update")
+        self.priority = ThreadPoolExecutor(max_workers=PRIORITY_WORKERS, thread_name_prefix="telegram-update-priority")
+        self.max_pending = max_pending
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+
+    def submit(self, update_id: int, priority: bool = False) -> bool:
+        """Queue a stored update; False when the instance is busy."""
+        with self.lock:
+            if self.pending >= self.max_pending:
+                return False
+            self.pending += 1
+        (self.priority if priority else self.executor).submit(self.run, update_id)
+        return True
+
+    def run(self, update_id: int) -> None:
+        try:
+            for update in claim_updates(update_id):
+                run_update(update)
+        except Exception as e:
+            print(f"Error claiming update {update_id}: {e}")
+        finally:
+            with self.lock:
+                self.pending -= 1
+                if not self.pending:
+                    self.idle.notify_all()
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued update is processed."""
+        with self.lock:
+            return self.idle.wait_for(lambda: not self.pending, timeout)
+
+
+_update_queue = None
+
+
+def get_update_queue() -> UpdateQueue:
+    """Update queue of this instance."""
+    global _update_queue
+    if _update_queue is None:
+        workers = int(os.environ.get("TELEGRAM_WORKERS") or DEFAULT_WORKERS)
+        _update_queue = UpdateQueue(workers)
+    return _update_queue
+
+
+def is_web_auth(update: dict) -> bool:
+    """/start web_auth: пользователь ждёт ссылку на сайте, апдейт идёт в приоритетную очередь."""
+    text = (update.get("message") or {}).get("text") or ""
+    command, _, argument = text.partition(" ")
+    return command.split("@", 1)[0].lower() == "/start" and argument == "web_auth"
+
+
+def process_webhook(body: dict, started: float) -> dict:
+    """
+    Записать апдейт в telegram_updates и ответить Telegram.
+    Если записать не удалось, Telegram получает 5xx и доставит апдейт снова;
+    повторная доставка уже записанного апдейта отсекается первичным ключом.
+    """
+    update_id = body.get("update_id")
+    if update_id is None:
+        return server_timing(json_response({"ok": True}), "ack", started)
+    try:
+        if store_update(body):
+            get_update_queue().submit(update_id, priority=is_web_auth(body))
+    except Unavailable as e:
+        return server_timing(unavailable_response(e), "ack", started)
+    except Exception as e:
+        print(f"Error storing update {update_id}: {e}")
+        return server_timing(json_response({"ok": False}, 500), "ack", started)
+    return server_timing(json_response({"ok": True}), "ack", started)
+
+
+def handle_drain_updates(body: dict) -> dict:
+    """
+    POST ?action=drain-updates
+    Process stored updates whose lease expired or that no worker picked up, and delete
+    processed updates older than KEEP_UPDATES_HOURS. Meant for a timer trigger.
+    """
+    limit = min(int(body.get("limit") or DRAIN_BATCH_SIZE), DRAIN_BATCH_SIZE)
+    try:
+        updates = claim_updates(limit=limit)
+    except Unavailable as e:
+        return unavailable_response(e)
+    except Exception as e:
+        return json_response({"error": str(e)}, 500)
+
+    processed = sum(run_update(update) for update in updates)
+
+    schema = get_schema()
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"DELETE FROM {schema}telegram_updates WHERE processed_at < NOW() - make_interval(hours => %s)",
+            (KEEP_UPDATES_HOURS,),
+        )
+        deleted = cursor.rowcount
+        conn.commit()
+        cursor.close()
+    except Exception as e:
+        close_db_connection()
+        return json_response({"error": str(e)}, 500)
+
+    return json_response({"claimed": len(updates), "processed": processed, "deleted": deleted})
 
 
 # =============================================================================
@@ -190,13 +791,13 @@ def handle_send(body: dict) -> dict:
     silent = body.get("silent", False)
 
     if not text:
-        return cors_response(400, {"error": "text is required"})
+        return json_response({"error": "text is required"}, 400)
 
     if not chat_id:
-        return cors_response(400, {"error": "chat_id is required"})
+        return json_response({"error": "chat_id is required"}, 400)
 
     if len(text) > 4096:
-        return cors_response(400, {"error": "Message too long (max 4096 characters)"})
+        return json_response({"error": "Message too long (max 4096 characters)"}, 400)
 
     try:
         bot = get_bot()
@@ -207,17 +808,19 @@ def handle_send(body: dict) -> dict:
             disable_notification=silent,
             disable_web_page_preview=True,
         )
-        return cors_response(200, {
+        return json_response({
             "success": True,
             "message_id": result.message_id,
         })
+    except Unavailable as e:
+        return unavailable_response(e)
     except telebot.apihelper.ApiTelegramException as e:
-        return cors_response(400, {
+        return json_response({
             "error": e.description,
             "error_code": e.error_code,
-        })
+        }, 400)
     except Exception as e:
-        return cors_response(500, {"error": str(e)})
+        return json_response({"error": str(e)}, 500)
 
 
 def handle_send_photo(body: dict) -> dict:
@@ -231,10 +834,10 @@ def handle_send_photo(body: dict) -> dict:
     parse_mode = body.get("parse_mode", "HTML")
 
     if not photo_url:
-        return cors_response(400, {"error": "photo_url is required"})
+        return json_response({"error": "photo_url is required"}, 400)
 
     if not chat_id:
-        return cors_response(400, {"error": "chat_id is required"})
+        return json_response({"error": "chat_id is required"}, 400)
 
     try:
         bot = get_bot()
@@ -244,17 +847,159 @@ def handle_send_photo(body: dict) -> dict:
             caption=caption if caption else None,
             parse_mode=parse_mode,
         )
-        return cors_response(200, {
+        return json_response({
             "success": True,
             "message_id": result.message_id,
         })
+    except Unavailable as e:
+        return unavailable_response(e)
     except telebot.apihelper.ApiTelegramException as e:
-        return cors_response(400, {
+        return json_response({
             "error": e.description,
             "error_code": e.error_code,
-        })
+        }, 400)
+    except Exception as e:
+        return json_response({"error": str(e)}, 500)
+
+
+# =============================================================================
+# ROBOT NOTIFICATIONS
+# =============================================================================
+
+DEFAULT_NOTIFY_WINDOW_SECONDS = 30
+NOTIFY_BATCH_SIZE = 500
+MAX_MESSAGE_LENGTH = 4096
+
+EVENT_LABELS = {
+    "battery_low": "низкий заряд",
+    "cleaning_finished": "мойка завершена",
+    "auto_paused": "поставлен на паузу: батарея на исходе",
+}
+
+
+def claim_due_notifications(window_seconds: float, limit: int) -> list:
+    """
+    Забрать созревшие уведомления (первое событие старше окна) и сразу пометить отправленными.
+    Commit до рассылки: записи роботов не ждут Bot API, а параллельные вызовы не берут те же строки.
+    Уведомления удалённых роботов тоже помечаются (без telegram_id), чтобы не держать голову очереди.
+    """
+    schema = get_schema()
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            UPDATE {schema}robot_notifications n
+            SET sent_at = NOW()
+            WHERE n.id IN (
+                SELECT id FROM {schema}robot_notifications
+                WHERE sent_at IS NULL AND first_event_at <= NOW() - make_interval(secs => %s)
+                ORDER BY first_event_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING n.id,
+                      (SELECT u.telegram_id FROM {schema}robots r JOIN {schema}users u ON u.id = r.user_id
+                       WHERE r.id = n.robot_id),
+                      n.events, n.payload, n.event_count,
+                      EXTRACT(EPOCH FROM NOW() - n.first_event_at)::float8
+        """, (window_seconds, limit))
+        rows = cursor.fetchall()
+        conn.commit()
+        cursor.close()
+    except Exception:
+        close_db_connection()
+        raise
+    return rows
+
+
+def mark_delivered(notification_ids: list) -> None:
+    """Отметить уведомления, которые дошли до Telegram."""
+    if not notification_ids:
+        return
+    schema = get_schema()
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"UPDATE {schema}robot_notifications SET delivered = TRUE WHERE id = ANY(%s)",
+            (notification_ids,),
+        )
+        conn.commit()
+        cursor.close()
+    except Exception:
+        close_db_connection()
+        raise
+
+
+def format_notification(events: list, payload: dict, event_count: int) -> str:
+    """Строка уведомления по роботу."""
+    labels = ", ".join(EVENT_LABELS.get(event, event) for event in sorted(events))
+    line = f"<b>{html.escape(payload.get('name') or 'Робот')}</b>: {labels}"
+    if payload.get("battery_level") is not None:
+        line += f" · 🔋 {payload['battery_level']}%"
+    if event_count > 1:
+        line += f" (событий: {event_count})"
+    return line
+
+
+def split_message(lines: list) -> list:
+    """Склеить строки в сообщения не длиннее MAX_MESSAGE_LENGTH."""
+    messages, current = [], ""
+    for line in lines:
+        if current and len(current) + 1 + len(line) > MAX_MESSAGE_LENGTH:
+            messages.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line[:MAX_MESSAGE_LENGTH]
+    if current:
+        messages.append(current)
+    return messages
+
+
+def handle_flush_notifications(body: dict) -> dict:
+    """
+    POST ?action=flush-notifications
+    Send due robot notifications, one message per Telegram user for all their robots.
+    Meant for a timer trigger; safe to run concurrently.
+    """
+    window = float(os.environ.get("NOTIFY_WINDOW_SECONDS") or DEFAULT_NOTIFY_WINDOW_SECONDS)
+    limit = min(int(body.get("limit") or NOTIFY_BATCH_SIZE), NOTIFY_BATCH_SIZE)
+
+    try:
+        # Claimed rows count as sent: do not claim them while Telegram is known to be down.
+        get_breaker("telegram").check()
+        rows = claim_due_notifications(window, limit)
+    except Unavailable as e:
+        return unavailable_response(e)
     except Exception as e:
-        return cors_response(500, {"error": str(e)})
+        return json_response({"error": str(e)}, 500)
+
+    by_chat = {}
+    for notification_id, telegram_id, events, payload, event_count, delay in rows:
+        if telegram_id:
+            by_chat.setdefault(telegram_id, []).append((notification_id, format_notification(events, payload, event_count)))
+
+    bot = get_bot()
+    delivered, messages, errors = [], 0, 0
+    for chat_id, items in by_chat.items():
+        try:
+            for text in split_message([line for _, line in items]):
+                bot.send_message(chat_id, text, parse_mode="HTML", disable_web_page_preview=True)
+                messages += 1
+            delivered.extend(notification_id for notification_id, _ in items)
+        except Exception as e:
+            errors += 1
+            print(f"Error sending notifications to chat {chat_id}: {e}")
+
+    mark_delivered(delivered)
+    delays = sorted(row[5] for row in rows)
+    return json_response({
+        "notifications": len(rows),
+        "events": sum(row[4] for row in rows),
+        "messages": messages,
+        "delivered": len(delivered),
+        "errors": errors,
+        "max_delay_seconds": round(delays[-1], 3) if delays else None,
+    })
 
 
 def handle_test(body: dict) -> dict:
@@ -265,7 +1010,7 @@ def handle_test(body: dict) -> dict:
     chat_id = body.get("chat_id") or get_default_chat_id()
 
     if not chat_id:
-        return cors_response(400, {"error": "chat_id is required"})
+        return json_response({"error": "chat_id is required"}, 400)
 
     text = f"""<b>Тестовое сообщение</b>
 
@@ -280,18 +1025,20 @@ def handle_test(body: dict) -> dict:
             text=text,
             parse_mode="HTML",
         )
-        return cors_response(200, {
+        return json_response({
             "success": True,
             "message": "Test message sent",
             "message_id": result.message_id,
         })
+    except Unavailable as e:
+        return unavailable_response(e)
     except telebot.apihelper.ApiTelegramException as e:
-        return cors_response(400, {
+        return json_response({
             "error": e.description,
             "error_code": e.error_code,
-        })
+        }, 400)
     except Exception as e:
-        return cors_response(500, {"error": str(e)})
+        return json_response({"error": str(e)}, 500)
 
 
 # =============================================================================
@@ -300,10 +1047,11 @@ def handle_test(body: dict) -> dict:
 
 def handler(event: dict, context) -> dict:
     """Main entry point."""
+    started = time.perf_counter()
     method = event.get("httpMethod", "POST")
 
     if method == "OPTIONS":
-        return options_response()
+        return options_response("POST, OPTIONS", "Content-Type, X-Telegram-Bot-Api-Secret-Token", 204)
 
     params = event.get("queryStringParameters") or {}
     action = params.get("action", "")
@@ -316,7 +1064,7 @@ def handler(event: dict, context) -> dict:
             try:
                 body = json.loads(raw_body) if raw_body else {}
             except json.JSONDecodeError:
-                return cors_response(400, {"error": "Invalid JSON"})
+                return json_response({"error": "Invalid JSON"}, 400)
 
         if action == "send" and method == "POST":
             return handle_send(body)
@@ -324,8 +1072,12 @@ def handler(event: dict, context) -> dict:
             return handle_send_photo(body)
         elif action == "test" and method == "POST":
             return handle_test(body)
+        elif action == "flush-notifications" and method == "POST":
+            return handle_flush_notifications(body)
+        elif action == "drain-updates" and method == "POST":
+            return handle_drain_updates(body)
         else:
-            return cors_response(400, {"error": f"Unknown action: {action}"})
+            return json_response({"error": f"Unknown action: {action}"}, 400)
 
     # No action — handle Telegram webhook
     headers = event.get("headers", {})
@@ -337,5 +1089,8 @@ def handler(event: dict, context) -> dict:
         if request_secret != webhook_secret:
             return {"statusCode": 401, "body": json.dumps({"error": "Unauthorized"})}
 
-    body = json.loads(event.get("body", "{}"))
-    return process_webhook(body)
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except json.JSONDecodeError:
+        return {"statusCode": 400, "body": json.dumps({"error": "Invalid JSON"})}
+    return process_webhook(body, started)
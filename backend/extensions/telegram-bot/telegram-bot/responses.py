@@ -0,0 +1,118 @@
+# Копия backend/core/responses.py: правьте оригинал и запускайте tools/vendor_core.py
+"""Построение HTTP-ответов функций и их сжатие"""
+import base64
+import gzip
+import os
+from serializer import dumps
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 1
+BROTLI_QUALITY = 1
+DEFAULT_MIN_BYTES = 1024
+# Заголовки ответа, которые браузер отдаёт скрипту другого источника: подсказки, когда повторить запрос
+EXPOSED_HEADERS = 'Retry-After, X-Poll-Interval, X-Read-Primary-Until'
+
+def allowed_origin() -> str:
+    """Значение Access-Control-Allow-Origin: ALLOWED_ORIGINS или любой источник"""
+    return os.environ.get('ALLOWED_ORIGINS') or '*'
+
+def options_response(methods: str, allow_headers: str, status_code: int = 200) -> dict:
+    """Ответ на CORS preflight"""
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Access-Control-Allow-Origin': allowed_origin(),
+            'Access-Control-Allow-Methods': methods,
+            'Access-Control-Allow-Headers': allow_headers,
+            'Access-Control-Max-Age': '86400'
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+def raw_json_response(body: str, status_code: int = 200) -> dict:
+    """JSON-ответ из уже сериализованного тела"""
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': allowed_origin(),
+            'Access-Control-Expose-Headers': EXPOSED_HEADERS
+        },
+        'body': body,
+        'isBase64Encoded': False
+    }
+
+def json_response(data, status_code: int = 200) -> dict:
+    """Генерация JSON-ответа"""
+    return raw_json_response(dumps(data), status_code)
+
+def error_response(message: str, status_code: int) -> dict:
+    """Генерация ответа с ошибкой"""
+    return json_response({'error': message}, status_code)
+
+def get_header(event: dict, name: str) -> str:
+    """Значение заголовка запроса без учёта регистра"""
+    name = name.lower()
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value or ''
+    return ''
+
+def accepted_encodings(header: str) -> set:
+    """Кодировки из Accept-Encoding с ненулевым q"""
+    encodings = set()
+    for part in header.split(','):
+        token, _, params = part.strip().partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.add(token)
+    return encodings
+
+def compress_response(event: dict, response: dict) -> dict:
+    """Сжать тело ответа gzip/brotli, если клиент это поддерживает и тело достаточно большое"""
+    if os.environ.get('RESPONSE_COMPRESSION', '').lower() not in ('1', 'true', 'on'):
+        return response
+    
+    body = response.get('body')
+    if not body or not isinstance(body, str) or response.get('isBase64Encoded'):
+        return response
+    
+    data = body.encode('utf-8')
+    if len(data) < int(os.environ.get('RESPONSE_COMPRESSION_MIN_BYTES', DEFAULT_MIN_BYTES)):
+        return response
+    
+    encodings = accepted_encodings(get_header(event, 'Accept-Encoding'))
+    if brotli is not None and 'br' in encodings:
+        encoding = 'br'
+        compressed = brotli.compress(data, quality=BROTLI_QUALITY)
+    elif 'gzip' in encodings or '*' in encodings:
+        encoding = 'gzip'
+        compressed = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    else:
+        return response
+    
+    if len(compressed) >= len(data):
+        return response
+    
+    headers = dict(response.get('headers') or {})
+    headers['Content-Encoding'] = encoding
+    headers['Vary'] = 'Accept-Encoding'
+    return {
+        **response,
+        'headers': headers,
+        'body': base64.b64encode(compressed).decode('ascii'),
+        'isBase64Encoded': True
+    }
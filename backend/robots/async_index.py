@@ -0,0 +1,600 @@
+"""Асинхронный вариант API роботов: asyncpg и пул соединений на инстанс
+
+Маршруты CRUD и управления, лимиты, авторизация и формат ответов совпадают с index.handler,
+SQL берётся из queries.py. Карты покрытия (/{id}/coverage), планировщик (/plan), экспорт
+и импорт (/export, /import) и организации (/orgs) асинхронной реализации не имеют: их
+выполняют функции index в пуле потоков цикла событий (in_thread). Точка входа: async_index.handler.
+
+Пулы asyncpg стоят за предохранителями (GuardedPool): основной — postgres, общий с index,
+реплики — postgres-read. Пока предохранитель открыт, маршруты сразу отвечают 503 с Retry-After.
+"""
+import asyncio
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+import asyncpg
+from serializer import loads
+from responses import compress_response, error_response, get_header, json_response, options_response, raw_json_response
+from ratelimit import client_ip, rate_limit
+from router import Router, request_segments
+from queries import (ARCHIVE_ROBOT, COUNT_ORG_ROBOTS, COUNT_ROBOTS, DEFAULT_PAGE_SIZE, FIND_ROBOT, GET_ROBOT,
+                     INSERT_ROBOT, LIST_ORG_ROBOTS, LIST_ROBOTS, LIST_ROBOTS_JSON, MAX_PAGE_SIZE, PAGE_AFTER,
+                     SET_ROBOT_TASK, UPDATABLE_FIELDS, UPDATE_ROBOT, numbered, page_cursor, parse_cursor, sql)
+from index import PERSONAL_ROBOT_LIMIT, RATE_LIMITS, TASK_MAP, get_user_from_token
+import index
+import idempotency
+import battery
+import membership
+import notifications
+import events
+import polling
+import dbrouter
+from instrumentation import server_timing
+from resilience import Unavailable, get_breaker, unavailable_response
+
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 10
+PRIMARY_BREAKER = 'postgres'
+READ_BREAKER = 'postgres-read'
+
+# Сбои подключения к БД, которые считает предохранитель; прочие ошибки Postgres — ответ сервера
+CONNECTION_ERRORS = (OSError, asyncio.TimeoutError, asyncpg.PostgresConnectionError)
+
+class GuardedPool:
+    """Пул asyncpg за предохранителем: исход каждого запроса и каждого взятого подключения
+    сообщается breaker, как GuardedCursor у dbrouter; отмена по statement_timeout сбоем не считается"""
+    
+    def __init__(self, pool, breaker):
+        self.pool = pool
+        self.breaker = breaker
+    
+    async def call(self, method: str, *args):
+        self.breaker.check()
+        try:
+            result = await getattr(self.pool, method)(*args)
+        except CONNECTION_ERRORS:
+            self.breaker.failure()
+            raise
+        except asyncpg.PostgresError:
+            self.breaker.success()
+            raise
+        self.breaker.success()
+        return result
+    
+    async def fetch(self, *args):
+        return await self.call('fetch', *args)
+    
+    async def fetchrow(self, *args):
+        return await self.call('fetchrow', *args)
+    
+    async def fetchval(self, *args):
+        return await self.call('fetchval', *args)
+    
+    async def execute(self, *args):
+        return await self.call('execute', *args)
+    
+    @asynccontextmanager
+    async def acquire(self):
+        """Подключение из пула; сбой подключения внутри блока тоже считается"""
+        self.breaker.check()
+        try:
+            async with self.pool.acquire() as conn:
+                yield conn
+        except CONNECTION_ERRORS:
+            self.breaker.failure()
+            raise
+        except asyncpg.PostgresError:
+            self.breaker.success()
+            raise
+        self.breaker.success()
+
+_pool = None
+# Первые запросы инстанса приходят одновременно: пул должен создать только один из них
+_pools_lock = asyncio.Lock()
+
+async def create_pool(url: str, breaker_name: str = PRIMARY_BREAKER) -> GuardedPool:
+    """Пул asyncpg с таймаутами подключения и statement_timeout, как у dbrouter, за предохранителем"""
+    breaker = get_breaker(breaker_name)
+    breaker.check()
+    try:
+        pool = await asyncpg.create_pool(
+            url,
+            min_size=POOL_MIN_SIZE,
+            max_size=int(os.environ.get('ASYNC_DB_POOL_SIZE', POOL_MAX_SIZE)),
+            timeout=dbrouter.connect_timeout(),
+            server_settings={'statement_timeout': str(dbrouter.statement_timeout_ms())}
+        )
+    except CONNECTION_ERRORS:
+        breaker.failure()
+        raise
+    breaker.success()
+    return GuardedPool(pool, breaker)
+
+async def get_pool():
+    """Пул соединений asyncpg, создаётся при первом запросе"""
+    global _pool
+    if _pool is None:
+        async with _pools_lock:
+            if _pool is None:
+                _pool = await create_pool(os.environ.get('DATABASE_URL'))
+    return _pool
+
+_read_pools = None
+
+# Клиент прислал X-Read-Primary-Until: чтения запроса идут на основную БД
+PRIMARY_READS = ContextVar('primary_reads', default=False)
+
+async def get_read_pool(user_id: int):
+    """Пул реплики DATABASE_READ_URL для чтений пользователя (по кругу)
+    
+    Основной пул, если реплик нет, пользователь недавно писал (см. dbrouter) или реплики
+    за открытым предохранителем postgres-read.
+    """
+    global _read_pools
+    urls = dbrouter.read_urls()
+    if not urls or PRIMARY_READS.get() or dbrouter.get_router().sticky(user_id):
+        return await get_pool()
+    if get_breaker(READ_BREAKER).retry_after():
+        return await get_pool()
+    if _read_pools is None:
+        async with _pools_lock:
+            if _read_pools is None and not get_breaker(READ_BREAKER).retry_after():
+                _read_pools = await create_read_pools(urls)
+        if _read_pools is None:
+            # Повторная попытка — после BREAKER_RESET_SECONDS, когда postgres-read пустит пробу.
+            return await get_pool()
+    return next(_read_pools)
+
+async def create_read_pools(urls: list):
+    """Пулы всех реплик по кругу; None, если хоть одна недоступна (сбой засчитан postgres-read)"""
+    pools = []
+    try:
+        for url in urls:
+            pools.append(await create_pool(url, READ_BREAKER))
+    except (Unavailable, *CONNECTION_ERRORS, asyncpg.PostgresError):
+        for pool in pools:
+            await pool.pool.close()
+        return None
+    return itertools.cycle(pools)
+
+def failure_response(error: Exception) -> dict:
+    """Ответ маршрута на исключение: 503 с Retry-After, если БД за предохранителем или
+    недоступна, иначе 500"""
+    if isinstance(error, CONNECTION_ERRORS):
+        breaker = get_breaker(PRIMARY_BREAKER)
+        error = Unavailable(breaker.name, breaker.retry_after() or 1)
+    if isinstance(error, Unavailable):
+        return unavailable_response(error)
+    return error_response(str(error), 500)
+
+def q(query: str, **parts) -> str:
+    """Шаблон запроса в синтаксисе asyncpg"""
+    return numbered(sql(query, **parts))
+
+def parse_id(robot_id):
+    """id робота из пути; None если это не число"""
+    try:
+        return int(robot_id)
+    except (TypeError, ValueError):
+        return None
+
+async def in_thread(fn, *args, read_user: int = None) -> dict:
+    """Синхронная реализация маршрута из index в пуле потоков; read_user — чтение с реплики"""
+    if PRIMARY_READS.get():
+        read_user = None
+    
+    def run():
+        token = index.READ_USER.set(read_user)
+        try:
+            return fn(*args)
+        finally:
+            index.READ_USER.reset(token)
+    return await asyncio.get_running_loop().run_in_executor(None, run)
+
+async def handler(event: dict, context) -> dict:
+    """API для управления роботами-мойщиками окон (asyncio)"""
+    return compress_response(event, await route_request(event))
+
+async def route_request(event: dict) -> dict:
+    """Маршрутизация запроса к обработчику"""
+    method = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return options_response('GET, POST, PUT, DELETE, OPTIONS', 'Content-Type, Authorization, Idempotency-Key, X-Read-Primary-Until')
+    
+    limited = rate_limit('ip', client_ip(event), RATE_LIMITS)
+    if limited:
+        return limited
+    
+    route, params = router.match(method, request_segments(event))
+    if route is None:
+        return error_response('Endpoint not found', 404)
+    
+    return await route.call({'event': event, 'params': params, 'route': route})
+
+async def instrument(ctx: dict, call_next) -> dict:
+    """Время обработки маршрута в Server-Timing"""
+    started = time.perf_counter()
+    return server_timing(await call_next(), 'app', started)
+
+async def authenticate(ctx: dict, call_next) -> dict:
+    """Проверка JWT, user_id в контекст запроса"""
+    ctx['user_id'] = get_user_from_token(ctx['event'])
+    if not ctx['user_id']:
+        return error_response('Unauthorized', 401)
+    return await call_next()
+
+async def limit_reads(ctx: dict, call_next) -> dict:
+    """Лимит чтений на пользователя"""
+    return rate_limit('read', ctx['user_id'], RATE_LIMITS) or await call_next()
+
+async def limit_writes(ctx: dict, call_next) -> dict:
+    """Лимит записей на пользователя"""
+    return rate_limit('write', ctx['user_id'], RATE_LIMITS) or await call_next()
+
+def check_breakers(read_only: bool) -> None:
+    """Unavailable, если основная БД, а для чтений и реплики, за открытыми предохранителями"""
+    names = [PRIMARY_BREAKER, READ_BREAKER] if read_only and dbrouter.read_urls() else [PRIMARY_BREAKER]
+    waits = [get_breaker(name).retry_after() for name in names]
+    if all(waits):
+        raise Unavailable(PRIMARY_BREAKER, min(waits))
+
+async def guard_reads(ctx: dict, call_next) -> dict:
+    """503 без обращения к БД, пока основная БД и реплики за открытыми предохранителями"""
+    try:
+        check_breakers(read_only=True)
+    except Unavailable as e:
+        return unavailable_response(e)
+    return await call_next()
+
+async def guard_writes(ctx: dict, call_next) -> dict:
+    """503 без обращения к БД, пока основная БД за открытым предохранителем"""
+    try:
+        check_breakers(read_only=False)
+    except Unavailable as e:
+        return unavailable_response(e)
+    return await call_next()
+
+async def read_replica(ctx: dict, call_next) -> dict:
+    """Чтения маршрута идут на основную БД, если клиент прислал X-Read-Primary-Until"""
+    if not dbrouter.get_router().sticky_request(ctx['event']):
+        return await call_next()
+    token = PRIMARY_READS.set(True)
+    try:
+        return await call_next()
+    finally:
+        PRIMARY_READS.reset(token)
+
+async def stick_to_primary(ctx: dict, call_next) -> dict:
+    """После успешной записи чтения пользователя какое-то время идут на основную БД"""
+    response = await call_next()
+    if response['statusCode'] < 400:
+        dbrouter.get_router().stick(response, ctx['user_id'])
+    return response
+
+async def idempotent(ctx: dict, call_next) -> dict:
+    """Повторы команды с тем же Idempotency-Key получают первый ответ"""
+    return await run_idempotent(ctx['event'], ctx['user_id'], call_next)
+
+READ = (instrument, authenticate, limit_reads, guard_reads, read_replica)
+WRITE = (instrument, authenticate, limit_writes, guard_writes, stick_to_primary)
+
+router = Router()
+router.add('GET', '/', lambda ctx: list_robots(ctx['event'], ctx['user_id']), *READ)
+router.add('GET', '/{id}', lambda ctx: get_robot(ctx['user_id'], ctx['params']['id']), *READ)
+router.add('POST', '/connect', lambda ctx: connect_robot(ctx['event'], ctx['user_id']), *WRITE, idempotent)
+router.add('POST', '/import', lambda ctx: in_thread(index.bulk_import, ctx['event'], ctx['user_id']), *WRITE)
+router.add('POST', '/plan', lambda ctx: in_thread(index.plan_facade, ctx['event']), *WRITE)
+router.add('PUT', '/{id}', lambda ctx: update_robot(ctx['event'], ctx['user_id'], ctx['params']['id']), *WRITE)
+router.add('POST', '/{id}/control', lambda ctx: control_robot(ctx['event'], ctx['user_id'], ctx['params']['id']), *WRITE, idempotent)
+router.add('DELETE', '/{id}', lambda ctx: delete_robot(ctx['user_id'], ctx['params']['id']), *WRITE)
+router.add('POST', '/{id}/coverage', lambda ctx: in_thread(index.upload_coverage, ctx['event'], ctx['user_id'], ctx['params']['id']), *WRITE)
+router.add('GET', '/{id}/coverage', lambda ctx: in_thread(index.list_coverage, ctx['event'], ctx['user_id'], ctx['params']['id'], read_user=ctx['user_id']), *READ)
+router.add('GET', '/{id}/coverage/{session_id}', lambda ctx: in_thread(index.get_coverage, ctx['user_id'], ctx['params']['id'], ctx['params']['session_id'], read_user=ctx['user_id']), *READ)
+router.add('GET', '/{id}/coverage/{session_id}/bitmap', lambda ctx: in_thread(index.get_coverage_bitmap, ctx['event'], ctx['user_id'], ctx['params']['id'], ctx['params']['session_id'], read_user=ctx['user_id']), *READ)
+router.add('GET', '/export', lambda ctx: in_thread(index.export_data, ctx['event'], ctx['user_id'], read_user=ctx['user_id']), *READ)
+router.add('GET', '/orgs', lambda ctx: in_thread(index.list_organizations, ctx['user_id'], read_user=ctx['user_id']), *READ)
+router.add('POST', '/orgs', lambda ctx: in_thread(index.create_organization, ctx['event'], ctx['user_id']), *WRITE)
+router.add('POST', '/orgs/{org_id}/members', lambda ctx: in_thread(index.add_member, ctx['event'], ctx['user_id'], ctx['params']['org_id']), *WRITE)
+router.add('DELETE', '/orgs/{org_id}/members/{member_id}', lambda ctx: in_thread(index.remove_member, ctx['user_id'], ctx['params']['org_id'], ctx['params']['member_id']), *WRITE)
+
+async def run_idempotent(event: dict, user_id: int, action) -> dict:
+    """Выполнить команду один раз на Idempotency-Key, повторам вернуть сохранённый ответ"""
+    key = get_header(event, 'Idempotency-Key')
+    if not key:
+        return await action()
+    
+    if len(key) > idempotency.MAX_KEY_LENGTH:
+        return error_response('Idempotency-Key is too long', 400)
+    
+    fingerprint = idempotency.request_fingerprint(event)
+    
+    try:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            for _ in range(idempotency.CLAIM_ATTEMPTS):
+                claimed = await conn.fetchval(
+                    q(idempotency.CLAIM_KEY), user_id, key, fingerprint, idempotency.CLAIM_LEASE_SECONDS
+                )
+                if claimed is not None:
+                    break
+                row = await conn.fetchrow(q(idempotency.FIND_KEY), user_id, key)
+                if row:
+                    return idempotency.replay_response(idempotency.stored_entry(row), fingerprint)
+            else:
+                return idempotency.replay_response(idempotency.pending_entry(fingerprint), fingerprint)
+        
+        response = await action()
+        
+        async with pool.acquire() as conn:
+            if response['statusCode'] >= 500:
+                await conn.execute(q(idempotency.RELEASE_KEY), user_id, key)
+            else:
+                await conn.execute(
+                    q(idempotency.STORE_RESPONSE), response['statusCode'], response['body'],
+                    idempotency.KEY_TTL_HOURS, user_id, key
+                )
+            await conn.execute(q(idempotency.EVICT_EXPIRED), idempotency.EVICT_BATCH_SIZE)
+        return response
+    
+    except Exception as e:
+        return failure_response(e)
+
+async def org_roles(conn, user_id: int, allowed: tuple = membership.READ_ROLES) -> dict:
+    """Роли пользователя в организациях для проверки ролей allowed: для чтения — из кеша
+    инстанса, при промахе и для записи — одним запросом"""
+    cache = membership.get_cache()
+    roles = None if membership.fresh_roles(allowed) else cache.get(user_id)
+    if roles is None:
+        roles = {row['org_id']: row['role'] for row in await conn.fetch(q(membership.FIND_MEMBERSHIPS), user_id)}
+        cache.put(user_id, roles)
+    return roles
+
+async def access(conn, user_id: int, allowed: tuple) -> tuple:
+    """Параметры условия доступа ACCESS: user_id и организации с одной из ролей allowed"""
+    return user_id, membership.org_ids(await org_roles(conn, user_id, allowed), allowed)
+
+async def list_robots(event: dict, user_id: int) -> dict:
+    """Получить список роботов пользователя"""
+    if (event.get('queryStringParameters') or {}).get('org_id'):
+        return await list_org_robots(event, user_id)
+    
+    try:
+        pool = await get_read_pool(user_id)
+        if os.environ.get('ROBOTS_LIST_MODE') == 'db_json':
+            robots_json, tasks = await pool.fetchrow(q(LIST_ROBOTS_JSON), user_id)
+            return polling.with_poll_interval(raw_json_response('{"robots":[' + robots_json + ']}'), tasks)
+        
+        rows = await pool.fetch(q(LIST_ROBOTS), user_id)
+        return polling.with_poll_interval(json_response({'robots': [dict(row) for row in rows]}),
+                                          [row['current_task'] for row in rows])
+    
+    except Exception as e:
+        return failure_response(e)
+
+async def list_org_robots(event: dict, user_id: int) -> dict:
+    """Страница роботов организации по курсору (created_at, id)"""
+    params = event.get('queryStringParameters') or {}
+    try:
+        org_id = int(params['org_id'])
+        limit = max(1, min(int(params.get('limit') or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        after = parse_cursor(params['cursor']) if params.get('cursor') else ()
+    except ValueError as e:
+        return error_response(str(e) if str(e) == 'Invalid cursor' else 'Invalid org_id or limit', 400)
+    
+    try:
+        pool = await get_read_pool(user_id)
+        async with pool.acquire() as conn:
+            if (await org_roles(conn, user_id)).get(org_id) not in membership.READ_ROLES:
+                return error_response('Organization not found', 404)
+            
+            rows = await conn.fetch(q(LIST_ORG_ROBOTS, after=PAGE_AFTER if after else ''), org_id, *after, limit)
+        
+        robots = [dict(row) for row in rows]
+        next_cursor = page_cursor(robots[-1]) if len(robots) == limit else None
+        return polling.with_poll_interval(json_response({'robots': robots, 'next_cursor': next_cursor}),
+                                          [robot['current_task'] for robot in robots])
+    
+    except Exception as e:
+        return failure_response(e)
+
+async def get_robot(user_id: int, robot_id: str) -> dict:
+    """Получить данные конкретного робота"""
+    robot_id = parse_id(robot_id)
+    if robot_id is None:
+        return error_response('Robot not found', 404)
+    
+    try:
+        pool = await get_read_pool(user_id)
+        async with pool.acquire() as conn:
+            row = await conn.fetchrow(q(GET_ROBOT), robot_id, *await access(conn, user_id, membership.READ_ROLES))
+        
+        if not row:
+            return error_response('Robot not found', 404)
+        
+        return polling.with_poll_interval(json_response(dict(row)), [row['current_task']])
+    
+    except Exception as e:
+        return failure_response(e)
+
+async def connect_robot(event: dict, user_id: int) -> dict:
+    """Подключить нового робота"""
+    try:
+        body = loads(event.get('body', '{}'))
+        name = body.get('name', 'VÖLM Robot')
+        model = body.get('model', 'VLM-2024')
+        has_cleaning = body.get('has_cleaning', True)
+        org_id = body.get('org_id')
+        
+        if org_id is not None and (isinstance(org_id, bool) or not isinstance(org_id, int)):
+            return error_response('org_id must be an integer', 400)
+        
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                if org_id is None:
+                    count = await conn.fetchval(q(COUNT_ROBOTS), user_id)
+                    limit = PERSONAL_ROBOT_LIMIT
+                else:
+                    if (await org_roles(conn, user_id, membership.WRITE_ROLES)).get(org_id) not in membership.WRITE_ROLES:
+                        return error_response('Organization not found', 404)
+                    limit = await conn.fetchval(q(membership.FIND_ROBOT_LIMIT), org_id)
+                    count = await conn.fetchval(q(COUNT_ORG_ROBOTS), org_id)
+                
+                if limit is not None and count >= limit:
+                    return error_response(f'Maximum {limit} robots allowed', 400)
+                
+                row = await conn.fetchrow(
+                    q(INSERT_ROBOT),
+                    user_id, f"{name} #{count + 1}", model, has_cleaning, 100, 'online', 'idle', False, org_id
+                )
+                log = events.EventLog(user_id)
+                log.add(row['id'], events.CONNECTED, events.snapshot(dict(row), user_id=user_id, archived=False))
+                await write_events(conn, log)
+        
+        return json_response(dict(row), 201)
+    
+    except Exception as e:
+        return failure_response(e)
+
+async def update_robot(event: dict, user_id: int, robot_id: str) -> dict:
+    """Обновить данные робота"""
+    robot_id = parse_id(robot_id)
+    if robot_id is None:
+        return error_response('Robot not found', 404)
+    
+    try:
+        body = loads(event.get('body', '{}'))
+        
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            scope = await access(conn, user_id, membership.WRITE_ROLES)
+            if not await conn.fetchrow(q(FIND_ROBOT), robot_id, *scope):
+                return error_response('Robot not found', 404)
+            
+            fields = [field for field in UPDATABLE_FIELDS if field in body]
+            
+            if not fields:
+                return error_response('No fields to update', 400)
+            
+            assignments = ', '.join(f'{field} = %s' for field in fields)
+            values = [body[field] for field in fields] + [robot_id, *scope]
+            async with conn.transaction():
+                robot = dict(await conn.fetchrow(q(UPDATE_ROBOT, assignments=assignments), *values))
+                log = events.EventLog(user_id)
+                log.add(robot['id'], events.UPDATED, events.changes(robot, fields))
+                
+                if 'battery_level' in body or 'current_task' in body:
+                    robot = await track_battery(conn, robot, scope, log)
+                await write_events(conn, log)
+        
+        return json_response(robot)
+    
+    except Exception as e:
+        return failure_response(e)
+
+async def control_robot(event: dict, user_id: int, robot_id: str) -> dict:
+    """Управление роботом (start/stop/pause)"""
+    try:
+        body = loads(event.get('body', '{}'))
+        action = body.get('action')
+        
+        if action not in TASK_MAP:
+            return error_response('Invalid action. Use: start, stop, pause', 400)
+        
+        robot_id = parse_id(robot_id)
+        if robot_id is None:
+            return error_response('Robot not found', 404)
+        
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            scope = await access(conn, user_id, membership.WRITE_ROLES)
+            robot = await conn.fetchrow(q(FIND_ROBOT), robot_id, *scope)
+            
+            if not robot:
+                return error_response('Robot not found', 404)
+            
+            if not robot['has_cleaning'] and action == 'start':
+                return error_response('This robot does not have cleaning capability', 400)
+            
+            current_task, is_active = TASK_MAP[action]
+            async with conn.transaction():
+                row = await conn.fetchrow(q(SET_ROBOT_TASK), current_task, is_active, robot_id, *scope)
+                log = events.EventLog(user_id)
+                log.add(robot_id, events.CONTROLLED, events.changes(row, ('current_task', 'is_active')))
+                robot = await track_battery(conn, dict(row), scope, log)
+                await write_events(conn, log)
+        
+        return json_response(robot)
+    
+    except Exception as e:
+        return failure_response(e)
+
+async def record_battery(conn, robot: dict) -> tuple:
+    """Учесть замер робота; вернуть оценку скорости разряда и прошлый замер (как battery.record_sample)"""
+    state = await conn.fetchrow(q(battery.FIND_STATE), robot['id'])
+    rate, samples = (state['drain_rate'], state['samples']) if state else (None, 0)
+    
+    sample = battery.drain_sample(state, robot['battery_level'])
+    if sample is not None:
+        rate = battery.ewma(rate, sample)
+        samples += 1
+    if sample is not None and robot['model']:
+        await conn.execute(q(battery.UPDATE_MODEL_RATE), robot['model'], sample, battery.ALPHA)
+    
+    await conn.execute(
+        q(battery.SAVE_STATE), robot['id'], robot['battery_level'], robot['current_task'], rate, samples
+    )
+    await conn.execute(q(battery.INSERT_TELEMETRY), robot['id'], robot['battery_level'], robot['current_task'])
+    
+    if rate is None:
+        rate = await conn.fetchval(q(battery.FIND_MODEL_RATE), robot['model'])
+    return rate, state
+
+async def track_battery(conn, robot: dict, scope: tuple, log: events.EventLog) -> dict:
+    """Учесть замер батареи; моющего робота, который вот-вот разрядится, поставить на паузу; события — в уведомления"""
+    rate, previous = await record_battery(conn, robot)
+    robot = battery.predict(robot, rate)
+    notices = notifications.detect(previous, robot)
+    
+    if battery.should_pause(robot):
+        current_task, is_active = TASK_MAP['pause']
+        row = await conn.fetchrow(q(SET_ROBOT_TASK), current_task, is_active, robot['id'], *scope)
+        log.add(robot['id'], events.AUTO_PAUSED, events.changes(row, ('current_task', 'is_active')))
+        robot = battery.predict(dict(row), (await record_battery(conn, dict(row)))[0])
+        notices.append(notifications.AUTO_PAUSED)
+    
+    if notices:
+        await conn.execute(q(notifications.QUEUE_NOTIFICATION), robot['id'], notices, notifications.payload(robot))
+    return robot
+
+async def write_events(conn, log: events.EventLog) -> None:
+    """Записать события запроса в robot_events одним запросом"""
+    if log.events:
+        await conn.execute(q(events.INSERT_EVENTS), *log.params())
+
+async def delete_robot(user_id: int, robot_id: str) -> dict:
+    """Удалить робота (мягкое удаление)"""
+    robot_id = parse_id(robot_id)
+    if robot_id is None:
+        return error_response('Robot not found', 404)
+    
+    try:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                result = await conn.fetchval(q(ARCHIVE_ROBOT), robot_id, *await access(conn, user_id, membership.ADMIN_ROLES))
+                if result:
+                    log = events.EventLog(user_id)
+                    log.add(result, events.ARCHIVED, {'archived': True})
+                    await write_events(conn, log)
+        
+        if not result:
+            return error_response('Robot not found', 404)
+        
+        return json_response({'message': 'Robot deleted successfully'})
+    
+    except Exception as e:
+        return failure_response(e)
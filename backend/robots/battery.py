@@ -0,0 +1,87 @@
+"""Модель разряда батареи: скорость разряда во время мойки по роботу и по модели
+
+Каждый замер battery_level обновляет экспоненциальное скользящее среднее скорости
+разряда (%/ч) за O(1): хранится только последний замер и текущая оценка, история
+в robot_telemetry нужна лишь для пересчёта tools/battery_refit.py. Роботы без
+собственной истории получают оценку своей модели.
+"""
+import math
+import os
+from queries import sql
+
+ALPHA = 0.2
+MIN_SAMPLE_HOURS = 1 / 60
+MAX_SAMPLE_HOURS = 2
+DEFAULT_PAUSE_MINUTES = 10
+
+FIND_STATE = """SELECT last_level, last_task,
+(EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - last_at) / 3600)::float8 AS hours, drain_rate, samples
+FROM {schema}.battery_states
+WHERE robot_id = %s
+FOR UPDATE"""
+
+SAVE_STATE = """INSERT INTO {schema}.battery_states (robot_id, last_level, last_task, last_at, drain_rate, samples)
+VALUES (%s, %s, %s, CURRENT_TIMESTAMP, %s, %s)
+ON CONFLICT (robot_id) DO UPDATE
+SET last_level = EXCLUDED.last_level, last_task = EXCLUDED.last_task, last_at = EXCLUDED.last_at,
+    drain_rate = EXCLUDED.drain_rate, samples = EXCLUDED.samples"""
+
+UPDATE_MODEL_RATE = """INSERT INTO {schema}.battery_model_rates AS m (model, drain_rate, samples)
+VALUES (%s, %s, 1)
+ON CONFLICT (model) DO UPDATE
+SET drain_rate = m.drain_rate + %s * (EXCLUDED.drain_rate - m.drain_rate), samples = m.samples + 1"""
+
+FIND_MODEL_RATE = """SELECT drain_rate FROM {schema}.battery_model_rates WHERE model = %s"""
+
+INSERT_TELEMETRY = """INSERT INTO {schema}.robot_telemetry (robot_id, battery_level, current_task)
+VALUES (%s, %s, %s)"""
+
+def drain_sample(state, level):
+    """Скорость разряда (%/ч) с прошлого замера или None, если интервал не был мойкой с падением заряда"""
+    if state is None or level is None:
+        return None
+    last_level, last_task, hours = state[0], state[1], state[2]
+    if last_task != 'cleaning' or last_level is None or level >= last_level:
+        return None
+    if not MIN_SAMPLE_HOURS <= hours <= MAX_SAMPLE_HOURS:
+        return None
+    return (last_level - level) / hours
+
+def ewma(rate, sample: float) -> float:
+    """Шаг экспоненциального среднего; первая оценка — сам замер"""
+    return sample if rate is None else rate + ALPHA * (sample - rate)
+
+def predict(robot: dict, rate) -> dict:
+    """Добавить к роботу скорость разряда и минуты мойки до нуля (как в queries.battery_prediction)"""
+    robot['drain_rate'] = round(rate, 2) if rate is not None else None
+    level = robot.get('battery_level')
+    robot['cleaning_minutes_left'] = math.floor(level * 60 / rate) if rate and level is not None else None
+    return robot
+
+def should_pause(robot: dict) -> bool:
+    """Моющий робот сядет раньше, чем через BATTERY_PAUSE_MINUTES"""
+    minutes = robot.get('cleaning_minutes_left')
+    limit = float(os.environ.get('BATTERY_PAUSE_MINUTES') or DEFAULT_PAUSE_MINUTES)
+    return robot.get('current_task') == 'cleaning' and minutes is not None and minutes <= limit
+
+def record_sample(cur, robot: dict) -> tuple:
+    """Учесть замер робота (строка ROBOT_FIELDS); вернуть оценку скорости разряда и прошлый замер (строку FIND_STATE)"""
+    cur.execute(sql(FIND_STATE), (robot['id'],))
+    state = cur.fetchone()
+    rate, samples = (state[3], state[4]) if state else (None, 0)
+    
+    sample = drain_sample(state, robot['battery_level'])
+    if sample is not None:
+        rate = ewma(rate, sample)
+        samples += 1
+    if sample is not None and robot['model']:
+        cur.execute(sql(UPDATE_MODEL_RATE), (robot['model'], sample, ALPHA))
+    
+    cur.execute(sql(SAVE_STATE), (robot['id'], robot['battery_level'], robot['current_task'], rate, samples))
+    cur.execute(sql(INSERT_TELEMETRY), (robot['id'], robot['battery_level'], robot['current_task']))
+    
+    if rate is None:
+        cur.execute(sql(FIND_MODEL_RATE), (robot['model'],))
+        row = cur.fetchone()
+        rate = row[0] if row else None
+    return rate, state
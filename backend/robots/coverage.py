@@ -0,0 +1,133 @@
+"""Карты покрытия стёкол: битовая сетка, упакованная по 8 клеток в байт и сжатая zlib
+
+Клетки идут построчно, старший бит байта — первая клетка (как numpy.packbits).
+Сохранённый blob — поток zlib, его можно отдавать клиенту как Content-Encoding: deflate
+без распаковки.
+"""
+import base64
+import binascii
+import zlib
+from queries import ACCESS
+from responses import allowed_origin
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ENCODING = 'packbits-zlib'
+BITMAP_FORMAT = 'packbits-msb'
+COMPRESS_LEVEL = 1
+MAX_CELLS = 4096 * 4096
+
+SESSION_FIELDS = 'id, robot_id, pane_id, width, height, covered_cells, created_at'
+
+INSERT_SESSION = f"""INSERT INTO {{schema}}.coverage_sessions
+(robot_id, user_id, pane_id, width, height, covered_cells, encoding, bitmap)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+RETURNING {SESSION_FIELDS}"""
+
+# Доступ к роботу проверяется тем же условием, что и в queries.py: user_id, org_id из кеша членства.
+ROBOT_SCOPE = f"""robot_id = (SELECT id FROM {{schema}}.robots WHERE id = %s AND {ACCESS})"""
+
+LIST_SESSIONS = f"""SELECT {SESSION_FIELDS}
+FROM {{schema}}.coverage_sessions
+WHERE {ROBOT_SCOPE}
+ORDER BY created_at DESC, id DESC
+LIMIT %s"""
+
+GET_SESSION = f"""SELECT {SESSION_FIELDS}
+FROM {{schema}}.coverage_sessions
+WHERE id = %s AND {ROBOT_SCOPE}"""
+
+GET_BITMAP = f"""SELECT width, height, encoding, bitmap
+FROM {{schema}}.coverage_sessions
+WHERE id = %s AND {ROBOT_SCOPE}"""
+
+def pack_cells(cells: list) -> bytes:
+    """Сетка 0/1 (список строк) → упакованные биты"""
+    if numpy is not None:
+        return numpy.packbits(numpy.asarray(cells, dtype=bool).ravel()).tobytes()
+    
+    packed = bytearray()
+    byte = 0
+    count = 0
+    for row in cells:
+        for cell in row:
+            byte = (byte << 1) | (1 if cell else 0)
+            count += 1
+            if count == 8:
+                packed.append(byte)
+                byte = 0
+                count = 0
+    if count:
+        packed.append(byte << (8 - count))
+    return bytes(packed)
+
+def count_covered(packed: bytes, total_cells: int) -> int:
+    """Число покрытых клеток без распаковки в список"""
+    padding = len(packed) * 8 - total_cells
+    return (int.from_bytes(packed, 'big') >> padding).bit_count()
+
+def parse_upload(body: dict) -> dict:
+    """Проверить загрузку сессии; ValueError с текстом для клиента"""
+    if 'cells' in body:
+        cells = body['cells']
+        if not isinstance(cells, list) or not cells or not isinstance(cells[0], list):
+            raise ValueError('cells must be a non-empty list of rows')
+        height, width = len(cells), len(cells[0])
+        if any(len(row) != width for row in cells):
+            raise ValueError('All rows in cells must have the same length')
+        if width * height > MAX_CELLS:
+            raise ValueError(f'Bitmap is larger than {MAX_CELLS} cells')
+        packed = pack_cells(cells)
+    else:
+        width, height = body.get('width'), body.get('height')
+        if not isinstance(width, int) or not isinstance(height, int) or width <= 0 or height <= 0:
+            raise ValueError('width and height must be positive integers')
+        if width * height > MAX_CELLS:
+            raise ValueError(f'Bitmap is larger than {MAX_CELLS} cells')
+        try:
+            packed = base64.b64decode(body.get('bitmap') or '', validate=True)
+        except (binascii.Error, TypeError):
+            raise ValueError('bitmap must be base64-encoded packed bits')
+        if len(packed) != (width * height + 7) // 8:
+            raise ValueError('bitmap size does not match width * height')
+    
+    return {
+        'pane_id': body.get('pane_id'),
+        'width': width,
+        'height': height,
+        'covered_cells': count_covered(packed, width * height),
+        'bitmap': zlib.compress(packed, COMPRESS_LEVEL)
+    }
+
+def session_summary(session: dict) -> dict:
+    """Сессия с процентом покрытия"""
+    total = session['width'] * session['height']
+    session['coverage_percent'] = round(session['covered_cells'] * 100 / total, 2) if total else 0.0
+    return session
+
+def bitmap_response(row: tuple, accept_encoding: set) -> dict:
+    """Сохранённая битовая карта как есть: поток zlib отдаётся с Content-Encoding: deflate"""
+    width, height, encoding, blob = row
+    blob = bytes(blob)
+    headers = {
+        'Content-Type': 'application/octet-stream',
+        'Access-Control-Allow-Origin': allowed_origin(),
+        'Access-Control-Expose-Headers': 'X-Coverage-Width, X-Coverage-Height, X-Coverage-Format',
+        'X-Coverage-Width': str(width),
+        'X-Coverage-Height': str(height),
+        'X-Coverage-Format': BITMAP_FORMAT,
+        'Vary': 'Accept-Encoding'
+    }
+    if 'deflate' in accept_encoding or '*' in accept_encoding:
+        headers['Content-Encoding'] = 'deflate'
+    else:
+        blob = zlib.decompress(blob)
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': base64.b64encode(blob).decode('ascii'),
+        'isBase64Encoded': True
+    }
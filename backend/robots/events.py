@@ -0,0 +1,55 @@
+"""Журнал изменений роботов robot_events: только добавление, в той же транзакции, что и само изменение
+
+События запроса копятся в EventLog и вставляются одним INSERT ... SELECT FROM unnest перед
+коммитом: журнал стоит один запрос на запрос, а не на событие. В data лежат только
+изменившиеся поля робота, поэтому свёртка событий робота по порядку id (apply) даёт его
+состояние — так же её считает tools/robot_events.py replay. Таблица секционирована по месяцам,
+секции заранее создаёт tools/robot_events.py partitions.
+"""
+from serializer import dumps
+
+CONNECTED = 'connected'
+UPDATED = 'updated'
+CONTROLLED = 'controlled'
+AUTO_PAUSED = 'auto_paused'
+ARCHIVED = 'archived'
+IMPORTED = 'imported'
+
+STATE_FIELDS = (
+    'user_id', 'name', 'model', 'has_cleaning', 'battery_level', 'status', 'current_task', 'is_active', 'org_id', 'archived',
+    'serial_number'
+)
+
+INSERT_EVENTS = """INSERT INTO {schema}.robot_events (robot_id, actor_id, event_type, data)
+SELECT e.robot_id, %s, e.event_type, e.data::jsonb
+FROM unnest(%s::integer[], %s::text[], %s::text[]) WITH ORDINALITY AS e (robot_id, event_type, data, n)
+ORDER BY e.n"""
+
+class EventLog:
+    """События одного запроса от имени actor_id"""
+    
+    def __init__(self, actor_id: int):
+        self.actor_id = actor_id
+        self.events = []
+    
+    def add(self, robot_id: int, event_type: str, data: dict) -> None:
+        """Добавить событие; в БД оно попадёт вместе с остальными"""
+        self.events.append((robot_id, event_type, dumps(data)))
+    
+    def params(self) -> tuple:
+        """Параметры INSERT_EVENTS: автор и по массиву на колонку"""
+        robot_ids, event_types, data = zip(*self.events)
+        return self.actor_id, list(robot_ids), list(event_types), list(data)
+
+def snapshot(robot: dict, **extra) -> dict:
+    """Полное состояние робота для события connected"""
+    return {**{field: robot.get(field) for field in STATE_FIELDS}, **extra}
+
+def changes(robot: dict, fields) -> dict:
+    """Значения изменённых полей, как их сохранила БД"""
+    return {field: robot[field] for field in fields}
+
+def apply(state: dict, data: dict) -> dict:
+    """Применить событие к состоянию робота"""
+    state.update((field, value) for field, value in data.items() if field in STATE_FIELDS)
+    return state
@@ -0,0 +1,174 @@
+"""Потоковая выгрузка роботов и истории телеметрии в NDJSON или CSV, по желанию в gzip
+
+Строки читаются именованным (серверным) курсором через fetchmany по FETCH_SIZE и сразу
+превращаются в байты, gzip сжимает поток по кускам, поэтому память не зависит от числа строк.
+Используется маршрутом GET /export и tools/fleet_export.py.
+"""
+import csv
+import io
+import zlib
+from datetime import date, datetime
+from serializer import dumps
+from queries import ACCESS, ACCESS_R
+
+FETCH_SIZE = 5000
+GZIP_LEVEL = 6
+MAX_BUFFERED_BYTES = 3 * 1024 * 1024
+
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+
+EXPORT_ROBOTS = f"""SELECT id, serial_number, name, model, has_cleaning, battery_level, status, current_task, is_active,
+org_id, created_at, updated_at
+FROM {{schema}}.robots
+WHERE {ACCESS} AND (archived IS NULL OR archived = false){{filters}}
+ORDER BY id"""
+
+EXPORT_TELEMETRY = f"""SELECT t.robot_id, r.name AS robot_name, t.battery_level, t.current_task, t.recorded_at
+FROM {{schema}}.robot_telemetry t
+JOIN {{schema}}.robots r ON r.id = t.robot_id
+WHERE {ACCESS_R}{{filters}}
+ORDER BY t.robot_id, t.recorded_at, t.id"""
+
+DATASETS = {
+    'robots': (EXPORT_ROBOTS, {'robot_id': ' AND id = %s'}),
+    'telemetry': (EXPORT_TELEMETRY, {
+        'robot_id': ' AND t.robot_id = %s',
+        'since': ' AND t.recorded_at >= %s',
+        'until': ' AND t.recorded_at < %s',
+    }),
+}
+
+def parse_params(params: dict) -> dict:
+    """Параметры выгрузки из query string; ValueError с текстом для 400"""
+    dataset = params.get('dataset') or 'robots'
+    if dataset not in DATASETS:
+        raise ValueError('dataset must be one of: ' + ', '.join(DATASETS))
+    fmt = params.get('format') or 'ndjson'
+    if fmt not in CONTENT_TYPES:
+        raise ValueError('format must be one of: ' + ', '.join(CONTENT_TYPES))
+    
+    filters = {}
+    try:
+        if params.get('robot_id'):
+            filters['robot_id'] = int(params['robot_id'])
+        for name in ('since', 'until'):
+            if params.get(name):
+                filters[name] = datetime.fromisoformat(params[name])
+    except ValueError:
+        raise ValueError('robot_id must be an integer, since and until ISO 8601 timestamps')
+    unsupported = set(filters) - set(DATASETS[dataset][1])
+    if unsupported:
+        raise ValueError(f'{dataset} export does not support: ' + ', '.join(sorted(unsupported)))
+    
+    return {
+        'dataset': dataset,
+        'format': fmt,
+        'gzip': (params.get('gzip') or '').lower() in ('1', 'true', 'on'),
+        'filters': filters,
+    }
+
+def build_query(request: dict) -> tuple:
+    """(шаблон запроса, условия фильтров для {filters}, их параметры после параметров ACCESS)"""
+    query, clauses = DATASETS[request['dataset']]
+    filters = request['filters']
+    return query, ''.join(clauses[name] for name in filters), tuple(filters.values())
+
+def filename(request: dict) -> str:
+    """Имя файла выгрузки для Content-Disposition"""
+    return f"{request['dataset']}.{request['format']}" + ('.gz' if request['gzip'] else '')
+
+def csv_value(value):
+    """Значение ячейки CSV: пустая строка для NULL, ISO 8601 для дат"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def encode_csv(columns: list, rows: list) -> bytes:
+    """Строки CSV"""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows([csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue().encode('utf-8')
+
+def encode_ndjson(columns: list, rows: list) -> bytes:
+    """По JSON-объекту на строку"""
+    return ''.join(dumps(dict(zip(columns, row))) + '\n' for row in rows).encode('utf-8')
+
+ENCODERS = {'csv': encode_csv, 'ndjson': encode_ndjson}
+
+def open_stream(conn, query: str, params: tuple, fmt: str, compress: bool, fetch_size: int = FETCH_SIZE):
+    """Выполнить запрос выгрузки и вернуть ExportStream
+    
+    Запрос и первая пачка выполняются сразу, так что ошибки БД возникают до первого байта ответа.
+    """
+    cur = conn.cursor(name='export')
+    try:
+        cur.execute(query, params)
+        rows = cur.fetchmany(fetch_size)
+    except Exception:
+        cur.close()
+        conn.close()
+        raise
+    return ExportStream(conn, cur, rows, fmt, compress, fetch_size)
+
+class ExportStream:
+    """Куски байтов выгрузки, по одному на fetchmany; владеет курсором и соединением"""
+    
+    def __init__(self, conn, cur, rows: list, fmt: str, compress: bool, fetch_size: int):
+        self.conn = conn
+        self.cur = cur
+        self.columns = [column.name for column in cur.description]
+        self.chunks = self.generate(rows, fmt, compress, fetch_size)
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self) -> bytes:
+        return next(self.chunks)
+    
+    def generate(self, rows: list, fmt: str, compress: bool, fetch_size: int):
+        """Кодировать пачки строк и дочитывать следующие"""
+        encode = ENCODERS[fmt]
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+        if fmt == 'csv':
+            rows = [self.columns] + rows
+        try:
+            while rows:
+                chunk = encode(self.columns, rows)
+                if compressor is not None:
+                    chunk = compressor.compress(chunk)
+                if chunk:
+                    yield chunk
+                rows = self.cur.fetchmany(fetch_size)
+            if compressor is not None:
+                yield compressor.flush()
+        finally:
+            self.release()
+    
+    def close(self) -> None:
+        """Прервать поток; курсор и соединение освобождаются, даже если чтение не начиналось"""
+        self.chunks.close()
+        self.release()
+    
+    def release(self) -> None:
+        """Закрыть курсор и соединение (подключение из пула возвращается в пул)"""
+        if not self.cur.closed:
+            self.cur.close()
+        if not self.conn.closed:
+            self.conn.close()
+
+def collect(chunks, limit: int = MAX_BUFFERED_BYTES):
+    """Собрать поток в bytes для рантайма без потоковых ответов; None, если вышло больше limit"""
+    parts, size = [], 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            if size > limit:
+                return None
+            parts.append(chunk)
+    finally:
+        chunks.close()
+    return b''.join(parts)
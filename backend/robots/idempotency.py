@@ -0,0 +1,94 @@
+"""Хранение ответов POST-команд по заголовку Idempotency-Key
+
+Ключ занимается на CLAIM_LEASE_SECONDS: если инстанс упал между захватом и сохранением
+ответа, повтор после истечения аренды выполнит команду заново, а не получит 409 на сутки.
+Сохранённый ответ живёт KEY_TTL_HOURS.
+"""
+import hashlib
+from queries import sql
+from responses import error_response, raw_json_response
+
+KEY_TTL_HOURS = 24
+CLAIM_LEASE_SECONDS = 60
+CLAIM_ATTEMPTS = 3
+MAX_KEY_LENGTH = 255
+EVICT_BATCH_SIZE = 500
+
+CLAIM_KEY = """INSERT INTO {schema}.idempotency_keys
+(user_id, idempotency_key, request_hash, expires_at)
+VALUES (%s, %s, %s, CURRENT_TIMESTAMP + make_interval(secs => %s))
+ON CONFLICT (user_id, idempotency_key) DO UPDATE
+SET request_hash = EXCLUDED.request_hash, status_code = NULL, response_body = NULL,
+    created_at = CURRENT_TIMESTAMP, expires_at = EXCLUDED.expires_at
+WHERE idempotency_keys.expires_at < CURRENT_TIMESTAMP
+RETURNING user_id"""
+
+FIND_KEY = """SELECT request_hash, status_code, response_body
+FROM {schema}.idempotency_keys
+WHERE user_id = %s AND idempotency_key = %s"""
+
+STORE_RESPONSE = """UPDATE {schema}.idempotency_keys
+SET status_code = %s, response_body = %s, expires_at = CURRENT_TIMESTAMP + make_interval(hours => %s)
+WHERE user_id = %s AND idempotency_key = %s"""
+
+RELEASE_KEY = """DELETE FROM {schema}.idempotency_keys WHERE user_id = %s AND idempotency_key = %s"""
+
+EVICT_EXPIRED = """DELETE FROM {schema}.idempotency_keys
+WHERE (user_id, idempotency_key) IN (
+    SELECT user_id, idempotency_key FROM {schema}.idempotency_keys
+    WHERE expires_at < CURRENT_TIMESTAMP
+    LIMIT %s FOR UPDATE SKIP LOCKED
+)"""
+
+def request_fingerprint(event: dict) -> str:
+    """Хеш метода, пути и тела запроса для сверки повторов"""
+    path = event.get('params', {}).get('path', '')
+    robot_id = event.get('pathParams', {}).get('id') or ''
+    raw = f"{event.get('httpMethod', '')} {path} {robot_id}\n{event.get('body') or ''}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def stored_entry(row) -> dict:
+    """Сохранённая запись ключа"""
+    return {'request_hash': row[0], 'status_code': row[1], 'response_body': row[2]}
+
+def pending_entry(fingerprint: str) -> dict:
+    """Запись занятого ключа, ответ на который ещё не сохранён"""
+    return {'request_hash': fingerprint, 'status_code': None, 'response_body': None}
+
+def claim_key(cur, user_id: int, key: str, fingerprint: str):
+    """Занять ключ; None если ключ занят этим запросом, иначе сохранённая запись"""
+    for _ in range(CLAIM_ATTEMPTS):
+        cur.execute(sql(CLAIM_KEY), (user_id, key, fingerprint, CLAIM_LEASE_SECONDS))
+        if cur.fetchone():
+            return None
+        
+        cur.execute(sql(FIND_KEY), (user_id, key))
+        row = cur.fetchone()
+        if row:
+            return stored_entry(row)
+        # Ключ освободили между захватом и поиском — пробуем занять снова.
+    return pending_entry(fingerprint)
+
+def replay_response(stored: dict, fingerprint: str) -> dict:
+    """Ответ на повтор запроса с уже занятым ключом"""
+    if stored['request_hash'] != fingerprint:
+        return error_response('Idempotency-Key was used with a different request', 422)
+    if stored['status_code'] is None:
+        return error_response('Request with this Idempotency-Key is in progress', 409)
+    
+    response = raw_json_response(stored['response_body'], stored['status_code'])
+    response['headers']['Idempotent-Replayed'] = 'true'
+    return response
+
+def store_response(cur, user_id: int, key: str, response: dict) -> None:
+    """Сохранить первый ответ на команду"""
+    cur.execute(sql(STORE_RESPONSE), (response['statusCode'], response['body'], KEY_TTL_HOURS, user_id, key))
+
+def release_key(cur, user_id: int, key: str) -> None:
+    """Освободить ключ, чтобы повтор мог выполнить команду заново"""
+    cur.execute(sql(RELEASE_KEY), (user_id, key))
+
+def evict_expired(cur, batch_size: int = EVICT_BATCH_SIZE) -> int:
+    """Удалить пачку истёкших ключей"""
+    cur.execute(sql(EVICT_EXPIRED), (batch_size,))
+    return cur.rowcount
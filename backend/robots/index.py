@@ -1,89 +1,325 @@
-import json
+import base64
+import io
 import os
+import time
+from concurrent.futures import TimeoutError as PlanTimeout
+from contextvars import ContextVar
 import psycopg2
-import jwt
-from datetime import datetime
+from serializer import fetch_all, fetch_one, loads
+from responses import (accepted_encodings, allowed_origin, compress_response, error_response, get_header, json_response,
+                       options_response, raw_json_response)
+import idempotency
+import battery
+import coverage
+import planner
+import membership
+import notifications
+import events
+import export
+import provisioning
+import polling
+import dbrouter
+from instrumentation import server_timing
+from resilience import Unavailable, unavailable_response
+from ratelimit import client_ip, rate_limit
+from router import Router, request_segments
+from tokens import bearer_user_id
+from queries import (ARCHIVE_ROBOT, COUNT_ORG_ROBOTS, COUNT_ROBOTS, DEFAULT_PAGE_SIZE, FIND_ROBOT, GET_ROBOT,
+                     INSERT_ROBOT, LIST_ORG_ROBOTS, LIST_ROBOTS, LIST_ROBOTS_JSON, MAX_PAGE_SIZE, PAGE_AFTER,
+                     SET_ROBOT_TASK, UPDATABLE_FIELDS, UPDATE_ROBOT, page_cursor, parse_cursor, sql)
+
+RATE_LIMITS = {
+    'ip': (120, 20.0),
+    'read': (30, 2.0),
+    'write': (20, 0.5)
+}
+
+DEFAULT_PLAN_TIMEOUT = 10.0
+PERSONAL_ROBOT_LIMIT = 2
+
+READ_USER = ContextVar('read_user', default=None)
+
+TASK_MAP = {
+    'start': ('cleaning', True),
+    'pause': ('paused', True),
+    'stop': ('idle', False)
+}
 
 def handler(event: dict, context) -> dict:
     """API для управления роботами-мойщиками окон"""
+    return compress_response(event, route_request(event))
+
+def route_request(event: dict) -> dict:
+    """Маршрутизация запроса к обработчику"""
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    user_id = get_user_from_token(event)
-    if not user_id:
+        return options_response('GET, POST, PUT, DELETE, OPTIONS', 'Content-Type, Authorization, Idempotency-Key, X-Read-Primary-Until')
+    
+    limited = rate_limit('ip', client_ip(event), RATE_LIMITS)
+    if limited:
+        return limited
+    
+    route, params = router.match(method, request_segments(event))
+    if route is None:
+        return error_response('Endpoint not found', 404)
+    
+    return route.call({'event': event, 'params': params, 'route': route})
+
+def instrument(ctx: dict, call_next) -> dict:
+    """Время обработки маршрута в Server-Timing"""
+    started = time.perf_counter()
+    return server_timing(call_next(), 'app', started)
+
+def authenticate(ctx: dict, call_next) -> dict:
+    """Проверка JWT, user_id в контекст запроса"""
+    ctx['user_id'] = get_user_from_token(ctx['event'])
+    if not ctx['user_id']:
         return error_response('Unauthorized', 401)
+    return call_next()
+
+def limit_reads(ctx: dict, call_next) -> dict:
+    """Лимит чтений на пользователя"""
+    return rate_limit('read', ctx['user_id'], RATE_LIMITS) or call_next()
+
+def limit_writes(ctx: dict, call_next) -> dict:
+    """Лимит записей на пользователя"""
+    return rate_limit('write', ctx['user_id'], RATE_LIMITS) or call_next()
+
+def idempotent(ctx: dict, call_next) -> dict:
+    """Повторы команды с тем же Idempotency-Key получают первый ответ"""
+    return run_idempotent(ctx['event'], ctx['user_id'], call_next)
+
+def failure_response(error: Exception) -> dict:
+    """Ответ маршрута на исключение: 503 с Retry-After, если БД за предохранителем
+    (он сработал посреди запроса или пробу делает другой запрос), иначе 500"""
+    if isinstance(error, Unavailable):
+        return unavailable_response(error)
+    return error_response(str(error), 500)
+
+def guard_reads(ctx: dict, call_next) -> dict:
+    """503 без обращения к БД, пока основная БД и все реплики за открытыми предохранителями"""
+    try:
+        dbrouter.get_router().check(read_only=True)
+    except Unavailable as e:
+        return unavailable_response(e)
+    return call_next()
+
+def guard_writes(ctx: dict, call_next) -> dict:
+    """503 без обращения к БД, пока основная БД за открытым предохранителем"""
+    try:
+        dbrouter.get_router().check()
+    except Unavailable as e:
+        return unavailable_response(e)
+    return call_next()
+
+def read_replica(ctx: dict, call_next) -> dict:
+    """Подключения маршрута читают с реплики, если пользователь недавно не писал"""
+    if dbrouter.get_router().sticky_request(ctx['event']):
+        return call_next()
+    token = READ_USER.set(ctx['user_id'])
+    try:
+        return call_next()
+    finally:
+        READ_USER.reset(token)
+
+def stick_to_primary(ctx: dict, call_next) -> dict:
+    """После успешной записи чтения пользователя какое-то время идут на основную БД"""
+    response = call_next()
+    if response['statusCode'] < 400:
+        dbrouter.get_router().stick(response, ctx['user_id'])
+    return response
+
+READ = (instrument, authenticate, limit_reads, guard_reads, read_replica)
+WRITE = (instrument, authenticate, limit_writes, guard_writes, stick_to_primary)
+
+router = Router()
+router.add('GET', '/', lambda ctx: list_robots(ctx['event'], ctx['user_id']), *READ)
+router.add('GET', '/{id}', lambda ctx: get_robot(ctx['user_id'], ctx['params']['id']), *READ)
+router.add('POST', '/connect', lambda ctx: connect_robot(ctx['event'], ctx['user_id']), *WRITE, idempotent)
+router.add('POST', '/import', lambda ctx: bulk_import(ctx['event'], ctx['user_id']), *WRITE)
+router.add('POST', '/plan', lambda ctx: plan_facade(ctx['event']), *WRITE)
+router.add('PUT', '/{id}', lambda ctx: update_robot(ctx['event'], ctx['user_id'], ctx['params']['id']), *WRITE)
+router.add('POST', '/{id}/control', lambda ctx: control_robot(ctx['event'], ctx['user_id'], ctx['params']['id']), *WRITE, idempotent)
+router.add('DELETE', '/{id}', lambda ctx: delete_robot(ctx['user_id'], ctx['params']['id']), *WRITE)
+router.add('POST', '/{id}/coverage', lambda ctx: upload_coverage(ctx['event'], ctx['user_id'], ctx['params']['id']), *WRITE)
+router.add('GET', '/{id}/coverage', lambda ctx: list_coverage(ctx['event'], ctx['user_id'], ctx['params']['id']), *READ)
+router.add('GET', '/{id}/coverage/{session_id}', lambda ctx: get_coverage(ctx['user_id'], ctx['params']['id'], ctx['params']['session_id']), *READ)
+router.add('GET', '/{id}/coverage/{session_id}/bitmap', lambda ctx: get_coverage_bitmap(ctx['event'], ctx['user_id'], ctx['params']['id'], ctx['params']['session_id']), *READ)
+router.add('GET', '/export', lambda ctx: export_data(ctx['event'], ctx['user_id']), *READ)
+router.add('GET', '/orgs', lambda ctx: list_organizations(ctx['user_id']), *READ)
+router.add('POST', '/orgs', lambda ctx: create_organization(ctx['event'], ctx['user_id']), *WRITE)
+router.add('POST', '/orgs/{org_id}/members', lambda ctx: add_member(ctx['event'], ctx['user_id'], ctx['params']['org_id']), *WRITE)
+router.add('DELETE', '/orgs/{org_id}/members/{member_id}', lambda ctx: remove_member(ctx['user_id'], ctx['params']['org_id'], ctx['params']['member_id']), *WRITE)
+
+def run_idempotent(event: dict, user_id: int, action) -> dict:
+    """Выполнить команду один раз на Idempotency-Key, повторам вернуть сохранённый ответ"""
+    key = get_header(event, 'Idempotency-Key')
+    if not key:
+        return action()
+    
+    if len(key) > idempotency.MAX_KEY_LENGTH:
+        return error_response('Idempotency-Key is too long', 400)
     
-    path = event.get('params', {}).get('path', '')
-    robot_id = event.get('pathParams', {}).get('id')
-    
-    if method == 'GET' and not robot_id:
-        return list_robots(user_id)
-    elif method == 'GET' and robot_id:
-        return get_robot(user_id, robot_id)
-    elif method == 'POST' and path == '/connect':
-        return connect_robot(event, user_id)
-    elif method == 'PUT' and robot_id:
-        return update_robot(event, user_id, robot_id)
-    elif method == 'POST' and path.endswith('/control'):
-        return control_robot(event, user_id, robot_id)
-    elif method == 'DELETE' and robot_id:
-        return delete_robot(user_id, robot_id)
-    
-    return error_response('Endpoint not found', 404)
-
-def list_robots(user_id: int) -> dict:
+    fingerprint = idempotency.request_fingerprint(event)
+    conn = None
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        stored = idempotency.claim_key(cur, user_id, key, fingerprint)
+        conn.commit()
+    except Exception as e:
+        if conn:
+            conn.close()
+        return failure_response(e)
+    
+    try:
+        if stored is not None:
+            return idempotency.replay_response(stored, fingerprint)
+        
+        response = action()
+        
+        if response['statusCode'] >= 500:
+            idempotency.release_key(cur, user_id, key)
+        else:
+            idempotency.store_response(cur, user_id, key, response)
+        idempotency.evict_expired(cur)
+        conn.commit()
+        return response
+    
+    except Exception as e:
+        conn.rollback()
+        return failure_response(e)
+    
+    finally:
+        cur.close()
+        conn.close()
+
+def org_roles(cur, user_id: int, allowed: tuple = membership.READ_ROLES) -> dict:
+    """Роли пользователя в организациях для проверки ролей allowed: для чтения — из кеша
+    инстанса, при промахе и для записи — одним запросом"""
+    cache = membership.get_cache()
+    roles = None if membership.fresh_roles(allowed) else cache.get(user_id)
+    if roles is None:
+        cur.execute(sql(membership.FIND_MEMBERSHIPS), (user_id,))
+        roles = dict(cur.fetchall())
+        cache.put(user_id, roles)
+    return roles
+
+def access(cur, user_id: int, allowed: tuple) -> tuple:
+    """Параметры условия доступа ACCESS: user_id и организации с одной из ролей allowed"""
+    return user_id, membership.org_ids(org_roles(cur, user_id, allowed), allowed)
+
+def list_robots(event: dict, user_id: int) -> dict:
     """Получить список роботов пользователя"""
+    if (event.get('queryStringParameters') or {}).get('org_id'):
+        return list_org_robots(event, user_id)
+    
+    if os.environ.get('ROBOTS_LIST_MODE') == 'db_json':
+        return list_robots_db_json(user_id)
+    
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
-        cur.execute(
-            f"""SELECT id, name, model, has_cleaning, battery_level, status, 
-            current_task, is_active, created_at 
-            FROM {os.environ.get('MAIN_DB_SCHEMA')}.robots 
-            WHERE user_id = %s AND (archived IS NULL OR archived = false)
-            ORDER BY created_at DESC""",
-            (user_id,)
-        )
+        cur.execute(sql(LIST_ROBOTS), (user_id,))
+        
+        robots = fetch_all(cur)
+        cur.close()
+        conn.close()
+        
+        return polling.with_poll_interval(json_response({'robots': robots}), [robot['current_task'] for robot in robots])
+    
+    except Exception as e:
+        return failure_response(e)
+
+def list_robots_db_json(user_id: int) -> dict:
+    """Список роботов, собранный в JSON на стороне Postgres"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute(sql(LIST_ROBOTS_JSON), (user_id,))
+        
+        robots_json, tasks = cur.fetchone()
+        cur.close()
+        conn.close()
+        
+        return polling.with_poll_interval(raw_json_response('{"robots":[' + robots_json + ']}'), tasks)
+    
+    except Exception as e:
+        return failure_response(e)
+
+def list_org_robots(event: dict, user_id: int) -> dict:
+    """Страница роботов организации по курсору (created_at, id)"""
+    params = event.get('queryStringParameters') or {}
+    try:
+        org_id = int(params['org_id'])
+        limit = max(1, min(int(params.get('limit') or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+        after = parse_cursor(params['cursor']) if params.get('cursor') else ()
+    except ValueError as e:
+        return error_response(str(e) if str(e) == 'Invalid cursor' else 'Invalid org_id or limit', 400)
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
         
-        robots = []
-        for row in cur.fetchall():
-            robots.append({
-                'id': row[0],
-                'name': row[1],
-                'model': row[2],
-                'has_cleaning': row[3],
-                'battery_level': row[4],
-                'status': row[5],
-                'current_task': row[6],
-                'is_active': row[7],
-                'created_at': row[8].isoformat() if row[8] else None
-            })
+        if org_roles(cur, user_id).get(org_id) not in membership.READ_ROLES:
+            cur.close()
+            conn.close()
+            return error_response('Organization not found', 404)
         
+        cur.execute(sql(LIST_ORG_ROBOTS, after=PAGE_AFTER if after else ''), (org_id, *after, limit))
+        
+        robots = fetch_all(cur)
         cur.close()
         conn.close()
         
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'robots': robots}),
-            'isBase64Encoded': False
-        }
+        next_cursor = page_cursor(robots[-1]) if len(robots) == limit else None
+        return polling.with_poll_interval(json_response({'robots': robots, 'next_cursor': next_cursor}),
+                                          [robot['current_task'] for robot in robots])
     
     except Exception as e:
-        return error_response(str(e), 500)
+        return failure_response(e)
+
+def export_data(event: dict, user_id: int) -> dict:
+    """Выгрузка роботов или телеметрии в NDJSON/CSV
+    
+    Под tools/gateway.py (requestContext.streaming) тело — итератор кусков, который шлюз
+    отдаёт chunked-ответом; рантайм без потоковых ответов получает выгрузку целиком, пока она
+    не больше export.MAX_BUFFERED_BYTES.
+    """
+    try:
+        request = export.parse_params(event.get('queryStringParameters') or {})
+    except ValueError as e:
+        return error_response(str(e), 400)
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        scope = access(cur, user_id, membership.READ_ROLES)
+        cur.close()
+        
+        query, filters, values = export.build_query(request)
+        chunks = export.open_stream(conn, sql(query, filters=filters), (*scope, *values), request['format'], request['gzip'])
+    except Exception as e:
+        return failure_response(e)
+    
+    headers = {
+        'Content-Type': 'application/gzip' if request['gzip'] else export.CONTENT_TYPES[request['format']],
+        'Content-Disposition': f'attachment; filename="{export.filename(request)}"',
+        'Access-Control-Allow-Origin': allowed_origin()
+    }
+    if (event.get('requestContext') or {}).get('streaming'):
+        return {'statusCode': 200, 'headers': headers, 'body': chunks, 'isBase64Encoded': False}
+    
+    data = export.collect(chunks)
+    if data is None:
+        return error_response('Export is too large for one response, narrow it with robot_id/since/until', 413)
+    if request['gzip']:
+        return {'statusCode': 200, 'headers': headers, 'body': base64.b64encode(data).decode('ascii'), 'isBase64Encoded': True}
+    return {'statusCode': 200, 'headers': headers, 'body': data.decode('utf-8'), 'isBase64Encoded': False}
 
 def get_robot(user_id: int, robot_id: str) -> dict:
     """Получить данные конкретного робота"""
@@ -91,202 +327,183 @@ def get_robot(user_id: int, robot_id: str) -> dict:
         conn = get_db_connection()
         cur = conn.cursor()
         
-        cur.execute(
-            f"""SELECT id, name, model, has_cleaning, battery_level, status, 
-            current_task, is_active, created_at 
-            FROM {os.environ.get('MAIN_DB_SCHEMA')}.robots 
-            WHERE id = %s AND user_id = %s AND (archived IS NULL OR archived = false)""",
-            (robot_id, user_id)
-        )
+        cur.execute(sql(GET_ROBOT), (robot_id, *access(cur, user_id, membership.READ_ROLES)))
         
-        row = cur.fetchone()
+        robot = fetch_one(cur)
         cur.close()
         conn.close()
         
-        if not row:
+        if not robot:
             return error_response('Robot not found', 404)
         
-        robot = {
-            'id': row[0],
-            'name': row[1],
-            'model': row[2],
-            'has_cleaning': row[3],
-            'battery_level': row[4],
-            'status': row[5],
-            'current_task': row[6],
-            'is_active': row[7],
-            'created_at': row[8].isoformat() if row[8] else None
-        }
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps(robot),
-            'isBase64Encoded': False
-        }
+        return polling.with_poll_interval(json_response(robot), [robot['current_task']])
     
     except Exception as e:
-        return error_response(str(e), 500)
+        return failure_response(e)
 
 def connect_robot(event: dict, user_id: int) -> dict:
     """Подключить нового робота"""
     try:
-        body = json.loads(event.get('body', '{}'))
+        body = loads(event.get('body', '{}'))
         name = body.get('name', 'VÖLM Robot')
         model = body.get('model', 'VLM-2024')
         has_cleaning = body.get('has_cleaning', True)
+        org_id = body.get('org_id')
+        
+        if org_id is not None and (isinstance(org_id, bool) or not isinstance(org_id, int)):
+            return error_response('org_id must be an integer', 400)
         
         conn = get_db_connection()
         cur = conn.cursor()
         
-        cur.execute(
-            f"SELECT COUNT(*) FROM {os.environ.get('MAIN_DB_SCHEMA')}.robots WHERE user_id = %s AND (archived IS NULL OR archived = false)",
-            (user_id,)
-        )
-        
-        count = cur.fetchone()[0]
-        
-        if count >= 2:
+        if org_id is None:
+            cur.execute(sql(COUNT_ROBOTS), (user_id,))
+            count = cur.fetchone()[0]
+            limit = PERSONAL_ROBOT_LIMIT
+        else:
+            if org_roles(cur, user_id, membership.WRITE_ROLES).get(org_id) not in membership.WRITE_ROLES:
+                cur.close()
+                conn.close()
+                return error_response('Organization not found', 404)
+            cur.execute(sql(membership.FIND_ROBOT_LIMIT), (org_id,))
+            limit = cur.fetchone()[0]
+            cur.execute(sql(COUNT_ORG_ROBOTS), (org_id,))
+            count = cur.fetchone()[0]
+        
+        if limit is not None and count >= limit:
             cur.close()
             conn.close()
-            return error_response('Maximum 2 robots allowed', 400)
+            return error_response(f'Maximum {limit} robots allowed', 400)
         
         robot_number = count + 1
         robot_name = f"{name} #{robot_number}"
         
         cur.execute(
-            f"""INSERT INTO {os.environ.get('MAIN_DB_SCHEMA')}.robots 
-            (user_id, name, model, has_cleaning, battery_level, status, current_task, is_active) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s) 
-            RETURNING id, name, model, has_cleaning, battery_level, status, current_task, is_active, created_at""",
-            (user_id, robot_name, model, has_cleaning, 100, 'online', 'idle', False)
+            sql(INSERT_ROBOT),
+            (user_id, robot_name, model, has_cleaning, 100, 'online', 'idle', False, org_id)
         )
         
-        row = cur.fetchone()
+        robot = fetch_one(cur)
+        log = events.EventLog(user_id)
+        log.add(robot['id'], events.CONNECTED, events.snapshot(robot, user_id=user_id, archived=False))
+        write_events(cur, log)
         conn.commit()
         cur.close()
         conn.close()
         
-        robot = {
-            'id': row[0],
-            'name': row[1],
-            'model': row[2],
-            'has_cleaning': row[3],
-            'battery_level': row[4],
-            'status': row[5],
-            'current_task': row[6],
-            'is_active': row[7],
-            'created_at': row[8].isoformat() if row[8] else None
-        }
-        
-        return {
-            'statusCode': 201,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps(robot),
-            'isBase64Encoded': False
-        }
+        return json_response(robot, 201)
     
     except Exception as e:
-        return error_response(str(e), 500)
+        return failure_response(e)
+
+def bulk_import(event: dict, user_id: int) -> dict:
+    """Массовая регистрация роботов по серийным номерам из CSV/NDJSON (serial_number, model, owner, name)
+    
+    Без org_id роботы личные и принадлежат вызывающему; с org_id нужна роль с правом записи,
+    а владельцы — участники организации. Повтор с тем же файлом безопасен, ключ — serial_number.
+    """
+    params = event.get('queryStringParameters') or {}
+    fmt = params.get('format') or ('ndjson' if 'json' in get_header(event, 'Content-Type') else 'csv')
+    if fmt not in provisioning.READERS:
+        return error_response('format must be csv or ndjson', 400)
+    
+    org_id = parse_org_id(params['org_id']) if params.get('org_id') else None
+    if params.get('org_id') and org_id is None:
+        return error_response('org_id must be an integer', 400)
+    
+    try:
+        body = event.get('body') or ''
+        if event.get('isBase64Encoded'):
+            body = base64.b64decode(body).decode('utf-8')
+        records = provisioning.READERS[fmt](io.StringIO(body))
+    except ValueError as e:
+        return error_response(str(e), 400)
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        if org_id is None:
+            scope = {'only_owner': user_id, 'limit': PERSONAL_ROBOT_LIMIT}
+        else:
+            if org_roles(cur, user_id, membership.WRITE_ROLES).get(org_id) not in membership.WRITE_ROLES:
+                cur.close()
+                conn.close()
+                return error_response('Organization not found', 404)
+            cur.execute(sql(membership.FIND_ROBOT_LIMIT), (org_id,))
+            scope = {'members_only': True, 'limit': cur.fetchone()[0]}
+        
+        report = provisioning.import_robots(cur, records, user_id, org_id=org_id, default_owner=user_id, **scope)
+        if (params.get('dry_run') or '').lower() in ('1', 'true'):
+            conn.rollback()
+        else:
+            conn.commit()
+        cur.close()
+        conn.close()
+        
+        return json_response(report)
+    
+    except Exception as e:
+        return failure_response(e)
 
 def update_robot(event: dict, user_id: int, robot_id: str) -> dict:
     """Обновить данные робота"""
     try:
-        body = json.loads(event.get('body', '{}'))
+        body = loads(event.get('body', '{}'))
         
         conn = get_db_connection()
         cur = conn.cursor()
         
-        cur.execute(
-            f"SELECT id FROM {os.environ.get('MAIN_DB_SCHEMA')}.robots WHERE id = %s AND user_id = %s",
-            (robot_id, user_id)
-        )
+        scope = access(cur, user_id, membership.WRITE_ROLES)
+        cur.execute(sql(FIND_ROBOT), (robot_id, *scope))
         
         if not cur.fetchone():
             cur.close()
             conn.close()
             return error_response('Robot not found', 404)
         
-        updates = []
-        values = []
-        
-        if 'has_cleaning' in body:
-            updates.append('has_cleaning = %s')
-            values.append(body['has_cleaning'])
-        
-        if 'battery_level' in body:
-            updates.append('battery_level = %s')
-            values.append(body['battery_level'])
-        
-        if 'status' in body:
-            updates.append('status = %s')
-            values.append(body['status'])
-        
-        if 'current_task' in body:
-            updates.append('current_task = %s')
-            values.append(body['current_task'])
-        
-        if 'is_active' in body:
-            updates.append('is_active = %s')
-            values.append(body['is_active'])
+        fields = [field for field in UPDATABLE_FIELDS if field in body]
         
-        if not updates:
+        if not fields:
             cur.close()
             conn.close()
             return error_response('No fields to update', 400)
         
-        updates.append('updated_at = CURRENT_TIMESTAMP')
-        values.append(robot_id)
-        values.append(user_id)
+        assignments = ', '.join(f'{field} = %s' for field in fields)
+        values = [body[field] for field in fields] + [robot_id, *scope]
         
-        query = f"""UPDATE {os.environ.get('MAIN_DB_SCHEMA')}.robots 
-                   SET {', '.join(updates)} 
-                   WHERE id = %s AND user_id = %s 
-                   RETURNING id, name, model, has_cleaning, battery_level, status, current_task, is_active"""
+        cur.execute(sql(UPDATE_ROBOT, assignments=assignments), values)
+        robot = fetch_one(cur)
+        log = events.EventLog(user_id)
+        log.add(robot['id'], events.UPDATED, events.changes(robot, fields))
         
-        cur.execute(query, values)
-        row = cur.fetchone()
+        if 'battery_level' in body or 'current_task' in body:
+            robot = track_battery(cur, robot, scope, log)
+        
+        write_events(cur, log)
         conn.commit()
         cur.close()
         conn.close()
         
-        robot = {
-            'id': row[0],
-            'name': row[1],
-            'model': row[2],
-            'has_cleaning': row[3],
-            'battery_level': row[4],
-            'status': row[5],
-            'current_task': row[6],
-            'is_active': row[7]
-        }
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps(robot),
-            'isBase64Encoded': False
-        }
+        return json_response(robot)
     
     except Exception as e:
-        return error_response(str(e), 500)
+        return failure_response(e)
 
 def control_robot(event: dict, user_id: int, robot_id: str) -> dict:
     """Управление роботом (start/stop/pause)"""
     try:
-        body = json.loads(event.get('body', '{}'))
+        body = loads(event.get('body', '{}'))
         action = body.get('action')
         
-        if action not in ['start', 'stop', 'pause']:
+        if action not in TASK_MAP:
             return error_response('Invalid action. Use: start, stop, pause', 400)
         
         conn = get_db_connection()
         cur = conn.cursor()
         
-        cur.execute(
-            f"SELECT id, has_cleaning FROM {os.environ.get('MAIN_DB_SCHEMA')}.robots WHERE id = %s AND user_id = %s",
-            (robot_id, user_id)
-        )
+        scope = access(cur, user_id, membership.WRITE_ROLES)
+        cur.execute(sql(FIND_ROBOT), (robot_id, *scope))
         
         robot = cur.fetchone()
         
@@ -300,47 +517,46 @@ def control_robot(event: dict, user_id: int, robot_id: str) -> dict:
             conn.close()
             return error_response('This robot does not have cleaning capability', 400)
         
-        task_map = {
-            'start': ('cleaning', True),
-            'pause': ('paused', True),
-            'stop': ('idle', False)
-        }
+        current_task, is_active = TASK_MAP[action]
         
-        current_task, is_active = task_map[action]
+        cur.execute(sql(SET_ROBOT_TASK), (current_task, is_active, robot_id, *scope))
         
-        cur.execute(
-            f"""UPDATE {os.environ.get('MAIN_DB_SCHEMA')}.robots 
-            SET current_task = %s, is_active = %s, updated_at = CURRENT_TIMESTAMP 
-            WHERE id = %s AND user_id = %s 
-            RETURNING id, name, model, has_cleaning, battery_level, status, current_task, is_active""",
-            (current_task, is_active, robot_id, user_id)
-        )
-        
-        row = cur.fetchone()
+        robot = fetch_one(cur)
+        log = events.EventLog(user_id)
+        log.add(robot['id'], events.CONTROLLED, events.changes(robot, ('current_task', 'is_active')))
+        robot_data = track_battery(cur, robot, scope, log)
+        write_events(cur, log)
         conn.commit()
         cur.close()
         conn.close()
         
-        robot_data = {
-            'id': row[0],
-            'name': row[1],
-            'model': row[2],
-            'has_cleaning': row[3],
-            'battery_level': row[4],
-            'status': row[5],
-            'current_task': row[6],
-            'is_active': row[7]
-        }
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps(robot_data),
-            'isBase64Encoded': False
-        }
+        return json_response(robot_data)
     
     except Exception as e:
-        return error_response(str(e), 500)
+        return failure_response(e)
+
+def track_battery(cur, robot: dict, scope: tuple, log: events.EventLog) -> dict:
+    """Учесть замер батареи; моющего робота, который вот-вот разрядится, поставить на паузу; события — в уведомления"""
+    rate, previous = battery.record_sample(cur, robot)
+    robot = battery.predict(robot, rate)
+    notices = notifications.detect(previous, robot)
+    
+    if battery.should_pause(robot):
+        current_task, is_active = TASK_MAP['pause']
+        cur.execute(sql(SET_ROBOT_TASK), (current_task, is_active, robot['id'], *scope))
+        robot = fetch_one(cur)
+        log.add(robot['id'], events.AUTO_PAUSED, events.changes(robot, ('current_task', 'is_active')))
+        robot = battery.predict(robot, battery.record_sample(cur, robot)[0])
+        notices.append(notifications.AUTO_PAUSED)
+    
+    if notices:
+        cur.execute(sql(notifications.QUEUE_NOTIFICATION), (robot['id'], notices, notifications.payload(robot)))
+    return robot
+
+def write_events(cur, log: events.EventLog) -> None:
+    """Записать события запроса в robot_events одним запросом"""
+    if log.events:
+        cur.execute(sql(events.INSERT_EVENTS), log.params())
 
 def delete_robot(user_id: int, robot_id: str) -> dict:
     """Удалить робота (мягкое удаление)"""
@@ -348,15 +564,13 @@ def delete_robot(user_id: int, robot_id: str) -> dict:
         conn = get_db_connection()
         cur = conn.cursor()
         
-        cur.execute(
-            f"""UPDATE {os.environ.get('MAIN_DB_SCHEMA')}.robots 
-            SET archived = true, updated_at = CURRENT_TIMESTAMP 
-            WHERE id = %s AND user_id = %s 
-            RETURNING id""",
-            (robot_id, user_id)
-        )
+        cur.execute(sql(ARCHIVE_ROBOT), (robot_id, *access(cur, user_id, membership.ADMIN_ROLES)))
         
         result = cur.fetchone()
+        if result:
+            log = events.EventLog(user_id)
+            log.add(result[0], events.ARCHIVED, {'archived': True})
+            write_events(cur, log)
         conn.commit()
         cur.close()
         conn.close()
@@ -364,41 +578,306 @@ def delete_robot(user_id: int, robot_id: str) -> dict:
         if not result:
             return error_response('Robot not found', 404)
         
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'message': 'Robot deleted successfully'}),
-            'isBase64Encoded': False
-        }
+        return json_response({'message': 'Robot deleted successfully'})
     
     except Exception as e:
-        return error_response(str(e), 500)
+        return failure_response(e)
 
-def get_user_from_token(event: dict):
-    """Извлечь user_id из JWT токена"""
-    auth_header = event.get('headers', {}).get('X-Authorization', '')
+def upload_coverage(event: dict, user_id: int, robot_id: str) -> dict:
+    """Сохранить карту покрытия сессии мойки"""
+    try:
+        body = loads(event.get('body', '{}'))
+        
+        try:
+            session = coverage.parse_upload(body)
+        except ValueError as e:
+            return error_response(str(e), 400)
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute(sql(FIND_ROBOT), (robot_id, *access(cur, user_id, membership.WRITE_ROLES)))
+        
+        if not cur.fetchone():
+            cur.close()
+            conn.close()
+            return error_response('Robot not found', 404)
+        
+        cur.execute(
+            sql(coverage.INSERT_SESSION),
+            (robot_id, user_id, session['pane_id'], session['width'], session['height'],
+             session['covered_cells'], coverage.ENCODING, psycopg2.Binary(session['bitmap']))
+        )
+        
+        result = fetch_one(cur)
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return json_response(coverage.session_summary(result), 201)
     
-    if not auth_header.startswith('Bearer '):
-        return None
+    except Exception as e:
+        return failure_response(e)
+
+def list_coverage(event: dict, user_id: int, robot_id: str) -> dict:
+    """Последние сессии покрытия робота с процентом, без битовых карт"""
+    try:
+        params = event.get('queryStringParameters') or {}
+        limit = min(int(params.get('limit') or 50), 500)
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute(sql(coverage.LIST_SESSIONS), (robot_id, *access(cur, user_id, membership.READ_ROLES), limit))
+        
+        sessions = [coverage.session_summary(session) for session in fetch_all(cur)]
+        cur.close()
+        conn.close()
+        
+        return json_response({'sessions': sessions})
     
-    token = auth_header.replace('Bearer ', '')
+    except Exception as e:
+        return failure_response(e)
+
+def get_coverage(user_id: int, robot_id: str, session_id: str) -> dict:
+    """Процент покрытия одной сессии"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute(sql(coverage.GET_SESSION), (session_id, robot_id, *access(cur, user_id, membership.READ_ROLES)))
+        
+        session = fetch_one(cur)
+        cur.close()
+        conn.close()
+        
+        if not session:
+            return error_response('Coverage session not found', 404)
+        
+        return json_response(coverage.session_summary(session))
+    
+    except Exception as e:
+        return failure_response(e)
+
+def get_coverage_bitmap(event: dict, user_id: int, robot_id: str, session_id: str) -> dict:
+    """Битовая карта сессии без распаковки в списки"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute(sql(coverage.GET_BITMAP), (session_id, robot_id, *access(cur, user_id, membership.READ_ROLES)))
+        
+        row = cur.fetchone()
+        cur.close()
+        conn.close()
+        
+        if not row:
+            return error_response('Coverage session not found', 404)
+        
+        return coverage.bitmap_response(row, accepted_encodings(get_header(event, 'Accept-Encoding')))
     
+    except Exception as e:
+        return failure_response(e)
+
+def plan_facade(event: dict) -> dict:
+    """Маршрут мойки фасада: кеш инстанса, затем БД, затем планировщик"""
+    try:
+        body = loads(event.get('body', '{}'))
+        
+        try:
+            facade = planner.normalize_facade(body)
+        except ValueError as e:
+            return error_response(str(e), 400)
+        
+        key = planner.facade_hash(facade)
+        plan, unsaved = planner.cached_plan(key)
+        
+        if plan is None:
+            conn = get_db_connection()
+            cur = conn.cursor()
+            cur.execute(sql(planner.FIND_PLAN), (key,))
+            row = cur.fetchone()
+            cur.close()
+            conn.close()
+            
+            if row:
+                planner.remember(key, row[0])
+                return raw_json_response(row[0])
+            
+            timeout = float(os.environ.get('PLANNER_TIMEOUT_SECONDS') or DEFAULT_PLAN_TIMEOUT)
+            try:
+                plan = planner.plan_facade(facade, key, timeout)
+            except PlanTimeout:
+                response = json_response({'status': 'planning', 'facade_hash': key}, 202)
+                response['headers']['Retry-After'] = '2'
+                return response
+            unsaved = True
+        
+        if unsaved:
+            conn = get_db_connection()
+            cur = conn.cursor()
+            cur.execute(sql(planner.STORE_PLAN), (key, len(facade['panes']), plan))
+            conn.commit()
+            cur.close()
+            conn.close()
+        
+        return raw_json_response(plan)
+    
+    except Exception as e:
+        return failure_response(e)
+
+def parse_org_id(org_id: str):
+    """id организации из пути; None если это не число"""
     try:
-        secret = os.environ.get('JWT_SECRET', 'volm-secret-key-2024')
-        payload = jwt.decode(token, secret, algorithms=['HS256'])
-        return payload.get('user_id')
-    except:
+        return int(org_id)
+    except (TypeError, ValueError):
         return None
 
+def list_organizations(user_id: int) -> dict:
+    """Организации пользователя и его роль в каждой"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute(sql(membership.LIST_ORGANIZATIONS), (user_id,))
+        
+        organizations = fetch_all(cur)
+        cur.close()
+        conn.close()
+        
+        return json_response({'organizations': organizations})
+    
+    except Exception as e:
+        return failure_response(e)
+
+def create_organization(event: dict, user_id: int) -> dict:
+    """Создать организацию; создатель становится владельцем"""
+    try:
+        body = loads(event.get('body', '{}'))
+        name = (body.get('name') or '').strip()
+        robot_limit = body.get('robot_limit')
+        
+        if not name:
+            return error_response('Organization name is required', 400)
+        
+        if robot_limit is not None and (isinstance(robot_limit, bool) or not isinstance(robot_limit, int) or robot_limit < 0):
+            return error_response('robot_limit must be a non-negative integer', 400)
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute(sql(membership.INSERT_ORGANIZATION), (name, robot_limit))
+        organization = fetch_one(cur)
+        cur.execute(sql(membership.UPSERT_MEMBER), (organization['id'], user_id, 'owner'))
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        membership.get_cache().invalidate(user_id)
+        organization['role'] = 'owner'
+        return json_response(organization, 201)
+    
+    except Exception as e:
+        return failure_response(e)
+
+def add_member(event: dict, user_id: int, org_id: str) -> dict:
+    """Добавить участника организации или сменить его роль (только владелец)"""
+    org_id = parse_org_id(org_id)
+    if org_id is None:
+        return error_response('Organization not found', 404)
+    
+    try:
+        body = loads(event.get('body', '{}'))
+        role = body.get('role', 'operator')
+        member_id = body.get('user_id')
+        
+        if role not in membership.ROLES:
+            return error_response(f"Invalid role. Use: {', '.join(membership.ROLES)}", 400)
+        
+        if member_id is None and not body.get('email'):
+            return error_response('user_id or email is required', 400)
+        
+        if member_id is not None and (isinstance(member_id, bool) or not isinstance(member_id, int)):
+            return error_response('user_id must be an integer', 400)
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        if org_roles(cur, user_id, membership.ADMIN_ROLES).get(org_id) not in membership.ADMIN_ROLES:
+            cur.close()
+            conn.close()
+            return error_response('Organization not found', 404)
+        
+        if member_id is None:
+            cur.execute(sql(membership.FIND_USER_BY_EMAIL), (body['email'],))
+            row = cur.fetchone()
+            if not row:
+                cur.close()
+                conn.close()
+                return error_response('User not found', 404)
+            member_id = row[0]
+        
+        if role != 'owner':
+            cur.execute(sql(membership.COUNT_OWNERS), (org_id, member_id))
+            if cur.fetchone()[0] == 0:
+                cur.close()
+                conn.close()
+                return error_response('Organization must keep at least one owner', 400)
+        
+        cur.execute(sql(membership.UPSERT_MEMBER), (org_id, member_id, role))
+        member = fetch_one(cur)
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        membership.get_cache().invalidate(member_id)
+        return json_response(member)
+    
+    except Exception as e:
+        return failure_response(e)
+
+def remove_member(user_id: int, org_id: str, member_id: str) -> dict:
+    """Исключить участника из организации (только владелец)"""
+    org_id = parse_org_id(org_id)
+    member_id = parse_org_id(member_id)
+    if org_id is None or member_id is None:
+        return error_response('Member not found', 404)
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        if org_roles(cur, user_id, membership.ADMIN_ROLES).get(org_id) not in membership.ADMIN_ROLES:
+            cur.close()
+            conn.close()
+            return error_response('Organization not found', 404)
+        
+        cur.execute(sql(membership.COUNT_OWNERS), (org_id, member_id))
+        if cur.fetchone()[0] == 0:
+            cur.close()
+            conn.close()
+            return error_response('Organization must keep at least one owner', 400)
+        
+        cur.execute(sql(membership.DELETE_MEMBER), (org_id, member_id))
+        result = cur.fetchone()
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        if not result:
+            return error_response('Member not found', 404)
+        
+        membership.get_cache().invalidate(member_id)
+        return json_response({'message': 'Member removed successfully'})
+    
+    except Exception as e:
+        return failure_response(e)
+
+def get_user_from_token(event: dict):
+    """Извлечь user_id из JWT токена"""
+    return bearer_user_id(event.get('headers', {}))
+
 def get_db_connection():
-    """Подключение к БД"""
-    return psycopg2.connect(os.environ.get('DATABASE_URL'))
-
-def error_response(message: str, status_code: int) -> dict:
-    """Генерация ответа с ошибкой"""
-    return {
-        'statusCode': status_code,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'error': message}),
-        'isBase64Encoded': False
-    }
+    """Подключение к БД из пула инстанса; в маршрутах READ — к реплике (см. dbrouter)"""
+    user_id = READ_USER.get()
+    return dbrouter.get_router().connection(read_only=user_id is not None, user_id=user_id)
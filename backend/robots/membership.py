@@ -0,0 +1,95 @@
+"""Организации и роли участников: кеш членства на инстанс вместо JOIN в каждом запросе
+
+Кеш инстанса и его invalidate не видят изменений членства в других инстансах, поэтому из
+кеша берутся только роли для чтения (READ_ROLES), и не дольше MEMBERSHIP_TTL_SECONDS.
+Права на запись и администрирование кеш не обслуживает: каждый такой запрос делает
+FIND_MEMBERSHIPS — один запрос по индексу organization_members(user_id) (fresh_roles).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+ROLES = ('owner', 'operator', 'viewer')
+READ_ROLES = ROLES
+WRITE_ROLES = ('owner', 'operator')
+ADMIN_ROLES = ('owner',)
+
+DEFAULT_TTL_SECONDS = 10
+MAX_CACHED_USERS = 10000
+
+FIND_MEMBERSHIPS = """SELECT org_id, role FROM {schema}.organization_members WHERE user_id = %s"""
+
+LIST_ORGANIZATIONS = """SELECT o.id, o.name, o.robot_limit, m.role
+FROM {schema}.organization_members m
+JOIN {schema}.organizations o ON o.id = m.org_id
+WHERE m.user_id = %s
+ORDER BY o.id"""
+
+INSERT_ORGANIZATION = """INSERT INTO {schema}.organizations (name, robot_limit)
+VALUES (%s, %s)
+RETURNING id, name, robot_limit"""
+
+UPSERT_MEMBER = """INSERT INTO {schema}.organization_members (org_id, user_id, role)
+VALUES (%s, %s, %s)
+ON CONFLICT (org_id, user_id) DO UPDATE SET role = EXCLUDED.role
+RETURNING org_id, user_id, role"""
+
+DELETE_MEMBER = """DELETE FROM {schema}.organization_members
+WHERE org_id = %s AND user_id = %s
+RETURNING user_id"""
+
+COUNT_OWNERS = """SELECT COUNT(*) FROM {schema}.organization_members
+WHERE org_id = %s AND role = 'owner' AND user_id <> %s"""
+
+FIND_USER_BY_EMAIL = """SELECT id FROM {schema}.users WHERE email = %s"""
+
+FIND_ROBOT_LIMIT = """SELECT robot_limit FROM {schema}.organizations WHERE id = %s"""
+
+class MembershipCache:
+    """user_id → {org_id: role} с TTL; изменения в других инстансах видны не позже чем через TTL"""
+    
+    def __init__(self, ttl: float, max_users: int = MAX_CACHED_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, user_id: int):
+        """Роли пользователя из кеша или None, если записи нет или она устарела"""
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            self.entries.move_to_end(user_id)
+            return entry[1]
+    
+    def put(self, user_id: int, roles: dict) -> None:
+        """Запомнить роли пользователя на TTL"""
+        with self.lock:
+            self.entries[user_id] = (time.monotonic() + self.ttl, roles)
+            self.entries.move_to_end(user_id)
+            if len(self.entries) > self.max_users:
+                self.entries.popitem(last=False)
+    
+    def invalidate(self, user_id: int) -> None:
+        """Забыть роли пользователя после изменения членства"""
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+_cache = None
+
+def get_cache() -> MembershipCache:
+    """Кеш членства инстанса, создаётся при первом обращении"""
+    global _cache
+    if _cache is None:
+        _cache = MembershipCache(float(os.environ.get('MEMBERSHIP_TTL_SECONDS') or DEFAULT_TTL_SECONDS))
+    return _cache
+
+def fresh_roles(allowed: tuple) -> bool:
+    """Читать ли роли из БД мимо кеша: для записи и администрирования"""
+    return allowed != READ_ROLES
+
+def org_ids(roles: dict, allowed: tuple) -> list:
+    """Организации, где у пользователя одна из ролей allowed"""
+    return [org_id for org_id, role in roles.items() if role in allowed]
@@ -0,0 +1,39 @@
+"""События состояния роботов для уведомлений: разряд батареи, конец мойки, автопауза
+
+События выводятся из прошлого замера в battery_states, который battery.record_sample
+и так читает на путях записи, поэтому лишних запросов нет. Все события робота за окно
+копятся в одной строке robot_notifications; telegram-bot рассылает созревшие строки
+пачкой (action=flush-notifications).
+"""
+from serializer import dumps
+
+LOW_BATTERY_PERCENT = 20
+
+BATTERY_LOW = 'battery_low'
+CLEANING_FINISHED = 'cleaning_finished'
+AUTO_PAUSED = 'auto_paused'
+
+PAYLOAD_FIELDS = ('name', 'battery_level', 'status', 'current_task', 'cleaning_minutes_left')
+
+QUEUE_NOTIFICATION = """INSERT INTO {schema}.robot_notifications AS n (robot_id, events, payload)
+VALUES (%s, %s, %s::jsonb)
+ON CONFLICT (robot_id) WHERE sent_at IS NULL DO UPDATE
+SET events = ARRAY(SELECT DISTINCT unnest(n.events || EXCLUDED.events)),
+    payload = EXCLUDED.payload,
+    event_count = n.event_count + 1,
+    last_event_at = CURRENT_TIMESTAMP"""
+
+def detect(previous, robot: dict) -> list:
+    """События перехода от прошлого замера (last_level, last_task, ...) к текущему состоянию робота"""
+    last_level, last_task = (previous[0], previous[1]) if previous else (None, None)
+    level = robot.get('battery_level')
+    events = []
+    if level is not None and level <= LOW_BATTERY_PERCENT and (last_level is None or last_level > LOW_BATTERY_PERCENT):
+        events.append(BATTERY_LOW)
+    if last_task == 'cleaning' and robot.get('current_task') == 'idle':
+        events.append(CLEANING_FINISHED)
+    return events
+
+def payload(robot: dict) -> str:
+    """Последнее состояние робота для текста уведомления"""
+    return dumps({field: robot.get(field) for field in PAYLOAD_FIELDS})
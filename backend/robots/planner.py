@@ -0,0 +1,261 @@
+"""Планировщик маршрута мойки фасада
+
+Фасад — стёкла-прямоугольники в метрах (x вправо, y вверх) с препятствиями в тех же
+координатах. Стёкла обходятся змейкой по рядам сверху вниз (эвристика TSP для сеток),
+каждое стекло — горизонтальными полосами шириной tool_width в чередующемся направлении
+(boustrophedon); препятствия разрезают полосы на отрезки. Результат — готовый JSON,
+кешируется по sha256 нормализованного описания фасада.
+"""
+import hashlib
+import json
+import math
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from serializer import dumps
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DEFAULT_TOOL_WIDTH = 0.25
+MIN_TOOL_WIDTH = 0.05
+MAX_PANES = 20000
+MAX_LANES_PER_PANE = 1000
+CACHE_SIZE = 128
+DEFAULT_POOL_MIN_PANES = 500
+
+FIND_PLAN = """SELECT plan FROM {schema}.facade_plans WHERE facade_hash = %s"""
+
+STORE_PLAN = """INSERT INTO {schema}.facade_plans (facade_hash, pane_count, plan)
+VALUES (%s, %s, %s)
+ON CONFLICT (facade_hash) DO NOTHING"""
+
+_cache = OrderedDict()
+_unsaved = set()
+_running = {}
+_lock = threading.Lock()
+_pool = None
+
+def _number(value, name: str) -> float:
+    """Конечное число из JSON"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f'{name} must be a number')
+    return float(value)
+
+def normalize_facade(body: dict) -> dict:
+    """Проверить описание фасада и привести его к каноническому виду; ValueError с текстом для клиента"""
+    panes = body.get('panes')
+    if not isinstance(panes, list) or not panes:
+        raise ValueError('panes must be a non-empty list')
+    if len(panes) > MAX_PANES:
+        raise ValueError(f'At most {MAX_PANES} panes per facade')
+    
+    tool_width = _number(body.get('tool_width', DEFAULT_TOOL_WIDTH), 'tool_width')
+    if tool_width < MIN_TOOL_WIDTH:
+        raise ValueError(f'tool_width must be at least {MIN_TOOL_WIDTH}')
+    
+    normalized = []
+    for index, pane in enumerate(panes):
+        if not isinstance(pane, dict):
+            raise ValueError(f'panes[{index}] must be an object')
+        x, y = _number(pane.get('x', 0), 'x'), _number(pane.get('y', 0), 'y')
+        width, height = _number(pane.get('width'), 'width'), _number(pane.get('height'), 'height')
+        if width <= 0 or height <= 0:
+            raise ValueError(f'panes[{index}] must have positive width and height')
+        if height / tool_width > MAX_LANES_PER_PANE:
+            raise ValueError(f'panes[{index}] needs more than {MAX_LANES_PER_PANE} lanes')
+        obstacles = []
+        for obstacle in pane.get('obstacles') or []:
+            box = [_number(obstacle.get(field), field) for field in ('x', 'y', 'width', 'height')]
+            if box[2] <= 0 or box[3] <= 0:
+                raise ValueError(f'panes[{index}] obstacles must have positive width and height')
+            obstacles.append(box)
+        normalized.append({
+            'id': str(pane.get('id', index)),
+            'x': x, 'y': y, 'width': width, 'height': height,
+            'obstacles': sorted(obstacles)
+        })
+    
+    return {'tool_width': tool_width, 'panes': normalized}
+
+def facade_hash(facade: dict) -> str:
+    """Ключ кеша: sha256 канонического JSON фасада"""
+    canonical = json.dumps(facade, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def pane_order(panes: list) -> list:
+    """Порядок стёкол змейкой по рядам сверху вниз; ряд рвётся, когда центры соседних стёкол расходятся на полвысоты"""
+    if numpy is not None:
+        cx = numpy.array([pane['x'] + pane['width'] / 2 for pane in panes])
+        cy = numpy.array([pane['y'] + pane['height'] / 2 for pane in panes])
+        heights = numpy.array([pane['height'] for pane in panes])
+        by_height = numpy.argsort(-cy, kind='stable')
+        gaps = -numpy.diff(cy[by_height])
+        tolerance = numpy.minimum(heights[by_height][:-1], heights[by_height][1:]) / 2
+        rows = numpy.empty(len(panes), dtype=numpy.int64)
+        rows[by_height] = numpy.concatenate(([0], numpy.cumsum(gaps > tolerance)))
+        along = numpy.where(rows % 2 == 0, cx, -cx)
+        return numpy.lexsort((along, rows)).tolist()
+    
+    by_height = sorted(range(len(panes)), key=lambda i: -(panes[i]['y'] + panes[i]['height'] / 2))
+    rows = [0] * len(panes)
+    row = 0
+    for previous, current in zip(by_height, by_height[1:]):
+        gap = (panes[previous]['y'] + panes[previous]['height'] / 2) - (panes[current]['y'] + panes[current]['height'] / 2)
+        if gap > min(panes[previous]['height'], panes[current]['height']) / 2:
+            row += 1
+        rows[current] = row
+    
+    def along(i):
+        centre = panes[i]['x'] + panes[i]['width'] / 2
+        return centre if rows[i] % 2 == 0 else -centre
+    
+    return sorted(range(len(panes)), key=lambda i: (rows[i], along(i)))
+
+def lane_grid(panes: list, tool_width: float) -> tuple:
+    """Число полос и шаг между ними для каждого стекла: шаг не больше tool_width"""
+    if numpy is not None:
+        heights = numpy.array([pane['height'] for pane in panes])
+        counts = numpy.maximum(numpy.ceil(heights / tool_width - 1e-9), 1)
+        return counts.astype(numpy.int64).tolist(), (heights / counts).tolist()
+    
+    counts = [max(math.ceil(pane['height'] / tool_width - 1e-9), 1) for pane in panes]
+    return counts, [pane['height'] / count for pane, count in zip(panes, counts)]
+
+def lane_segments(y: float, half: float, x0: float, x1: float, obstacles: list) -> list:
+    """Свободные отрезки полосы [x0, x1] на высоте y за вычетом препятствий"""
+    segments = []
+    start = x0
+    for ox, oy, ow, oh in obstacles:
+        if oy >= y + half or oy + oh <= y - half:
+            continue
+        if ox > start:
+            segments.append((start, min(ox, x1)))
+        start = max(start, ox + ow)
+        if start >= x1:
+            break
+    if start < x1:
+        segments.append((start, x1))
+    return segments
+
+def build_plan(facade: dict) -> dict:
+    """Маршрут по фасаду: порядок стёкол, полосы каждого стекла и длины пути в метрах"""
+    panes = facade['panes']
+    tool_width = facade['tool_width']
+    half = tool_width / 2
+    counts, steps = lane_grid(panes, tool_width)
+    
+    routes = []
+    cleaning = 0.0
+    travel = 0.0
+    lane_count = 0
+    position = None
+    
+    for index in pane_order(panes):
+        pane = panes[index]
+        left, right = pane['x'], pane['x'] + pane['width']
+        top = pane['y'] + pane['height']
+        # Начинаем с того края стекла, который ближе к месту, где закончили предыдущее.
+        forward = position is None or abs(position[0] - left) <= abs(position[0] - right)
+        lanes = []
+        
+        for lane in range(counts[index]):
+            y = top - (lane + 0.5) * steps[index]
+            segments = lane_segments(y, half, left, right, pane['obstacles'])
+            if not forward:
+                segments = [(end, start) for start, end in reversed(segments)]
+            for start, end in segments:
+                if position is not None:
+                    travel += math.hypot(start - position[0], y - position[1])
+                cleaning += abs(end - start)
+                position = (end, y)
+                lanes.append([round(y, 3), round(start, 3), round(end, 3)])
+            forward = not forward
+        
+        lane_count += len(lanes)
+        routes.append({'id': pane['id'], 'lanes': lanes})
+    
+    return {
+        'tool_width': tool_width,
+        'pane_count': len(panes),
+        'lane_count': lane_count,
+        'cleaning_length': round(cleaning, 3),
+        'travel_length': round(travel, 3),
+        'panes': routes
+    }
+
+def plan_json(facade: dict, key: str) -> str:
+    """Маршрут, сериализованный в JSON (выполняется в том числе в процессе пула)"""
+    plan = build_plan(facade)
+    plan['facade_hash'] = key
+    return dumps(plan)
+
+def cached_plan(key: str) -> tuple:
+    """(JSON маршрута, нужно ли сохранить его в БД) из памяти инстанса или (None, False)"""
+    with _lock:
+        plan = _cache.get(key)
+        if plan is None:
+            return None, False
+        _cache.move_to_end(key)
+        unsaved = key in _unsaved
+        _unsaved.discard(key)
+        return plan, unsaved
+
+def remember(key: str, plan: str, unsaved: bool = False) -> None:
+    """Положить маршрут в LRU-кеш инстанса"""
+    with _lock:
+        _cache[key] = plan
+        _cache.move_to_end(key)
+        if unsaved:
+            _unsaved.add(key)
+        while len(_cache) > CACHE_SIZE:
+            evicted, _ = _cache.popitem(last=False)
+            _unsaved.discard(evicted)
+
+def get_pool() -> ProcessPoolExecutor:
+    """Пул процессов для больших фасадов, создаётся при первом обращении"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=int(os.environ.get('PLANNER_WORKERS') or os.cpu_count() or 1))
+    return _pool
+
+def submit_plan(facade: dict, key: str):
+    """Future с JSON маршрута из пула; одинаковые фасады планируются один раз"""
+    with _lock:
+        future = _running.get(key)
+        if future is not None:
+            return future
+        future = get_pool().submit(plan_json, facade, key)
+        _running[key] = future
+    
+    def finished(done):
+        with _lock:
+            _running.pop(key, None)
+        if not done.cancelled() and done.exception() is None:
+            # Запрос мог уже получить 202: маршрут дождётся следующего запроса в кеше.
+            remember(key, done.result(), unsaved=True)
+    
+    future.add_done_callback(finished)
+    return future
+
+def plan_facade(facade: dict, key: str, timeout: float) -> str:
+    """JSON маршрута: маленькие фасады в процессе обработчика, большие в пуле не дольше timeout
+    
+    По истечении timeout бросает concurrent.futures.TimeoutError, планирование продолжается.
+    """
+    min_panes = int(os.environ.get('PLANNER_POOL_MIN_PANES') or DEFAULT_POOL_MIN_PANES)
+    if len(facade['panes']) >= min_panes:
+        try:
+            return submit_plan(facade, key).result(timeout=timeout)
+        except (pickle.PicklingError, BrokenProcessPool):
+            # Модуль недоступен дочерним процессам (например, под tools/gateway.py) — считаем здесь.
+            pass
+    
+    plan = plan_json(facade, key)
+    remember(key, plan)
+    return plan
@@ -0,0 +1,29 @@
+"""Подсказка клиенту, когда снова опрашивать роботов: заголовок X-Poll-Interval
+
+Пока робот моет, заряд и прогноз меняются каждые несколько секунд, а стоящий на базе или
+заряжающийся робот может не меняться часами. Интервал берётся по самому активному роботу
+ответа: моет — POLL_ACTIVE_SECONDS, на паузе — PAUSED_FACTOR таких интервалов, остальные —
+POLL_IDLE_SECONDS. Фронтенд ставит следующий опрос по заголовку, а при 429/503 — по Retry-After.
+"""
+import os
+
+DEFAULT_ACTIVE_SECONDS = 5
+DEFAULT_IDLE_SECONDS = 60
+PAUSED_FACTOR = 3
+
+def poll_interval(tasks) -> int:
+    """Секунды до следующего опроса для роботов с задачами tasks (current_task)"""
+    active = int(os.environ.get('POLL_ACTIVE_SECONDS') or DEFAULT_ACTIVE_SECONDS)
+    interval = int(os.environ.get('POLL_IDLE_SECONDS') or DEFAULT_IDLE_SECONDS)
+    for task in tasks:
+        if task == 'cleaning':
+            return min(active, interval)
+        if task == 'paused':
+            interval = min(interval, active * PAUSED_FACTOR)
+    return interval
+
+def with_poll_interval(response: dict, tasks) -> dict:
+    """Добавить X-Poll-Interval к успешному ответу"""
+    if response.get('statusCode') == 200:
+        response['headers']['X-Poll-Interval'] = str(poll_interval(tasks))
+    return response
@@ -0,0 +1,268 @@
+"""Массовая регистрация роботов с завода: CSV/NDJSON serial_number, model, owner → robots
+
+Файл одним COPY загружается во временную таблицу robot_import, проверяется и сливается с robots
+несколькими запросами над всем набором сразу, а не запросом на строку. Серийный номер —
+ключ слияния: новые номера создают роботов, уже зарегистрированные в том же парке обновляют
+модель, владельца и имя, так что повторный импорт того же файла безопасен. Архивный робот
+отдаёт свой номер новому. Ошибки (нет владельца, номер в чужом парке, дубль в файле, лимит)
+возвращаются по строкам, остальные строки применяются. Изменения пишутся в robot_events.
+"""
+import csv
+import io
+import json
+import events
+from queries import COUNT_ORG_ROBOTS, COUNT_ROBOTS, sql
+
+DEFAULT_NAME = 'VÖLM Robot'
+DEFAULT_MODEL = 'VLM-2024'
+
+COLUMNS = ('serial_number', 'model', 'owner', 'name')
+ALIASES = {'serial': 'serial_number', 'sn': 'serial_number'}
+
+ANOTHER_FLEET = 'serial_number is registered to another fleet'
+
+CREATE_STAGING = """CREATE TEMP TABLE robot_import (
+    line INTEGER NOT NULL,
+    serial_number TEXT,
+    model TEXT,
+    owner TEXT,
+    name TEXT,
+    error TEXT,
+    user_id INTEGER,
+    robot_id INTEGER,
+    action TEXT
+) ON COMMIT DROP"""
+
+COPY_STAGING = """COPY robot_import (line, serial_number, model, owner, name, error) FROM STDIN WITH (FORMAT csv)"""
+
+INDEX_STAGING = """CREATE INDEX ON robot_import (serial_number)"""
+
+CHECK_FIELDS = """UPDATE robot_import SET error = CASE
+    WHEN serial_number IS NULL THEN 'serial_number is required'
+    WHEN length(serial_number) > 64 THEN 'serial_number is longer than 64 characters'
+    WHEN length(model) > 50 THEN 'model is longer than 50 characters'
+    ELSE 'name is longer than 100 characters'
+END
+WHERE error IS NULL
+AND (serial_number IS NULL OR length(serial_number) > 64 OR length(model) > 50 OR length(name) > 100)"""
+
+CHECK_DUPLICATES = """UPDATE robot_import i SET error = 'duplicate serial_number, first on line ' || d.first_line
+FROM (
+    SELECT serial_number, min(line) AS first_line FROM robot_import
+    WHERE error IS NULL GROUP BY serial_number HAVING count(*) > 1
+) d
+WHERE i.error IS NULL AND i.serial_number = d.serial_number AND i.line > d.first_line"""
+
+DEFAULT_OWNER = """UPDATE robot_import SET owner = %s WHERE error IS NULL AND owner IS NULL"""
+
+RESOLVE_OWNER_IDS = """UPDATE robot_import i SET user_id = u.id
+FROM {schema}.users u
+WHERE i.error IS NULL AND u.id = CASE WHEN i.owner ~ '^[0-9]{{1,9}}$' THEN i.owner::integer END"""
+
+RESOLVE_OWNER_EMAILS = """UPDATE robot_import i SET user_id = u.id
+FROM {schema}.users u
+WHERE i.error IS NULL AND i.user_id IS NULL AND u.email = i.owner"""
+
+UNKNOWN_OWNERS = """UPDATE robot_import
+SET error = CASE WHEN owner IS NULL THEN 'owner is required' ELSE 'unknown owner ' || owner END
+WHERE error IS NULL AND user_id IS NULL"""
+
+CHECK_MEMBERS = """UPDATE robot_import i SET error = 'owner is not a member of the organization'
+WHERE i.error IS NULL AND NOT EXISTS (
+    SELECT 1 FROM {schema}.organization_members m WHERE m.org_id = %s AND m.user_id = i.user_id
+)"""
+
+CHECK_OWNER = """UPDATE robot_import SET error = 'owner must be the importing user unless org_id is given'
+WHERE error IS NULL AND user_id <> %s"""
+
+# Активный робот с тем же номером: свой парк — обновить, чужой — ошибка строки.
+FIND_EXISTING = f"""UPDATE robot_import i
+SET robot_id = r.id,
+    error = CASE WHEN r.org_id IS DISTINCT FROM %s::integer OR (r.org_id IS NULL AND r.user_id <> i.user_id)
+        THEN '{ANOTHER_FLEET}' END
+FROM {{schema}}.robots r
+WHERE i.error IS NULL AND r.serial_number = i.serial_number AND (r.archived IS NULL OR r.archived = false)"""
+
+# Новые роботы сверх лимита парка отклоняются в порядке строк файла.
+CHECK_LIMIT = """UPDATE robot_import i SET error = 'robot limit reached'
+FROM (
+    SELECT line, row_number() OVER (ORDER BY line) AS n FROM robot_import
+    WHERE error IS NULL AND robot_id IS NULL
+) f
+WHERE i.line = f.line AND f.n > %s"""
+
+def event_data(alias: str) -> str:
+    """jsonb полного состояния робота из строки alias для robot_events"""
+    values = (f"COALESCE({alias}.{field}, false)" if field == 'archived' else f'{alias}.{field}' for field in events.STATE_FIELDS)
+    return 'jsonb_build_object(' + ', '.join(f"'{field}', {value}" for field, value in zip(events.STATE_FIELDS, values)) + ')'
+
+STATE = ', '.join(events.STATE_FIELDS)
+STATE_R = ', '.join(f'r.{field}' for field in events.STATE_FIELDS)
+
+RELEASE_ARCHIVED = f"""WITH released AS (
+    UPDATE {{schema}}.robots r SET serial_number = NULL, updated_at = CURRENT_TIMESTAMP
+    FROM robot_import i
+    WHERE i.error IS NULL AND i.robot_id IS NULL AND r.serial_number = i.serial_number AND r.archived = true
+    RETURNING r.id
+)
+INSERT INTO {{schema}}.robot_events (robot_id, actor_id, event_type, data)
+SELECT id, %s, '{events.UPDATED}', '{{{{"serial_number": null}}}}'::jsonb FROM released"""
+
+UPDATE_EXISTING = f"""WITH updated AS (
+    UPDATE {{schema}}.robots r
+    SET user_id = i.user_id, model = COALESCE(i.model, r.model), name = COALESCE(i.name, r.name),
+        updated_at = CURRENT_TIMESTAMP
+    FROM robot_import i
+    WHERE i.error IS NULL AND i.robot_id = r.id AND r.serial_number = i.serial_number
+    AND r.org_id IS NOT DISTINCT FROM %s::integer AND (r.org_id IS NOT NULL OR r.user_id = i.user_id)
+    AND (r.archived IS NULL OR r.archived = false)
+    RETURNING r.id, {STATE_R}
+), logged AS (
+    INSERT INTO {{schema}}.robot_events (robot_id, actor_id, event_type, data)
+    SELECT id, %s, '{events.IMPORTED}', {event_data('updated')} FROM updated ORDER BY id
+)
+UPDATE robot_import i SET action = 'updated'
+FROM updated
+WHERE i.error IS NULL AND i.robot_id = updated.id"""
+
+INSERT_NEW = f"""WITH inserted AS (
+    INSERT INTO {{schema}}.robots
+    (user_id, name, model, has_cleaning, battery_level, status, current_task, is_active, org_id, serial_number, archived)
+    SELECT user_id, COALESCE(name, %s || ' ' || serial_number), COALESCE(model, %s),
+        true, 100, 'online', 'idle', false, %s::integer, serial_number, false
+    FROM robot_import
+    WHERE error IS NULL AND robot_id IS NULL
+    ORDER BY line
+    ON CONFLICT (serial_number) DO NOTHING
+    RETURNING id, {STATE}
+), logged AS (
+    INSERT INTO {{schema}}.robot_events (robot_id, actor_id, event_type, data)
+    SELECT id, %s, '{events.CONNECTED}', {event_data('inserted')} FROM inserted ORDER BY id
+)
+UPDATE robot_import i SET robot_id = inserted.id, action = 'created'
+FROM inserted
+WHERE i.error IS NULL AND i.serial_number = inserted.serial_number"""
+
+# Строки, которые не применились из-за параллельного изменения номера.
+MARK_LOST = f"""UPDATE robot_import SET error = '{ANOTHER_FLEET}' WHERE error IS NULL AND action IS NULL"""
+
+COUNT_ACTIONS = """SELECT action, count(*) FROM robot_import WHERE action IS NOT NULL GROUP BY action"""
+
+LIST_ERRORS = """SELECT line, serial_number, error FROM robot_import WHERE error IS NOT NULL ORDER BY line"""
+
+def clean(value):
+    """Значение поля: строка без пробелов по краям или None"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def read_csv(lines):
+    """Записи (line, serial_number, model, owner, name, error) из CSV с заголовком; ValueError без serial_number"""
+    reader = csv.reader(lines)
+    names = [ALIASES.get(name.strip().lower(), name.strip().lower()) for name in next(reader, [])]
+    if 'serial_number' not in names:
+        raise ValueError('CSV header must include serial_number')
+    positions = [names.index(column) if column in names else None for column in COLUMNS]
+    return csv_records(reader, positions)
+
+def csv_records(reader, positions: list):
+    """Строки CSV в записи; пустые строки пропускаются"""
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        values = [clean(row[i]) if i is not None and i < len(row) else None for i in positions]
+        yield (reader.line_num, *values, None)
+
+def read_ndjson(lines):
+    """Записи (line, serial_number, model, owner, name, error) из NDJSON; кривые строки — с ошибкой"""
+    for number, text in enumerate(lines, 1):
+        if not text.strip():
+            continue
+        try:
+            item = json.loads(text)
+        except ValueError:
+            yield (number, None, None, None, None, 'invalid JSON')
+            continue
+        if not isinstance(item, dict):
+            yield (number, None, None, None, None, 'expected a JSON object')
+            continue
+        item = {ALIASES.get(key, key): value for key, value in item.items()}
+        yield (number, *(clean(item.get(column)) for column in COLUMNS), None)
+
+READERS = {'csv': read_csv, 'ndjson': read_ndjson}
+
+class CopySource:
+    """Файловый объект для copy_expert: CSV для COPY по мере чтения записей, без сборки всего файла"""
+    
+    def __init__(self, records):
+        self.records = iter(records)
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator='\n')
+        self.pending = ''
+        self.count = 0
+    
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self.pending) < size:
+            batch = [record for _, record in zip(range(1000), self.records)]
+            if not batch:
+                break
+            self.count += len(batch)
+            self.buffer.seek(0)
+            self.buffer.truncate()
+            self.writer.writerows(batch)
+            self.pending += self.buffer.getvalue()
+        if size < 0:
+            size = len(self.pending)
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+    
+def import_robots(cur, records, actor_id: int, org_id=None, default_owner=None, only_owner=None,
+                  members_only: bool = False, limit=None) -> dict:
+    """Загрузить записи и слить с robots в текущей транзакции; отчёт с ошибками по строкам
+    
+    default_owner — владелец строк без owner; only_owner — единственный допустимый владелец;
+    members_only — владельцы только из участников org_id; limit — лимит активных роботов парка.
+    """
+    cur.execute(CREATE_STAGING)
+    source = CopySource(records)
+    cur.copy_expert(COPY_STAGING, source)
+    cur.execute(INDEX_STAGING)
+    cur.execute('ANALYZE robot_import')
+    
+    cur.execute(CHECK_FIELDS)
+    cur.execute(CHECK_DUPLICATES)
+    if default_owner is not None:
+        cur.execute(DEFAULT_OWNER, (str(default_owner),))
+    cur.execute(sql(RESOLVE_OWNER_IDS))
+    cur.execute(sql(RESOLVE_OWNER_EMAILS))
+    cur.execute(UNKNOWN_OWNERS)
+    if members_only:
+        cur.execute(sql(CHECK_MEMBERS), (org_id,))
+    if only_owner is not None:
+        cur.execute(CHECK_OWNER, (only_owner,))
+    cur.execute(sql(FIND_EXISTING), (org_id,))
+    
+    if limit is not None:
+        if org_id is None:
+            cur.execute(sql(COUNT_ROBOTS), (only_owner,))
+        else:
+            cur.execute(sql(COUNT_ORG_ROBOTS), (org_id,))
+        cur.execute(CHECK_LIMIT, (max(limit - cur.fetchone()[0], 0),))
+    
+    cur.execute(sql(RELEASE_ARCHIVED), (actor_id,))
+    cur.execute(sql(UPDATE_EXISTING), (org_id, actor_id))
+    cur.execute(sql(INSERT_NEW), (DEFAULT_NAME, DEFAULT_MODEL, org_id, actor_id))
+    cur.execute(MARK_LOST)
+    
+    cur.execute(COUNT_ACTIONS)
+    actions = dict(cur.fetchall())
+    cur.execute(LIST_ERRORS)
+    errors = [{'line': line, 'serial_number': serial_number, 'error': error} for line, serial_number, error in cur.fetchall()]
+    return {
+        'rows': source.count,
+        'created': actions.get('created', 0),
+        'updated': actions.get('updated', 0),
+        'failed': len(errors),
+        'errors': errors,
+    }
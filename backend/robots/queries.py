@@ -0,0 +1,121 @@
+"""SQL-запросы API роботов, общие для psycopg2 и asyncpg вариантов"""
+import base64
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+from serializer import sql_isoformat
+
+ROBOT_FIELDS = 'id, name, model, has_cleaning, battery_level, status, current_task, is_active, org_id, serial_number'
+ROBOT_FIELDS_R = ', '.join(f'r.{field}' for field in ROBOT_FIELDS.split(', '))
+
+def battery_prediction(alias: str) -> str:
+    """Скорость разряда (%/ч) и минуты мойки до нуля: оценка робота, иначе его модели"""
+    rate = 'COALESCE(b.drain_rate, m.drain_rate)'
+    return (
+        f"ROUND({rate}::numeric, 2)::float8 AS drain_rate, "
+        f"FLOOR({alias}.battery_level * 60 / NULLIF({rate}, 0))::integer AS cleaning_minutes_left"
+    )
+
+def battery_join(alias: str) -> str:
+    """Присоединить оценки разряда к роботам"""
+    return (
+        f"LEFT JOIN {{schema}}.battery_states b ON b.robot_id = {alias}.id\n"
+        f"LEFT JOIN {{schema}}.battery_model_rates m ON m.model = {alias}.model"
+    )
+
+# Личный робот доступен владельцу, робот организации — её участникам с нужной ролью.
+# Параметры: user_id, список org_id из кеша членства.
+ACCESS = '((org_id IS NULL AND user_id = %s) OR org_id = ANY(%s::integer[]))'
+ACCESS_R = '((r.org_id IS NULL AND r.user_id = %s) OR r.org_id = ANY(%s::integer[]))'
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+LIST_ROBOTS = f"""SELECT {ROBOT_FIELDS_R}, r.created_at,
+{battery_prediction('r')}
+FROM {{schema}}.robots r
+{battery_join('r')}
+WHERE r.user_id = %s AND r.org_id IS NULL AND (r.archived IS NULL OR r.archived = false)
+ORDER BY r.created_at DESC, r.id DESC"""
+
+LIST_ORG_ROBOTS = f"""SELECT {ROBOT_FIELDS_R}, r.created_at,
+{battery_prediction('r')}
+FROM {{schema}}.robots r
+{battery_join('r')}
+WHERE r.org_id = %s AND (r.archived IS NULL OR r.archived = false){{after}}
+ORDER BY r.created_at DESC, r.id DESC
+LIMIT %s"""
+
+PAGE_AFTER = """
+AND (r.created_at, r.id) < (%s, %s)"""
+
+LIST_ROBOTS_JSON = f"""SELECT COALESCE(string_agg(row_to_json(r)::text, ',' ORDER BY t.created_at DESC, t.id DESC), ''),
+COALESCE(array_agg(DISTINCT t.current_task), ARRAY[]::varchar[])
+FROM {{schema}}.robots t
+{battery_join('t')}
+CROSS JOIN LATERAL (
+    SELECT t.id, t.name, t.model, t.has_cleaning, t.battery_level, t.status,
+    t.current_task, t.is_active, t.org_id, t.serial_number, {sql_isoformat('t.created_at')} AS created_at,
+    {battery_prediction('t')}
+) r
+WHERE t.user_id = %s AND t.org_id IS NULL AND (t.archived IS NULL OR t.archived = false)"""
+
+GET_ROBOT = f"""SELECT {ROBOT_FIELDS_R}, r.created_at,
+{battery_prediction('r')}
+FROM {{schema}}.robots r
+{battery_join('r')}
+WHERE r.id = %s AND {ACCESS_R} AND (r.archived IS NULL OR r.archived = false)"""
+
+COUNT_ROBOTS = """SELECT COUNT(*) FROM {schema}.robots
+WHERE user_id = %s AND org_id IS NULL AND (archived IS NULL OR archived = false)"""
+
+COUNT_ORG_ROBOTS = """SELECT COUNT(*) FROM {schema}.robots
+WHERE org_id = %s AND (archived IS NULL OR archived = false)"""
+
+INSERT_ROBOT = f"""INSERT INTO {{schema}}.robots
+(user_id, name, model, has_cleaning, battery_level, status, current_task, is_active, org_id)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+RETURNING {ROBOT_FIELDS}, created_at"""
+
+FIND_ROBOT = f"""SELECT id, has_cleaning FROM {{schema}}.robots WHERE id = %s AND {ACCESS}"""
+
+UPDATE_ROBOT = f"""UPDATE {{schema}}.robots
+SET {{assignments}}, updated_at = CURRENT_TIMESTAMP
+WHERE id = %s AND {ACCESS}
+RETURNING {ROBOT_FIELDS}"""
+
+SET_ROBOT_TASK = f"""UPDATE {{schema}}.robots
+SET current_task = %s, is_active = %s, updated_at = CURRENT_TIMESTAMP
+WHERE id = %s AND {ACCESS}
+RETURNING {ROBOT_FIELDS}"""
+
+ARCHIVE_ROBOT = f"""UPDATE {{schema}}.robots
+SET archived = true, updated_at = CURRENT_TIMESTAMP
+WHERE id = %s AND {ACCESS}
+RETURNING id"""
+
+UPDATABLE_FIELDS = ('has_cleaning', 'battery_level', 'status', 'current_task', 'is_active')
+
+def page_cursor(robot: dict) -> str:
+    """Курсор следующей страницы по последнему роботу (created_at, id)"""
+    raw = f"{robot['created_at'].isoformat()}|{robot['id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def parse_cursor(cursor: str) -> tuple:
+    """(created_at, id) из курсора; ValueError для испорченного курсора"""
+    try:
+        created_at, robot_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(robot_id)
+    except (UnicodeError, ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def sql(query: str, **parts) -> str:
+    """Подставить схему БД и фрагменты в шаблон запроса"""
+    return query.format(schema=os.environ.get('MAIN_DB_SCHEMA'), **parts)
+
+@lru_cache(maxsize=256)
+def numbered(query: str) -> str:
+    """Плейсхолдеры psycopg2 (%s) → asyncpg ($1, $2, ...)"""
+    counter = iter(range(1, 1000))
+    return re.sub(r'%s|%%', lambda m: '%' if m.group() == '%%' else f'${next(counter)}', query)
@@ -0,0 +1,139 @@
+# Копия backend/core/ratelimit.py: правьте оригинал и запускайте tools/vendor_core.py
+"""Ограничение частоты запросов: token bucket в памяти инстанса и общий уровень в Redis"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from responses import error_response
+
+MAX_LOCAL_BUCKETS = 10000
+SHARED_ERROR_LOG_SECONDS = 60
+
+SHARED_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return tostring(retry_after)
+"""
+
+class RateLimiter:
+    """Token bucket: локальный уровень на инстанс и необязательный общий уровень"""
+    
+    def __init__(self, redis_url: str = None, max_buckets: int = MAX_LOCAL_BUCKETS):
+        self.max_buckets = max_buckets
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+        self.shared_script = None
+        self.shared_errors = 0
+        self.shared_error_logged_at = None
+        if redis_url:
+            try:
+                import redis
+            except ImportError:
+                return
+            client = redis.Redis.from_url(redis_url, socket_timeout=0.05, socket_connect_timeout=0.05)
+            self.shared_script = client.register_script(SHARED_BUCKET_SCRIPT)
+    
+    def check(self, key: str, capacity: int, rate: float) -> float:
+        """Списать токен; 0 если запрос разрешён, иначе секунды до повтора"""
+        retry_after = self.check_local(key, capacity, rate)
+        if retry_after or self.shared_script is None:
+            return retry_after
+        
+        try:
+            retry_after = float(self.shared_script(keys=[f'ratelimit:{key}'], args=[capacity, rate]))
+        except Exception as e:
+            self.log_shared_error(e)
+            return 0.0
+        
+        if retry_after:
+            self.block_local(key, retry_after, rate)
+        return retry_after
+    
+    def log_shared_error(self, error: Exception) -> None:
+        """Сообщить о недоступности общего уровня не чаще раза в SHARED_ERROR_LOG_SECONDS"""
+        now = time.monotonic()
+        with self.lock:
+            self.shared_errors += 1
+            if self.shared_error_logged_at is not None and now - self.shared_error_logged_at < SHARED_ERROR_LOG_SECONDS:
+                return
+            errors, self.shared_errors = self.shared_errors, 0
+            self.shared_error_logged_at = now
+        print(f'Shared rate limit unavailable ({errors} errors): {error}')
+    
+    def check_local(self, key: str, capacity: int, rate: float) -> float:
+        """Списать токен из бакета инстанса"""
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = [float(capacity), now]
+                self.buckets[key] = bucket
+                if len(self.buckets) > self.max_buckets:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+            
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0.0
+            
+            bucket[0] = tokens
+            return (1 - tokens) / rate
+    
+    def block_local(self, key: str, retry_after: float, rate: float) -> None:
+        """Выровнять бакет инстанса по отказу общего уровня"""
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket[0] = 1 - retry_after * rate
+                bucket[1] = time.monotonic()
+
+_limiter = None
+
+def get_limiter() -> RateLimiter:
+    """Лимитер инстанса, создаётся при первом запросе"""
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter(os.environ.get('RATE_LIMIT_REDIS_URL'))
+    return _limiter
+
+def client_ip(event: dict):
+    """IP клиента из контекста запроса; None, если рантайм его не передал
+    
+    X-Forwarded-For не читается: его первую запись задаёт сам клиент, и с новым значением
+    на каждый запрос он обходил бы лимит. Без sourceIp лимиты по IP не применяются
+    (см. rate_limit), а не сводятся в одно ведро на всех клиентов.
+    """
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    return identity.get('sourceIp') or None
+
+def rate_limit(rule: str, identity, limits: dict):
+    """Ответ 429 при превышении лимита правила, иначе None; без identity лимит не применяется"""
+    if identity is None or os.environ.get('RATE_LIMIT_DISABLED', '').lower() in ('1', 'true', 'on'):
+        return None
+    
+    capacity, rate = limits[rule]
+    retry_after = get_limiter().check(f'{rule}:{identity}', capacity, rate)
+    if not retry_after:
+        return None
+    
+    response = error_response('Too many requests', 429)
+    response['headers']['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
@@ -0,0 +1,75 @@
+"""Декларативная таблица маршрутов, компилируемая один раз при импорте"""
+from collections import namedtuple
+
+Route = namedtuple('Route', ['method', 'pattern', 'call'])
+
+def compose(middleware: tuple, handler):
+    """Склеить middleware и обработчик в один вызов call(ctx)"""
+    call = handler
+    for hook in reversed(middleware):
+        call = (lambda hook, call_next: lambda ctx: hook(ctx, lambda: call_next(ctx)))(hook, call)
+    return call
+
+def split_path(path: str) -> tuple:
+    """Сегменты пути без пустых частей"""
+    return tuple(filter(None, path.split('/')))
+
+def request_segments(event: dict) -> tuple:
+    """Сегменты пути запроса с id робота из pathParams, если рантайм передал его отдельно"""
+    segments = split_path(event.get('params', {}).get('path', '') or '')
+    robot_id = (event.get('pathParams') or {}).get('id')
+    if robot_id and segments[:1] != (str(robot_id),):
+        segments = (str(robot_id),) + segments
+    return segments
+
+class Router:
+    """Маршруты по (метод, шаблон пути): статические в словаре, с параметрами в дереве сегментов"""
+    
+    def __init__(self):
+        self.static = {}
+        self.tree = {'children': {}, 'param': None, 'routes': {}}
+    
+    def add(self, method: str, pattern: str, handler, *middleware) -> None:
+        """Зарегистрировать маршрут; {name} в шаблоне — параметр пути"""
+        route = Route(method, pattern, compose(middleware, handler))
+        segments = split_path(pattern)
+        
+        if not any(segment.startswith('{') for segment in segments):
+            self.static[(method, segments)] = route
+            return
+        
+        node = self.tree
+        names = []
+        for segment in segments:
+            if segment.startswith('{') and segment.endswith('}'):
+                names.append(segment[1:-1])
+                if node['param'] is None:
+                    node['param'] = {'children': {}, 'param': None, 'routes': {}}
+                node = node['param']
+            else:
+                node = node['children'].setdefault(segment, {'children': {}, 'param': None, 'routes': {}})
+        node['routes'][method] = (route, tuple(names))
+    
+    def match(self, method: str, segments: tuple):
+        """(маршрут, параметры пути) по сегментам пути или (None, None)"""
+        route = self.static.get((method, segments))
+        if route is not None:
+            return route, {}
+        
+        node = self.tree
+        values = []
+        for segment in segments:
+            child = node['children'].get(segment)
+            if child is not None:
+                node = child
+            elif node['param'] is not None:
+                values.append(segment)
+                node = node['param']
+            else:
+                return None, None
+        
+        found = node['routes'].get(method)
+        if found is None:
+            return None, None
+        route, names = found
+        return route, dict(zip(names, values))
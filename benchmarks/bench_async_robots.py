@@ -0,0 +1,103 @@
+"""Пропускная способность одного инстанса: синхронный index.handler против async_index.handler
+
+Синхронный handler обслуживает один запрос за раз; асинхронный держит до CONCURRENCY
+запросов в полёте на пуле asyncpg. Нужна тестовая БД:
+DATABASE_URL=postgresql://... python benchmarks/bench_async_robots.py
+Выигрыш растёт с задержкой до БД: для реалистичной картины запускайте против удалённого Postgres.
+"""
+import asyncio
+import os
+import sys
+import time
+
+from common import create_schema, print_table, use_function
+
+use_function('robots')
+import psycopg2  # noqa: E402
+import index  # noqa: E402
+import async_index  # noqa: E402
+import tokens  # noqa: E402
+
+REQUESTS = 2_000
+CONCURRENCY = (1, 8, 32, 128)
+ROBOTS_PER_USER = 2
+USERS = 50
+
+
+def prepare(conn, schema: str) -> list:
+    """Временная схема с роботами; возвращает события запросов"""
+    cur = conn.cursor()
+    create_schema(cur, schema)
+    cur.execute(
+        f"""INSERT INTO {schema}.robots (user_id, name, model, has_cleaning, battery_level, status, current_task, is_active)
+        SELECT u, 'VÖLM Robot #' || r, 'VLM-2024', true, 90, 'online', 'idle', false
+        FROM generate_series(1, %s) u, generate_series(1, %s) r""",
+        (USERS, ROBOTS_PER_USER)
+    )
+    cur.execute(f'SELECT id, user_id FROM {schema}.robots')
+    robots = cur.fetchall()
+    conn.commit()
+    cur.close()
+
+    events = []
+    for i in range(REQUESTS):
+        robot_id, user_id = robots[i % len(robots)]
+        token = tokens.issue_token({'user_id': user_id}, 3600)
+        event = {'httpMethod': 'GET', 'headers': {'X-Authorization': f'Bearer {token}'}, 'params': {'path': ''}}
+        event['pathParams'] = {'id': str(robot_id)} if i % 2 else {}
+        events.append(event)
+    return events
+
+
+def run_sync(events: list) -> float:
+    """Синхронный инстанс: запросы строго по одному"""
+    started = time.perf_counter()
+    for event in events:
+        assert index.handler(event, None)['statusCode'] == 200
+    return len(events) / (time.perf_counter() - started)
+
+
+async def run_async(events: list, concurrency: int) -> float:
+    """Асинхронный инстанс: до concurrency запросов одновременно"""
+    await async_index.get_pool()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(event):
+        async with slots:
+            response = await async_index.handler(event, None)
+            assert response['statusCode'] == 200, response['body']
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(event) for event in events))
+    return len(events) / (time.perf_counter() - started)
+
+
+def main() -> None:
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit('DATABASE_URL is required')
+    os.environ.setdefault('JWT_SECRET', 'bench-secret-' + 'x' * 32)
+    os.environ['RATE_LIMIT_DISABLED'] = '1'
+    schema = f'bench_async_{os.getpid()}'
+    os.environ['MAIN_DB_SCHEMA'] = schema
+    os.environ.setdefault('ASYNC_DB_POOL_SIZE', str(max(CONCURRENCY)))
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        events = prepare(conn, schema)
+        table = [['sync', 1, f'{run_sync(events):.0f}']]
+        for concurrency in CONCURRENCY:
+            rate = asyncio.run(run_async(events, concurrency))
+            # Следующий asyncio.run — новый цикл событий: пул и его блокировка создаются заново.
+            async_index._pool = None
+            async_index._pools_lock = asyncio.Lock()
+            table.append(['async', concurrency, f'{rate:.0f}'])
+        print_table(['handler', 'in flight', 'requests/s'], table)
+    finally:
+        conn.rollback()
+        cur = conn.cursor()
+        cur.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
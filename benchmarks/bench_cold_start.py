@@ -0,0 +1,70 @@
+"""Холодный старт функций: время импорта точки входа в чистом интерпретаторе
+
+Каждый замер — отдельный процесс python -X importtime с каталогом функции в sys.path, как
+у рантайма. В таблице медиана RUNS запусков: весь импорт, из него модули ядра backend/core
+(копии рядом с index.py) и самые тяжёлые прямые импорты. Функция, у которой здесь не
+установлены зависимости, помечается как skipped. Запуск: python benchmarks/bench_cold_start.py
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+from common import BACKEND, print_table
+
+RUNS = 15
+SHOWN_IMPORTS = 3
+
+ENTRY_POINTS = (
+    ('robots', 'index'),
+    ('robots', 'async_index'),
+    ('auth', 'index'),
+    ('extensions/telegram-bot/telegram-auth', 'index'),
+    ('extensions/telegram-bot/telegram-bot', 'index'),
+)
+
+CORE_MODULES = sorted(name[:-3] for name in os.listdir(os.path.join(BACKEND, 'core')) if name.endswith('.py'))
+
+
+def import_times(directory: str, module: str):
+    """{модуль: (глубина, накопленные мкс)} одного импорта или текст ошибки"""
+    env = {**os.environ, 'PYTHONPATH': directory}
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=directory, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        return result.stderr.strip().splitlines()[-1]
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times.setdefault(name.strip(), (depth, int(cumulative)))
+    return times
+
+
+def measure_entry(function: str, module: str) -> list:
+    """Строка таблицы для точки входа"""
+    directory = os.path.join(BACKEND, function)
+    runs = []
+    for _ in range(RUNS):
+        times = import_times(directory, module)
+        if isinstance(times, str):
+            return [f'{function}:{module}', 'skipped', '', times]
+        runs.append(times)
+    total = statistics.median(run[module][1] for run in runs)
+    core = statistics.median(sum(run[name][1] for name in CORE_MODULES if name in run and run[name][0] == 1) for run in runs)
+    direct = {name: cumulative for name, (depth, cumulative) in runs[len(runs) // 2].items()
+              if depth == 1 and name not in CORE_MODULES}
+    heaviest = sorted(direct, key=direct.get, reverse=True)[:SHOWN_IMPORTS]
+    return [f'{function}:{module}', f'{total / 1000:.1f}', f'{core / 1000:.1f}',
+            ', '.join(f'{name} {direct[name] / 1000:.1f}' for name in heaviest)]
+
+
+def main() -> None:
+    table = [measure_entry(function, module) for function, module in ENTRY_POINTS]
+    print_table(['entry point', 'import ms', 'core ms', 'heaviest direct imports, ms'], table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Бенчмарк сжатия ответов: экономия байт против CPU для gzip и brotli на разных уровнях
+
+Запуск: python benchmarks/bench_compression.py
+"""
+import gzip
+
+from common import format_seconds, measure, print_table, use_function
+from bench_serializer import FakeCursor, make_rows
+
+use_function('robots')
+import responses  # noqa: E402
+import serializer  # noqa: E402
+
+GZIP_LEVELS = (1, 4, 6, 9)
+BROTLI_QUALITIES = (1, 4, 6, 11)
+
+
+def payload(count: int) -> bytes:
+    """Тело ответа list_robots для парка заданного размера"""
+    body = serializer.dumps({'robots': serializer.fetch_all(FakeCursor(make_rows(count)))})
+    return body.encode('utf-8')
+
+
+def codecs() -> list:
+    """Пары (название, функция сжатия) для всех уровней"""
+    result = [(f'gzip-{level}', lambda data, level=level: gzip.compress(data, compresslevel=level, mtime=0))
+              for level in GZIP_LEVELS]
+    if responses.brotli is not None:
+        result += [(f'br-{quality}', lambda data, quality=quality: responses.brotli.compress(data, quality=quality))
+                   for quality in BROTLI_QUALITIES]
+    return result
+
+
+def main() -> None:
+    print(f'defaults: gzip-{responses.GZIP_LEVEL}, br-{responses.BROTLI_QUALITY}, '
+          f'threshold {responses.DEFAULT_MIN_BYTES} bytes\n')
+    table = []
+    for count in (10, 100, 1_000, 10_000):
+        data = payload(count)
+        number = max(1, 2_000 // count)
+        for name, compress in codecs():
+            size = len(compress(data))
+            timing = measure(lambda: compress(data), number=number)
+            saved = len(data) - size
+            table.append([
+                count,
+                len(data),
+                name,
+                size,
+                f'{saved / len(data):.1%}',
+                format_seconds(timing['best']),
+                f"{saved / 1024 / (timing['best'] * 1e3):.1f}",
+            ])
+    print_table(['robots', 'raw bytes', 'codec', 'bytes', 'saved', 'cpu', 'KiB saved/ms'], table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""CPU и пиковая память на запрос для карт покрытия больших фасадов
+
+Сравнивает загрузку упакованной карты (base64) и сетки списков (cells), отдачу
+сохранённого blob как deflate и с распаковкой, а также наивный JSON со списками.
+Запуск: python benchmarks/bench_coverage.py
+"""
+import base64
+import json
+import random
+import time
+import tracemalloc
+
+from common import format_seconds, print_table, use_function
+
+use_function('robots')
+import coverage  # noqa: E402
+
+FACADES = [(256, 256), (1024, 1024), (4096, 4096)]
+CELLS_LIMIT = 1024 * 1024
+
+
+def make_rows(width: int, height: int):
+    """Проходы робота полосами с пропусками у рам и случайными огрехами"""
+    rng = random.Random(width * height)
+    for y in range(height):
+        frame = y % 64 < 2
+        yield [0 if frame or x % 64 < 2 or rng.random() < 0.02 else 1 for x in range(width)]
+
+
+def run(fn) -> tuple:
+    """(процессорное время, пик памяти) одного вызова; память — отдельным прогоном под tracemalloc"""
+    started = time.process_time()
+    fn()
+    cpu = time.process_time() - started
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return cpu, peak
+
+
+def main() -> None:
+    table = []
+    for width, height in FACADES:
+        # Ширины кратны 8, поэтому строки упаковываются по отдельности без сетки целиком.
+        packed = b''.join(coverage.pack_cells([row]) for row in make_rows(width, height))
+        grid = list(make_rows(width, height)) if width * height <= CELLS_LIMIT else None
+        size = f'{width}x{height}'
+
+        packed_body = json.dumps({'width': width, 'height': height, 'bitmap': base64.b64encode(packed).decode('ascii')})
+        cases = [('upload packed', lambda: coverage.parse_upload(json.loads(packed_body)), len(packed_body))]
+        if grid is not None:
+            cells_body = json.dumps({'cells': grid})
+            cases.append(('upload cells', lambda: coverage.parse_upload(json.loads(cells_body)), len(cells_body)))
+
+        session = coverage.parse_upload(json.loads(packed_body))
+        row = (width, height, coverage.ENCODING, session['bitmap'])
+        cases.append(('bitmap deflate', lambda: coverage.bitmap_response(row, {'deflate'}), len(session['bitmap'])))
+        cases.append(('bitmap identity', lambda: coverage.bitmap_response(row, set()), len(packed)))
+        if grid is not None:
+            cases.append(('naive JSON lists', lambda: json.dumps({'cells': grid}), len(cells_body)))
+
+        for name, fn, payload in cases:
+            cpu, peak = run(fn)
+            table.append([size, name, f'{payload / 1024:.0f} KiB', format_seconds(cpu), f'{peak / 1024 / 1024:.1f} MiB'])
+
+        percent = round(session['covered_cells'] * 100 / (width * height), 2)
+        print(f'{size}: {percent}% covered, stored {len(session["bitmap"]) / 1024:.1f} KiB')
+
+    print_table(['facade', 'operation', 'payload', 'cpu', 'peak memory'], table)
+
+
+if __name__ == '__main__':
+    main()
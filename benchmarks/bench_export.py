@@ -0,0 +1,131 @@
+"""Выгрузка 1M строк телеметрии: пропускная способность и память по форматам
+
+Поток export.open_stream (серверный курсор, fetchmany, кодирование по кускам) в NDJSON и CSV,
+с gzip и без, против прежнего подхода list_robots: fetchall и один JSON в памяти.
+Пик памяти Python (tracemalloc) для потока снимается на 100k и 1M строк, чтобы было видно,
+что он не растёт с объёмом. Нужна тестовая БД:
+DATABASE_URL=postgresql://... python benchmarks/bench_export.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from common import create_schema, format_seconds, print_table, use_function
+
+use_function('robots')
+import psycopg2  # noqa: E402
+import export  # noqa: E402
+from queries import sql  # noqa: E402
+from serializer import dumps  # noqa: E402
+
+ROWS = 1_000_000
+SMALL_ROWS = 100_000
+ROBOTS = 100
+USER_ID = 1
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def prepare(conn, schema: str) -> None:
+    """ROBOTS роботов пользователя и ROWS строк телеметрии"""
+    cur = conn.cursor()
+    create_schema(cur, schema)
+    cur.execute(
+        f"""INSERT INTO {schema}.robots (user_id, name, model, has_cleaning, battery_level, status, current_task, is_active)
+        SELECT %s, 'Robot ' || g, 'VLM-2024', true, 80, 'online', 'idle', false FROM generate_series(1, %s) g""",
+        (USER_ID, ROBOTS)
+    )
+    cur.execute(
+        f"""INSERT INTO {schema}.robot_telemetry (robot_id, battery_level, current_task, recorded_at)
+        SELECT 1 + g %% %s, 100 - g %% 100, CASE WHEN g %% 3 = 0 THEN 'cleaning' ELSE 'idle' END,
+        %s + g * INTERVAL '1 second'
+        FROM generate_series(1, %s) g""",
+        (ROBOTS, START, ROWS)
+    )
+    cur.execute(f'ANALYZE {schema}.robot_telemetry')
+    conn.commit()
+    cur.close()
+
+
+def telemetry_query(until=None) -> tuple:
+    """Запрос выгрузки телеметрии и его параметры"""
+    params = {'dataset': 'telemetry'}
+    if until:
+        params['until'] = until
+    query, filters, values = export.build_query(export.parse_params(params))
+    return sql(query, filters=filters), (USER_ID, [], *values)
+
+
+def run_stream(fmt: str, compress: bool, until=None) -> tuple:
+    """(секунды, байт) полной выгрузки потоком"""
+    query, params = telemetry_query(until)
+    started = time.perf_counter()
+    size = 0
+    for chunk in export.open_stream(psycopg2.connect(os.environ['DATABASE_URL']), query, params, fmt, compress):
+        size += len(chunk)
+    return time.perf_counter() - started, size
+
+
+def run_fetchall(until=None) -> tuple:
+    """(секунды, байт) как у list_robots: все строки в память и один JSON"""
+    query, params = telemetry_query(until)
+    started = time.perf_counter()
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    cur.execute(query, params)
+    columns = [column.name for column in cur.description]
+    body = dumps({'telemetry': [dict(zip(columns, row)) for row in cur.fetchall()]}).encode('utf-8')
+    cur.close()
+    conn.close()
+    return time.perf_counter() - started, len(body)
+
+
+def peak_memory(fn, *args) -> int:
+    """Пик памяти Python за вызов"""
+    tracemalloc.start()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main() -> None:
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit('DATABASE_URL is required')
+    schema = f'bench_export_{os.getpid()}'
+    os.environ['MAIN_DB_SCHEMA'] = schema
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        prepare(conn, schema)
+        # until отсекает первые SMALL_ROWS строк по времени записи.
+        small_until = (START + timedelta(seconds=SMALL_ROWS + 1)).isoformat()
+
+        table = []
+        modes = [(f"{fmt}{' + gzip' if compress else ''}", run_stream, (fmt, compress))
+                 for fmt in ('ndjson', 'csv') for compress in (False, True)]
+        modes.append(('fetchall + one JSON', run_fetchall, ()))
+        for name, fn, args in modes:
+            seconds, size = fn(*args)
+            small_peak = peak_memory(fn, *args, small_until)
+            peak = peak_memory(fn, *args)
+            table.append([
+                name, format_seconds(seconds), f'{ROWS / seconds:,.0f}', f'{size / seconds / 2 ** 20:,.1f}',
+                f'{size / 2 ** 20:,.1f}', f'{small_peak / 2 ** 20:,.1f}', f'{peak / 2 ** 20:,.1f}',
+            ])
+        print_table(
+            ['mode', f'{ROWS:,} rows', 'rows/s', 'MiB/s', 'MiB out',
+             f'peak MiB, {SMALL_ROWS // 1000}k rows', f'peak MiB, {ROWS // 1000}k rows'],
+            table
+        )
+    finally:
+        conn.rollback()
+        cur = conn.cursor()
+        cur.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
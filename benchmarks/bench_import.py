@@ -0,0 +1,108 @@
+"""Заводская регистрация: один POST /import на IMPORT_ROWS номеров против POST /connect на робота
+
+Оба пути идут через handler функции robots в процессе, без HTTP; у POST /connect честно
+замеряется CONNECT_CALLS вызовов и пересчитывается на IMPORT_ROWS. Второй прогон того же файла
+показывает слияние по serial_number (обновления вместо вставок). Нужна тестовая БД:
+DATABASE_URL=postgresql://... python benchmarks/bench_import.py
+"""
+import json
+import os
+import sys
+import time
+
+from common import create_schema, format_seconds, print_table, use_function
+
+use_function('robots')
+import psycopg2  # noqa: E402
+import index  # noqa: E402
+import tokens  # noqa: E402
+
+IMPORT_ROWS = 10_000
+CONNECT_CALLS = 1_000
+OWNERS = 20
+
+TOKENS = {}
+
+
+def prepare(conn, schema: str) -> None:
+    """Организация без лимита роботов, её владелец и участники"""
+    cur = conn.cursor()
+    create_schema(cur, schema)
+    cur.execute(
+        f"""INSERT INTO {schema}.users (id, email)
+        SELECT u, 'user' || u || '@example.com' FROM generate_series(1, %s) u""",
+        (OWNERS,)
+    )
+    cur.execute(f"INSERT INTO {schema}.organizations (id, name) VALUES (1, 'Factory')")
+    cur.execute(
+        f"""INSERT INTO {schema}.organization_members (org_id, user_id, role)
+        SELECT 1, u, CASE WHEN u = 1 THEN 'owner' ELSE 'viewer' END FROM generate_series(1, %s) u""",
+        (OWNERS,)
+    )
+    conn.commit()
+    cur.close()
+
+
+def request(method: str, path: str, body: str, query: dict = None, content_type: str = 'application/json') -> dict:
+    """Вызов handler robots от имени владельца организации"""
+    event = {
+        'httpMethod': method,
+        'headers': {'X-Authorization': f'Bearer {TOKENS[1]}', 'Content-Type': content_type},
+        'params': {'path': path}, 'queryStringParameters': query or {}, 'body': body,
+    }
+    response = index.handler(event, None)
+    assert response['statusCode'] in (200, 201), response['body']
+    return json.loads(response['body'])
+
+
+def factory_csv(rows: int, with_errors: bool) -> str:
+    """CSV партии: номер, модель, владелец; с with_errors часть строк битая"""
+    lines = ['serial_number,model,owner']
+    for i in range(rows):
+        owner = f'user{1 + i % OWNERS}@example.com'
+        if with_errors and i % 100 == 99:
+            owner = 'nobody@example.com'
+        lines.append(f'VLM-{i:08d},VLM-2024,{owner}')
+    return '\n'.join(lines) + '\n'
+
+
+def main() -> None:
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit('DATABASE_URL is required')
+    os.environ.setdefault('JWT_SECRET', 'bench-secret-' + 'x' * 32)
+    os.environ['RATE_LIMIT_DISABLED'] = '1'
+    schema = f'bench_import_{os.getpid()}'
+    os.environ['MAIN_DB_SCHEMA'] = schema
+    TOKENS[1] = tokens.issue_token({'user_id': 1}, 3600)
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        prepare(conn, schema)
+        table = []
+
+        started = time.perf_counter()
+        for _ in range(CONNECT_CALLS):
+            request('POST', '/connect', json.dumps({'org_id': 1}))
+        per_call = (time.perf_counter() - started) / CONNECT_CALLS
+        table.append([f'POST /connect × {IMPORT_ROWS:,} (from {CONNECT_CALLS:,})', format_seconds(per_call * IMPORT_ROWS),
+                      f'{1 / per_call:,.0f}', IMPORT_ROWS, 0, 0])
+
+        csv_body = factory_csv(IMPORT_ROWS, with_errors=True)
+        for name in ('POST /import, new serials', 'POST /import, same file again'):
+            started = time.perf_counter()
+            report = request('POST', '/import', csv_body, {'org_id': '1'}, 'text/csv')
+            elapsed = time.perf_counter() - started
+            table.append([name, format_seconds(elapsed), f'{IMPORT_ROWS / elapsed:,.0f}',
+                          report['created'], report['updated'], report['failed']])
+
+        print_table(['path', 'time', 'robots/s', 'created', 'updated', 'failed'], table)
+    finally:
+        conn.rollback()
+        cur = conn.cursor()
+        cur.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
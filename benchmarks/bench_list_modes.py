@@ -0,0 +1,81 @@
+"""Бенчмарк list_robots: сборка JSON в Python против string_agg(row_to_json) в Postgres
+
+Нужна тестовая БД: DATABASE_URL=postgresql://... python benchmarks/bench_list_modes.py
+Данные создаются во временной схеме и удаляются после прогона.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+from common import create_schema, format_seconds, print_table, use_function
+
+use_function('robots')
+import psycopg2  # noqa: E402
+import index  # noqa: E402
+
+FLEET_SIZES = (10, 1_000, 10_000, 100_000)
+REPEAT = 5
+
+
+def fill_schema(conn, schema: str) -> None:
+    """Временная схема с парком нужного размера на каждого пользователя"""
+    cur = conn.cursor()
+    create_schema(cur, schema)
+    for user_id, size in enumerate(FLEET_SIZES, start=1):
+        cur.execute(
+            f"""INSERT INTO {schema}.robots
+            (user_id, name, model, has_cleaning, battery_level, status, current_task, is_active, created_at)
+            SELECT %s, 'VÖLM Robot #' || g, 'VLM-2024', g %% 3 <> 0, g %% 101, 'online',
+                   CASE WHEN g %% 5 = 0 THEN 'cleaning' ELSE 'idle' END, g %% 5 = 0,
+                   now() - g * interval '1 second 17 microseconds'
+            FROM generate_series(1, %s) g""",
+            (user_id, size)
+        )
+    cur.execute(f'ANALYZE {schema}.robots')
+    conn.commit()
+    cur.close()
+
+
+def run(mode: str, user_id: int) -> tuple:
+    """Один запрос в заданном режиме: (тело, CPU, пиковая память Python)"""
+    os.environ['ROBOTS_LIST_MODE'] = mode
+    tracemalloc.start()
+    started = time.process_time()
+    response = index.list_robots(user_id)
+    cpu = time.process_time() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert response['statusCode'] == 200, response['body']
+    return response['body'], cpu, peak
+
+
+def main() -> None:
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit('DATABASE_URL is required')
+    schema = f'bench_list_{os.getpid()}'
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    os.environ['MAIN_DB_SCHEMA'] = schema
+    try:
+        fill_schema(conn, schema)
+        table = []
+        for user_id, size in enumerate(FLEET_SIZES, start=1):
+            python_body = run('python', user_id)[0]
+            db_body = run('db_json', user_id)[0]
+            assert python_body == db_body, f'outputs differ for fleet of {size}'
+            for mode in ('python', 'db_json'):
+                samples = [run(mode, user_id) for _ in range(REPEAT)]
+                cpu = min(sample[1] for sample in samples)
+                peak = max(sample[2] for sample in samples)
+                table.append([size, mode, format_seconds(cpu), f'{peak / 1024:.0f} KiB'])
+        print_table(['robots', 'mode', 'cpu/request', 'peak python memory'], table)
+    finally:
+        conn.rollback()
+        cur = conn.cursor()
+        cur.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
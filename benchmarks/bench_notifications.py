@@ -0,0 +1,153 @@
+"""Уведомления под синтетической нагрузкой парка
+
+FLEET роботов моют и присылают заряд через PUT /{id} функции robots; заряд скачет около
+порога низкого заряда, как у настоящих датчиков, а в конце цикла мойка завершается.
+telegram-bot каждые FLUSH_INTERVAL секунд рассылает созревшие уведомления в поддельный Bot API.
+Итог: сколько событий стало уведомлениями и сообщениями, цена записи и задержка доставки.
+Нужны тестовая БД и pyTelegramBotAPI:
+DATABASE_URL=postgresql://... python benchmarks/bench_notifications.py
+"""
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+from common import ROOT, create_schema, format_seconds, print_table, use_function
+from fake_bot_api import FakeBotApi
+
+use_function('robots')
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+import gateway  # noqa: E402
+import psycopg2  # noqa: E402
+import telebot  # noqa: E402
+import tokens  # noqa: E402
+
+FLEET = 300
+USERS = 100
+DURATION = 20.0
+WINDOW_SECONDS = 3
+FLUSH_INTERVAL = 0.5
+
+TOKENS = {}
+
+
+def prepare(conn, schema: str) -> list:
+    """Пользователи с telegram_id и моющие роботы; возвращает id роботов"""
+    cur = conn.cursor()
+    create_schema(cur, schema)
+    cur.execute(
+        f"""INSERT INTO {schema}.users (id, email, telegram_id)
+        SELECT u, 'user' || u || '@example.com', (100000 + u)::text FROM generate_series(1, %s) u""",
+        (USERS,)
+    )
+    cur.execute(
+        f"""INSERT INTO {schema}.robots (user_id, name, model, has_cleaning, battery_level, status, current_task, is_active)
+        SELECT 1 + g %% %s, 'Robot ' || g, 'VLM-2024', true, 40, 'online', 'cleaning', true
+        FROM generate_series(1, %s) g RETURNING id""",
+        (USERS, FLEET)
+    )
+    robot_ids = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    cur.close()
+    return robot_ids
+
+
+def report(robots, robot_id: int, user_id: int, body: dict) -> float:
+    """PUT /{id} от имени владельца; время обработки"""
+    event = {
+        'httpMethod': 'PUT', 'headers': {'X-Authorization': f'Bearer {TOKENS[user_id]}'},
+        'params': {'path': f'/{robot_id}'}, 'pathParams': {'id': str(robot_id)}, 'body': json.dumps(body),
+    }
+    started = time.perf_counter()
+    response = robots(event, None)
+    assert response['statusCode'] == 200, response['body']
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit('DATABASE_URL is required')
+    os.environ.setdefault('JWT_SECRET', 'bench-secret-' + 'x' * 32)
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:bench')
+    os.environ['RATE_LIMIT_DISABLED'] = '1'
+    os.environ['NOTIFY_WINDOW_SECONDS'] = str(WINDOW_SECONDS)
+    schema = f'bench_notify_{os.getpid()}'
+    os.environ['MAIN_DB_SCHEMA'] = schema
+
+    robots = gateway.load_function('robots', gateway.FUNCTIONS['robots'])
+    bot = gateway.load_function('telegram-bot', gateway.FUNCTIONS['telegram-bot'])
+    TOKENS.update((user_id, tokens.issue_token({'user_id': user_id}, 3600)) for user_id in range(1, USERS + 1))
+    api = FakeBotApi()
+    telebot.apihelper.API_URL = api.start()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    stop = threading.Event()
+    flushes = []
+
+    def flush_loop():
+        flush = {'httpMethod': 'POST', 'queryStringParameters': {'action': 'flush-notifications'}, 'body': '{}'}
+        while not stop.wait(FLUSH_INTERVAL):
+            flushes.append(json.loads(bot(flush, None)['body']))
+
+    try:
+        robot_ids = prepare(conn, schema)
+        levels = dict.fromkeys(robot_ids, 40)
+        rng = random.Random(1)
+        flusher = threading.Thread(target=flush_loop)
+        flusher.start()
+
+        writes, started = [], time.perf_counter()
+        while time.perf_counter() - started < DURATION:
+            for robot_id in robot_ids:
+                user_id = 1 + robot_id % USERS
+                level = levels[robot_id]
+                if level <= 5:
+                    # Мойка закончилась, робот заряжен и начинает следующую.
+                    writes.append(report(robots, robot_id, user_id, {'battery_level': 100, 'current_task': 'idle'}))
+                    level = 40
+                    body = {'battery_level': level, 'current_task': 'cleaning'}
+                else:
+                    level = max(level - rng.choice((0, 1, 2)) + rng.choice((0, 0, 2)), 0)
+                    body = {'battery_level': level}
+                levels[robot_id] = level
+                writes.append(report(robots, robot_id, user_id, body))
+        # Дождаться, пока созреют и уйдут последние окна.
+        time.sleep(WINDOW_SECONDS + 2 * FLUSH_INTERVAL)
+        stop.set()
+        flusher.join()
+
+        cur = conn.cursor()
+        cur.execute(f"""SELECT COUNT(*), COALESCE(SUM(event_count), 0),
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM sent_at - last_event_at)),
+            percentile_cont(0.99) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM sent_at - last_event_at)),
+            percentile_cont(0.99) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM sent_at - first_event_at))
+            FROM {schema}.robot_notifications WHERE sent_at IS NOT NULL""")
+        notifications, events, last_p50, last_p99, first_p99 = cur.fetchone()
+        cur.close()
+        messages = sum(flush['messages'] for flush in flushes)
+
+        print_table(['metric', 'value'], [
+            ['robot reports', len(writes)],
+            ['PUT /{id} median', format_seconds(statistics.median(writes))],
+            ['events', events],
+            ['notifications (coalesced per robot)', notifications],
+            ['Telegram messages (batched per user)', messages],
+            ['flush calls', len(flushes)],
+            ['last event → sent, p50 / p99', f'{format_seconds(last_p50 or 0)} / {format_seconds(last_p99 or 0)}'],
+            ['first event → sent, p99', format_seconds(first_p99 or 0)],
+        ])
+    finally:
+        stop.set()
+        api.stop()
+        conn.rollback()
+        cur = conn.cursor()
+        cur.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Роботы организаций в масштабе 10k+: листинг по курсору и управление
+
+Листинг: первая и глубокая страница по курсору против OFFSET. Управление: control
+с кешем членства, без кеша (запрос ролей на каждый вызов) и проверка доступа JOIN'ом
+в каждом запросе. Нужна тестовая БД:
+DATABASE_URL=postgresql://... python benchmarks/bench_orgs.py
+"""
+import os
+import sys
+
+from common import create_schema, format_seconds, measure, print_table, use_function
+
+use_function('robots')
+import psycopg2  # noqa: E402
+import index  # noqa: E402
+import membership  # noqa: E402
+import tokens  # noqa: E402
+from queries import sql  # noqa: E402
+
+ORG_SIZES = (10_000, 50_000)
+MEMBERS = 200
+PAGE = 100
+NUMBER = 50
+
+JOIN_ACCESS = """SELECT r.id, r.has_cleaning FROM {schema}.robots r
+LEFT JOIN {schema}.organization_members m ON m.org_id = r.org_id AND m.user_id = %s
+WHERE r.id = %s AND ((r.org_id IS NULL AND r.user_id = %s) OR m.role IN ('owner', 'operator'))"""
+
+OFFSET_PAGE = """SELECT id FROM {schema}.robots
+WHERE org_id = %s AND (archived IS NULL OR archived = false)
+ORDER BY created_at DESC, id DESC
+OFFSET %s LIMIT %s"""
+
+
+def prepare(conn, schema: str) -> None:
+    """Организации с парками ORG_SIZES и MEMBERS операторами в каждой"""
+    cur = conn.cursor()
+    create_schema(cur, schema)
+    for org_id, size in enumerate(ORG_SIZES, start=1):
+        cur.execute(f'INSERT INTO {schema}.organizations (id, name) VALUES (%s, %s)', (org_id, f'Fleet {org_id}'))
+        cur.execute(
+            f"""INSERT INTO {schema}.organization_members (org_id, user_id, role)
+            SELECT %s, u, CASE WHEN u = 1 THEN 'owner' ELSE 'operator' END FROM generate_series(1, %s) u""",
+            (org_id, MEMBERS)
+        )
+        cur.execute(
+            f"""INSERT INTO {schema}.robots
+            (user_id, org_id, name, model, has_cleaning, battery_level, status, current_task, is_active, created_at)
+            SELECT 1 + g %% %s, %s, 'VÖLM Robot #' || g, 'VLM-2024', true, 90, 'online', 'idle', false,
+                   now() - g * interval '1 second'
+            FROM generate_series(1, %s) g""",
+            (MEMBERS, org_id, size)
+        )
+    # Личные роботы пользователей, чтобы таблица не состояла из одной организации.
+    cur.execute(
+        f"""INSERT INTO {schema}.robots (user_id, name, model, has_cleaning, battery_level, status, current_task, is_active)
+        SELECT 1000 + g, 'VÖLM Robot #1', 'VLM-2024', true, 90, 'online', 'idle', false FROM generate_series(1, 20000) g"""
+    )
+    cur.execute(f'ANALYZE {schema}.robots')
+    conn.commit()
+    cur.close()
+
+
+def call(event: dict) -> dict:
+    """Вызов index.handler с проверкой статуса"""
+    response = index.handler(event, None)
+    assert response['statusCode'] == 200, response['body']
+    return response
+
+
+def main() -> None:
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit('DATABASE_URL is required')
+    os.environ.setdefault('JWT_SECRET', 'bench-secret-' + 'x' * 32)
+    os.environ['RATE_LIMIT_DISABLED'] = '1'
+    schema = f'bench_orgs_{os.getpid()}'
+    os.environ['MAIN_DB_SCHEMA'] = schema
+    token = tokens.issue_token({'user_id': 2}, 3600)
+    headers = {'X-Authorization': f'Bearer {token}'}
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        prepare(conn, schema)
+        cur = conn.cursor()
+        table = []
+        for org_id, size in enumerate(ORG_SIZES, start=1):
+            def list_page(cursor=None):
+                params = {'org_id': str(org_id), 'limit': str(PAGE)}
+                if cursor:
+                    params['cursor'] = cursor
+                return call({'httpMethod': 'GET', 'headers': headers, 'params': {'path': ''}, 'queryStringParameters': params})
+
+            first = measure(lambda: list_page(), number=NUMBER)
+
+            depth = size - 2 * PAGE
+            cur.execute(sql(OFFSET_PAGE), (org_id, depth - 1, 1))
+            cur.execute(f'SELECT created_at, id FROM {schema}.robots WHERE id = %s', (cur.fetchone()[0],))
+            created_at, robot_id = cur.fetchone()
+            cursor = index.page_cursor({'created_at': created_at, 'id': robot_id})
+            deep = measure(lambda: list_page(cursor), number=NUMBER)
+            offset = measure(lambda: (cur.execute(sql(OFFSET_PAGE), (org_id, depth, PAGE)), cur.fetchall()), number=NUMBER)
+
+            cur.execute(f'SELECT id FROM {schema}.robots WHERE org_id = %s LIMIT 1', (org_id,))
+            target = str(cur.fetchone()[0])
+            control = {'httpMethod': 'POST', 'headers': headers, 'params': {'path': f'/{target}/control'},
+                       'pathParams': {'id': target}, 'body': '{"action": "stop"}'}
+            cached = measure(lambda: call(control), number=NUMBER)
+            membership._cache = membership.MembershipCache(ttl=0)
+            uncached = measure(lambda: call(control), number=NUMBER)
+            membership._cache = None
+            joined = measure(lambda: (cur.execute(sql(JOIN_ACCESS), (2, target, 2)), cur.fetchall()), number=NUMBER)
+
+            table.append([size, 'list first page', format_seconds(first['median'])])
+            table.append([size, f'list page at {depth} (cursor)', format_seconds(deep['median'])])
+            table.append([size, 'same page via OFFSET (SQL only)', format_seconds(offset['median'])])
+            table.append([size, 'control, cached membership', format_seconds(cached['median'])])
+            table.append([size, 'control, membership per request', format_seconds(uncached['median'])])
+            table.append([size, 'access check via JOIN (SQL only)', format_seconds(joined['median'])])
+
+        cur.execute(f"EXPLAIN {sql(index.LIST_ORG_ROBOTS, after=index.PAGE_AFTER)}", (len(ORG_SIZES), created_at, robot_id, PAGE))
+        plan = '\n'.join(row[0] for row in cur.fetchall())
+        cur.close()
+        print_table(['robots in org', 'operation', 'median'], table)
+        print('\nlist plan:\n' + plan)
+    finally:
+        conn.rollback()
+        cur = conn.cursor()
+        cur.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
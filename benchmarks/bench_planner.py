@@ -0,0 +1,65 @@
+"""Планировщик маршрута: фасады от 10 до 10 000 стёкол
+
+Для каждого размера: разбор и хеш описания, планирование в процессе обработчика,
+планирование через пул процессов (с учётом передачи данных) и попадание в кеш инстанса.
+Запуск: python benchmarks/bench_planner.py
+"""
+import json
+import time
+import tracemalloc
+
+from common import format_seconds, measure, print_table, use_function
+
+use_function('robots')
+import planner  # noqa: E402
+
+SIZES = (10, 100, 1_000, 10_000)
+
+
+def make_facade(panes: int) -> dict:
+    """Сетка стёкол 1.2×1.5 м; у каждого третьего — ручка посередине"""
+    columns = max(int(panes ** 0.5), 1)
+    facade = []
+    for i in range(panes):
+        x, y = (i % columns) * 1.4, (i // columns) * 1.8
+        pane = {'id': f'p{i}', 'x': x, 'y': y, 'width': 1.2, 'height': 1.5}
+        if i % 3 == 0:
+            pane['obstacles'] = [{'x': x + 0.55, 'y': y + 0.6, 'width': 0.1, 'height': 0.3}]
+        facade.append(pane)
+    return {'tool_width': 0.25, 'panes': facade}
+
+
+def main() -> None:
+    print(f"numpy: {'yes' if planner.numpy is not None else 'no'}")
+    table = []
+    for size in SIZES:
+        body = json.dumps(make_facade(size))
+        number = max(1, 1_000 // size)
+
+        parse = measure(lambda: planner.facade_hash(planner.normalize_facade(json.loads(body))), number=number)
+        facade = planner.normalize_facade(json.loads(body))
+        key = planner.facade_hash(facade)
+
+        inline = measure(lambda: planner.plan_json(facade, key), number=number)
+        tracemalloc.start()
+        plan = planner.plan_json(facade, key)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        planner.get_pool().submit(len, '').result()
+        started = time.perf_counter()
+        planner.get_pool().submit(planner.plan_json, facade, key).result()
+        pooled = time.perf_counter() - started
+
+        planner.remember(key, plan)
+        hit = measure(lambda: planner.cached_plan(key), number=10_000)
+
+        table.append([
+            size, format_seconds(parse['best']), format_seconds(inline['best']), format_seconds(pooled),
+            format_seconds(hit['best']), f'{peak / 1024 / 1024:.1f} MiB', f'{len(plan) / 1024:.0f} KiB'
+        ])
+    print_table(['panes', 'parse+hash', 'plan inline', 'plan in pool', 'cache hit', 'peak memory', 'plan size'], table)
+
+
+if __name__ == '__main__':
+    main()
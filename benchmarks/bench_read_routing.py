@@ -0,0 +1,123 @@
+"""Опрос GET /robots: подключение на запрос против пула инстанса и чтений с реплики
+
+Все режимы идут через handler функции robots в процессе. Подключение на запрос —
+DB_POOL_SIZE=0 (поведение до пулов). Смесь опроса и записей (WRITE_EVERY-й запрос —
+PUT /{id}) показывает, какая доля подключений досталась основной БД: после записи чтения
+пользователя DB_STICKY_SECONDS идут на неё. Реплика берётся из BENCH_READ_URL; без неё
+роль реплики играет та же БД, что видно только в распределении подключений. Нужна тестовая БД:
+DATABASE_URL=postgresql://... [BENCH_READ_URL=postgresql://replica/...] python benchmarks/bench_read_routing.py
+"""
+import json
+import os
+import sys
+import time
+
+from common import create_schema, format_seconds, print_table, use_function
+
+use_function('robots')
+import psycopg2  # noqa: E402
+import dbrouter  # noqa: E402
+import index  # noqa: E402
+import tokens  # noqa: E402
+
+USERS = 100
+REQUESTS = 2_000
+WRITE_EVERY = 20
+
+TOKENS = {}
+
+
+def prepare(conn, schema: str) -> None:
+    """USERS пользователей с одним роботом у каждого; id робота равен id владельца"""
+    cur = conn.cursor()
+    create_schema(cur, schema)
+    cur.execute(
+        f"""INSERT INTO {schema}.robots (user_id, name, model, has_cleaning, battery_level, status, current_task, is_active)
+        SELECT g, 'Robot ' || g, 'VLM-2024', true, 80, 'online', 'idle', false FROM generate_series(1, %s) g""",
+        (USERS,)
+    )
+    conn.commit()
+    cur.close()
+
+
+def request(method: str, path: str, user_id: int, body: str = None) -> None:
+    """Вызов handler robots от имени пользователя"""
+    event = {
+        'httpMethod': method,
+        'headers': {'X-Authorization': f'Bearer {TOKENS[user_id]}'},
+        'params': {'path': path}, 'queryStringParameters': {}, 'body': body,
+    }
+    response = index.handler(event, None)
+    assert response['statusCode'] == 200, response['body']
+
+
+def count_connections(router: dbrouter.Router) -> dict:
+    """Считать подключения, выданные основной БД и репликам"""
+    counts = {'primary': 0, 'replica': 0}
+
+    def counted(pool, name):
+        get = pool.get
+
+        def wrapper():
+            counts[name] += 1
+            return get()
+        pool.get = wrapper
+
+    counted(router.primary, 'primary')
+    for replica in router.replicas:
+        counted(replica, 'replica')
+    return counts
+
+
+def run(env: dict, write_every: int = 0) -> list:
+    """REQUESTS запросов по кругу пользователей с переменными env"""
+    for name in ('DB_POOL_SIZE', 'DATABASE_READ_URL'):
+        os.environ.pop(name, None)
+    os.environ.update(env)
+    counts = count_connections(dbrouter.get_router())
+    started = time.perf_counter()
+    for i in range(REQUESTS):
+        user_id = 1 + i % USERS
+        if write_every and i % write_every == write_every - 1:
+            request('PUT', f'/{user_id}', user_id, json.dumps({'name': f'Robot {user_id}.{i}'}))
+        else:
+            request('GET', '/', user_id)
+    elapsed = time.perf_counter() - started
+    total = counts['primary'] + counts['replica']
+    return [format_seconds(elapsed / REQUESTS), f'{REQUESTS / elapsed:,.0f}', counts['primary'],
+            counts['replica'], f"{counts['primary'] / total:.0%}"]
+
+
+def main() -> None:
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit('DATABASE_URL is required')
+    os.environ.setdefault('JWT_SECRET', 'bench-secret-' + 'x' * 32)
+    os.environ['RATE_LIMIT_DISABLED'] = '1'
+    schema = f'bench_read_routing_{os.getpid()}'
+    os.environ['MAIN_DB_SCHEMA'] = schema
+    for user_id in range(1, USERS + 1):
+        TOKENS[user_id] = tokens.issue_token({'user_id': user_id}, 3600)
+    replica = os.environ.get('BENCH_READ_URL') or os.environ['DATABASE_URL']
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        prepare(conn, schema)
+        table = []
+        for name, env, write_every in (
+            ('connect per request', {'DB_POOL_SIZE': '0'}, 0),
+            ('instance pool', {}, 0),
+            ('pool + replica, reads only', {'DATABASE_READ_URL': replica}, 0),
+            (f'pool + replica, 1 write in {WRITE_EVERY}', {'DATABASE_READ_URL': replica}, WRITE_EVERY),
+        ):
+            table.append([name, *run(env, write_every)])
+        print_table(['mode', 'per request', 'requests/s', 'primary conns', 'replica conns', 'primary share'], table)
+    finally:
+        conn.rollback()
+        cur = conn.cursor()
+        cur.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Опрос GET /robots, пока БД недоступна: таймауты с предохранителем и без него
+
+Handler robots ходит в Postgres через tools/fault_proxy.py, запущенный в этом же процессе.
+Фазы по PHASE_SECONDS: БД отвечает, подключения зависают (stall), подключения сбрасываются
+(refuse), снова отвечает. Пул выключен (DB_POOL_SIZE=0), чтобы каждый запрос подключался
+заново. Без предохранителя (BREAKER_FAILURES очень большой) каждый запрос ждёт
+DB_CONNECT_TIMEOUT_SECONDS; с ним после BREAKER_FAILURES сбоев запросы сразу получают 503,
+а после восстановления БД — снова 200 не позже BREAKER_RESET_SECONDS. Нужна тестовая БД:
+DATABASE_URL=postgresql://... python benchmarks/bench_resilience.py
+"""
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlsplit, urlunsplit
+
+from common import ROOT, create_schema, format_seconds, print_table, use_function
+
+use_function('robots')
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+import psycopg2  # noqa: E402
+import dbrouter  # noqa: E402
+import index  # noqa: E402
+import resilience  # noqa: E402
+import tokens  # noqa: E402
+from fault_proxy import start_in_thread  # noqa: E402
+
+PROXY_PORT = 16543
+PHASE_SECONDS = 4
+PHASES = ('pass', 'stall', 'refuse', 'pass')
+CONNECT_TIMEOUT_SECONDS = 1
+RESET_SECONDS = 2
+
+
+def prepare(conn, schema: str) -> None:
+    """Один пользователь с одним роботом"""
+    cur = conn.cursor()
+    create_schema(cur, schema)
+    cur.execute(
+        f"""INSERT INTO {schema}.robots (user_id, name, model, has_cleaning, battery_level, status, current_task, is_active)
+        VALUES (1, 'Robot 1', 'VLM-2024', true, 80, 'online', 'idle', false)"""
+    )
+    conn.commit()
+    cur.close()
+
+
+def proxied_url(url: str) -> tuple:
+    """DATABASE_URL через прокси и адрес настоящего сервера"""
+    parts = urlsplit(url)
+    upstream = (parts.hostname or '127.0.0.1', parts.port or 5432)
+    credentials = parts.netloc.rpartition('@')[0]
+    netloc = f'{credentials}@127.0.0.1:{PROXY_PORT}' if credentials else f'127.0.0.1:{PROXY_PORT}'
+    return urlunsplit(parts._replace(netloc=netloc)), upstream
+
+
+def run(proxy, event: dict, failures: str) -> list:
+    """Все фазы подряд с BREAKER_FAILURES=failures; строка таблицы на фазу"""
+    os.environ['BREAKER_FAILURES'] = failures
+    resilience._breakers.clear()
+    dbrouter._router = None
+    rows = []
+    for mode in PHASES:
+        proxy.switch(mode)
+        statuses, latencies = Counter(), []
+        deadline = time.perf_counter() + PHASE_SECONDS
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            statuses[index.handler(event, None)['statusCode']] += 1
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        rows.append([mode, len(latencies), statuses[200], statuses[503], sum(statuses.values()) - statuses[200] - statuses[503],
+                     format_seconds(statistics.median(latencies)), format_seconds(latencies[int(len(latencies) * 0.99)])])
+    return rows
+
+
+def main() -> None:
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit('DATABASE_URL is required')
+    os.environ.setdefault('JWT_SECRET', 'bench-secret-' + 'x' * 32)
+    os.environ['RATE_LIMIT_DISABLED'] = '1'
+    schema = f'bench_resilience_{os.getpid()}'
+    os.environ['MAIN_DB_SCHEMA'] = schema
+    direct_url = os.environ['DATABASE_URL']
+    url, upstream = proxied_url(direct_url)
+    proxy = start_in_thread(('127.0.0.1', PROXY_PORT), upstream)
+
+    conn = psycopg2.connect(direct_url)
+    try:
+        prepare(conn, schema)
+        os.environ.update(DATABASE_URL=url, DB_POOL_SIZE='0', DB_CONNECT_TIMEOUT_SECONDS=str(CONNECT_TIMEOUT_SECONDS),
+                          BREAKER_RESET_SECONDS=str(RESET_SECONDS))
+        event = {
+            'httpMethod': 'GET',
+            'headers': {'X-Authorization': f"Bearer {tokens.issue_token({'user_id': 1}, 3600)}"},
+            'params': {'path': '/'}, 'queryStringParameters': {}, 'body': None,
+        }
+        table = []
+        for name, failures in (('timeouts only', str(10 ** 9)), ('timeouts + breaker', '5')):
+            table.extend([name, *row] for row in run(proxy, event, failures))
+        print_table(['mode', 'database', 'requests', '200', '503', 'other', 'p50', 'p99'], table)
+    finally:
+        os.environ['DATABASE_URL'] = direct_url
+        conn.rollback()
+        cur = conn.cursor()
+        cur.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Микробенчмарк диспетчеризации robots: цепочка if против таблицы маршрутов
+
+Запуск: python benchmarks/bench_router.py
+"""
+from common import format_seconds, measure, print_table, use_function
+
+use_function('robots')
+from router import Router, request_segments  # noqa: E402
+
+EVENTS = [
+    ('list', {'httpMethod': 'GET', 'params': {'path': ''}, 'pathParams': {}}),
+    ('get', {'httpMethod': 'GET', 'params': {'path': '/42'}, 'pathParams': {'id': '42'}}),
+    ('connect', {'httpMethod': 'POST', 'params': {'path': '/connect'}, 'pathParams': {}}),
+    ('control', {'httpMethod': 'POST', 'params': {'path': '/42/control'}, 'pathParams': {'id': '42'}}),
+    ('delete', {'httpMethod': 'DELETE', 'params': {'path': '/42'}, 'pathParams': {'id': '42'}}),
+    ('miss', {'httpMethod': 'PATCH', 'params': {'path': '/42/unknown'}, 'pathParams': {'id': '42'}}),
+]
+
+
+def if_chain(event: dict):
+    """Прежняя маршрутизация handler"""
+    method = event.get('httpMethod', 'GET')
+    path = event.get('params', {}).get('path', '')
+    robot_id = event.get('pathParams', {}).get('id')
+
+    if method == 'GET' and not robot_id:
+        return 'list'
+    elif method == 'GET' and robot_id:
+        return 'get'
+    elif method == 'POST' and path == '/connect':
+        return 'connect'
+    elif method == 'PUT' and robot_id:
+        return 'update'
+    elif method == 'POST' and path.endswith('/control'):
+        return 'control'
+    elif method == 'DELETE' and robot_id:
+        return 'delete'
+    return None
+
+
+def build_router() -> Router:
+    """Та же таблица, что в index.py, с пустыми обработчиками"""
+    router = Router()
+    for method, pattern in (('GET', '/'), ('GET', '/{id}'), ('POST', '/connect'), ('PUT', '/{id}'),
+                            ('POST', '/{id}/control'), ('DELETE', '/{id}')):
+        router.add(method, pattern, lambda ctx: None)
+    return router
+
+
+def main() -> None:
+    router = build_router()
+    table = []
+    for name, event in EVENTS:
+        old = measure(lambda: if_chain(event), number=100_000)
+        new = measure(lambda: router.match(event['httpMethod'], request_segments(event)), number=100_000)
+        table.append([name, format_seconds(old['best']), format_seconds(new['best'])])
+    print_table(['request', 'if chain', 'route table'], table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Микробенчмарк сериализации списка роботов: ручные словари + json.dumps против serializer
+
+Запуск: python benchmarks/bench_serializer.py
+"""
+import json
+from datetime import datetime, timedelta, timezone
+
+from common import format_seconds, measure, print_table, use_function
+
+use_function('robots')
+import serializer  # noqa: E402
+
+COLUMNS = ('id', 'name', 'model', 'has_cleaning', 'battery_level', 'status',
+           'current_task', 'is_active', 'created_at')
+
+
+class FakeCursor:
+    """Курсор с готовым результатом запроса"""
+
+    def __init__(self, rows: list):
+        self.rows = rows
+        self.description = [(name, None, None, None, None, None, None) for name in COLUMNS]
+
+    def fetchall(self) -> list:
+        return self.rows
+
+
+def make_rows(count: int) -> list:
+    """Синтетические строки таблицы robots"""
+    base = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+    return [
+        (i, f'VÖLM Robot #{i}', 'VLM-2024', True, 100 - i % 100, 'online',
+         'idle', False, base + timedelta(seconds=i, microseconds=i % 7))
+        for i in range(1, count + 1)
+    ]
+
+
+def legacy(rows: list) -> str:
+    """Прежний путь: словарь по индексам, isoformat на каждую строку"""
+    robots = []
+    for row in rows:
+        robots.append({
+            'id': row[0],
+            'name': row[1],
+            'model': row[2],
+            'has_cleaning': row[3],
+            'battery_level': row[4],
+            'status': row[5],
+            'current_task': row[6],
+            'is_active': row[7],
+            'created_at': row[8].isoformat() if row[8] else None
+        })
+    return json.dumps({'robots': robots})
+
+
+def current(rows: list) -> str:
+    """Новый путь: ключи из description один раз на запрос"""
+    return serializer.dumps({'robots': serializer.fetch_all(FakeCursor(rows))})
+
+
+def main() -> None:
+    backend = 'orjson' if serializer.orjson is not None else 'stdlib json'
+    print(f'serializer backend: {backend}\n')
+    table = []
+    for count in (1, 100, 10_000):
+        rows = make_rows(count)
+        assert json.loads(legacy(rows)) == json.loads(current(rows))
+        number = max(1, 20_000 // count)
+        old = measure(lambda: legacy(rows), number=number)
+        new = measure(lambda: current(rows), number=number)
+        table.append([
+            count,
+            format_seconds(old['best']),
+            format_seconds(new['best']),
+            f"{old['best'] / new['best']:.2f}x",
+        ])
+    print_table(['robots', 'legacy', 'serializer', 'speedup'], table)
+
+
+if __name__ == '__main__':
+    main()
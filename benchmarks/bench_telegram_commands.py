@@ -0,0 +1,140 @@
+"""Пропускная способность команд бота: /robots, /status, /start_clean и кнопки управления
+
+Апдейты обрабатываются process_update telegram-bot; Bot API поддельный, функция robots
+работает по-настоящему за локальным шлюзом tools/gateway.py. Сравнивается кеш аккаунтов
+(telegram_id → пользователь → роботы) с поиском в БД на каждое сообщение.
+Нужны тестовая БД и pyTelegramBotAPI:
+DATABASE_URL=postgresql://... python benchmarks/bench_telegram_commands.py
+"""
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+from common import ROOT, create_schema, format_seconds, print_table, use_function
+from fake_bot_api import FakeBotApi
+
+use_function(os.path.join('extensions', 'telegram-bot', 'telegram-bot'))
+import psycopg2  # noqa: E402
+import telebot  # noqa: E402
+import index  # noqa: E402
+
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+import gateway  # noqa: E402
+
+USERS = 200
+ROBOTS_PER_USER = 3
+UPDATES = 2_000
+
+
+def prepare(conn, schema: str) -> None:
+    """Пользователи с telegram_id и их роботы"""
+    cur = conn.cursor()
+    create_schema(cur, schema)
+    cur.execute(
+        f"""INSERT INTO {schema}.users (id, email, telegram_id)
+        SELECT u, 'user' || u || '@example.com', (100000 + u)::text FROM generate_series(1, %s) u""",
+        (USERS,)
+    )
+    cur.execute(
+        f"""INSERT INTO {schema}.robots (user_id, name, model, has_cleaning, battery_level, status, current_task, is_active)
+        SELECT u, 'Robot ' || r, 'VLM-2024', true, 90, 'online', 'idle', false
+        FROM generate_series(1, %s) u, generate_series(1, %s) r""",
+        (USERS, ROBOTS_PER_USER)
+    )
+    conn.commit()
+    cur.close()
+
+
+def start_robots_api() -> str:
+    """Функция robots за локальным шлюзом в фоновом потоке"""
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    handlers = {'robots': gateway.load_function('robots', gateway.FUNCTIONS['robots'])}
+    server = gateway.Gateway(handlers, workers=8, queue=64)
+    threading.Thread(target=lambda: asyncio.run(server.serve('127.0.0.1', port)), daemon=True).start()
+    for _ in range(50):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return f'http://127.0.0.1:{port}/robots'
+
+
+def make_updates(robot_ids: dict, first_id: int) -> list:
+    """Смесь команд и нажатий кнопок от разных пользователей; update_id уникальны, чтобы ключи идемпотентности не повторялись"""
+    updates = []
+    for i in range(first_id, first_id + UPDATES):
+        user = 1 + i % USERS
+        sender = {'id': 100000 + user}
+        kind = i % 4
+        if kind == 3:
+            robot_id = robot_ids[user][i % ROBOTS_PER_USER]
+            action = ('start', 'pause', 'stop')[i % 3]
+            updates.append({'update_id': i, 'callback_query': {
+                'id': f'cb{i}', 'from': sender, 'data': f'ctl:{robot_id}:{action}'
+            }})
+            continue
+        text = ('/robots', '/status Robot 2', '/start_clean Robot 1')[kind]
+        updates.append({'update_id': i, 'message': {
+            'message_id': i, 'text': text, 'from': sender, 'chat': {'id': sender['id'], 'type': 'private'}
+        }})
+    return updates
+
+
+def run(updates: list) -> tuple:
+    """Апдейтов в секунду и медиана обработки одного"""
+    samples = []
+    started = time.perf_counter()
+    for update in updates:
+        begin = time.perf_counter()
+        index.process_update(update)
+        samples.append(time.perf_counter() - begin)
+    return len(updates) / (time.perf_counter() - started), statistics.median(samples)
+
+
+def main() -> None:
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit('DATABASE_URL is required')
+    os.environ.setdefault('JWT_SECRET', 'bench-secret-' + 'x' * 32)
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:bench')
+    os.environ['RATE_LIMIT_DISABLED'] = '1'
+    schema = f'bench_tg_commands_{os.getpid()}'
+    os.environ['MAIN_DB_SCHEMA'] = schema
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    api = FakeBotApi()
+    try:
+        prepare(conn, schema)
+        cur = conn.cursor()
+        cur.execute(f'SELECT user_id, array_agg(id ORDER BY name) FROM {schema}.robots GROUP BY user_id')
+        robot_ids = dict(cur.fetchall())
+        cur.close()
+
+        telebot.apihelper.API_URL = api.start()
+        os.environ['ROBOTS_API_URL'] = start_robots_api()
+        table = []
+        for run_number, (name, ttl) in enumerate((('account cache', 60), ('DB lookup per message', 0))):
+            index._account_cache = index.AccountCache(ttl)
+            updates = make_updates(robot_ids, run_number * 2 * UPDATES)
+            run(make_updates(robot_ids, (run_number * 2 + 1) * UPDATES)[:USERS])
+            api.calls.clear()
+            rate, median = run(updates)
+            table.append([name, f'{rate:,.0f}', format_seconds(median), dict(api.calls)])
+        print_table(['accounts', 'updates/s', 'median per update', 'Bot API calls'], table)
+    finally:
+        api.stop()
+        conn.rollback()
+        cur = conn.cursor()
+        cur.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Время ответа webhook Telegram: обработка до ответа против очереди telegram_updates
+
+Апдейты /start идут через handler telegram-bot к поддельному Bot API с задержкой SEND_DELAY
+на каждый вызов; каждый WEB_AUTH-й — /start web_auth (запись токена в БД и ссылка для входа),
+каждый REDELIVERY-й приходит повторно, как при ретраях Telegram. Ответ webhook не должен
+ждать отправки: медиана и p99 ack в режиме очереди — меньше SEND_DELAY, в том числе для web_auth.
+Очередь пишет апдейт в БД до ответа, поэтому нужна тестовая БД и pyTelegramBotAPI из
+requirements.txt функции:
+DATABASE_URL=postgresql://... python benchmarks/bench_telegram_webhook.py
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+from common import create_schema, format_seconds, print_table, use_function
+from fake_bot_api import FakeBotApi
+
+use_function(os.path.join('extensions', 'telegram-bot', 'telegram-bot'))
+import psycopg2  # noqa: E402
+import telebot  # noqa: E402
+import index  # noqa: E402
+
+UPDATES = 400
+SEND_DELAY = 0.05
+REDELIVERY = 10
+WEB_AUTH = 5
+
+
+def make_events() -> list:
+    """События webhook; часть апдейтов доставлена дважды"""
+    events = []
+    for update_id in range(1, UPDATES + 1):
+        update = {'update_id': update_id, 'message': {
+            'message_id': update_id, 'text': '/start web_auth' if update_id % WEB_AUTH == 0 else '/start',
+            'from': {'id': update_id}, 'chat': {'id': update_id, 'type': 'private'}
+        }}
+        event = {'httpMethod': 'POST', 'headers': {}, 'body': json.dumps(update)}
+        events.append(event)
+        if update_id % REDELIVERY == 0:
+            events.append(event)
+    return events
+
+
+def percentiles(samples: list) -> tuple:
+    """Медиана и p99"""
+    ordered = sorted(samples)
+    return statistics.median(ordered), ordered[int(len(ordered) * 0.99) - 1]
+
+
+def main() -> None:
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit('DATABASE_URL is required')
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:bench')
+    os.environ.pop('TELEGRAM_WEBHOOK_SECRET', None)
+    schema = f'bench_telegram_webhook_{os.getpid()}'
+    os.environ['MAIN_DB_SCHEMA'] = schema
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    create_schema(cur, schema)
+    conn.commit()
+    api = FakeBotApi(delay=SEND_DELAY)
+    telebot.apihelper.API_URL = api.start()
+    events = make_events()
+    table = []
+    try:
+        # Как было: апдейт обрабатывается до ответа, повторы отправляют сообщение ещё раз.
+        inline = []
+        started = time.perf_counter()
+        for event in events:
+            begin = time.perf_counter()
+            index.process_update(json.loads(event['body']))
+            inline.append(time.perf_counter() - begin)
+        inline_total = time.perf_counter() - started
+        inline_sends = api.calls['sendMessage']
+        api.calls.clear()
+
+        queue = index.get_update_queue()
+        acks = []
+        started = time.perf_counter()
+        for event in events:
+            begin = time.perf_counter()
+            assert index.handler(event, None)['statusCode'] == 200
+            acks.append(time.perf_counter() - begin)
+        queue.drain()
+        queued_total = time.perf_counter() - started
+
+        for name, samples, total, sends in (
+            ('inline', inline, inline_total, inline_sends),
+            (f'queue, {queue.executor._max_workers} workers', acks, queued_total, api.calls['sendMessage']),
+        ):
+            median, p99 = percentiles(samples)
+            table.append([name, format_seconds(median), format_seconds(p99), format_seconds(total), sends])
+    finally:
+        api.stop()
+        cur.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        conn.commit()
+        conn.close()
+    print_table(['mode', 'ack median', 'ack p99', f'all {len(events)} done', 'messages sent'], table)
+
+
+if __name__ == '__main__':
+    main()
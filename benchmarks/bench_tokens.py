@@ -0,0 +1,65 @@
+"""Пропускная способность проверки access-токенов на один инстанс
+
+Токены подписаны тремя ключами (ротация JWT_KEYS) и одним старым ключом JWT_SECRET без kid.
+Сравниваются jwt.decode из PyJWT, общий tokens.verify_token на токенах, которых инстанс
+ещё не видел, и повторные проверки тех же токенов (кеш проверенных).
+Запуск: python benchmarks/bench_tokens.py
+"""
+import os
+import time
+
+import jwt
+
+from common import print_table, use_function
+
+use_function('robots')
+import tokens  # noqa: E402
+
+TOKENS = 5_000
+KIDS = ('2026-08', '2026-09', '2026-10')
+
+
+def make_tokens() -> list:
+    """TOKENS токенов, поровну на каждый ключ и на JWT_SECRET"""
+    issued = []
+    now = int(time.time())
+    secrets = [(kid, f'{kid}-secret-' + 'k' * 32) for kid in KIDS] + [(None, os.environ['JWT_SECRET'])]
+    for i in range(TOKENS):
+        kid, secret = secrets[i % len(secrets)]
+        headers = {'kid': kid} if kid else None
+        payload = {'user_id': i, 'iat': now, 'exp': now + 900}
+        issued.append((kid, secret, jwt.encode(payload, secret, algorithm='HS256', headers=headers)))
+    return issued
+
+
+def throughput(fn, items: list) -> float:
+    """Проверок в секунду"""
+    started = time.perf_counter()
+    for item in items:
+        fn(item)
+    return len(items) / (time.perf_counter() - started)
+
+
+def main() -> None:
+    os.environ['JWT_SECRET'] = 'legacy-secret-' + 'x' * 32
+    os.environ['JWT_KEYS'] = ','.join(f'{kid}:{kid}-secret-' + 'k' * 32 for kid in reversed(KIDS))
+    issued = make_tokens()
+    raw = [token for _, _, token in issued]
+
+    pyjwt = throughput(lambda item: jwt.decode(item[2], item[1], algorithms=['HS256']), issued)
+
+    tokens._keyring = None
+    cold = throughput(tokens.verify_token, raw)
+    warm = throughput(tokens.verify_token, raw)
+
+    for (_, _, token), claims in zip(issued, map(tokens.verify_token, raw)):
+        assert claims == jwt.decode(token, issued[claims['user_id']][1], algorithms=['HS256'])
+
+    print_table(['verifier', 'tokens/s', 'µs per token'], [
+        [name, f'{rate:,.0f}', f'{1e6 / rate:.1f}']
+        for name, rate in (('PyJWT jwt.decode', pyjwt), ('verify_token, new tokens', cold), ('verify_token, cached', warm))
+    ])
+
+
+if __name__ == '__main__':
+    main()
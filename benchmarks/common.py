@@ -0,0 +1,64 @@
+"""Общие помощники для микробенчмарков backend-функций"""
+import glob
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, 'backend')
+MIGRATIONS = os.path.join(ROOT, 'db_migrations')
+
+
+def use_function(name: str) -> str:
+    """Добавить каталог функции в sys.path, как это делает рантайм"""
+    path = os.path.join(BACKEND, name)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return path
+
+
+def create_schema(cur, schema: str) -> None:
+    """Временная схема со всеми таблицами из db_migrations"""
+    cur.execute(f'CREATE SCHEMA {schema}')
+    cur.execute(f'SET search_path TO {schema}')
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS, 'V*.sql'))):
+        with open(path, encoding='utf-8') as f:
+            cur.execute(f.read())
+    cur.execute('SET search_path TO DEFAULT')
+
+
+def measure(fn, number: int = 1, repeat: int = 5) -> dict:
+    """Прогнать fn number раз в repeat сериях, вернуть время одного вызова"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - started) / number)
+    return {
+        'best': min(samples),
+        'median': statistics.median(samples),
+    }
+
+
+def format_seconds(value: float) -> str:
+    """Человекочитаемое время"""
+    if value < 1e-3:
+        return f'{value * 1e6:.1f} µs'
+    if value < 1:
+        return f'{value * 1e3:.2f} ms'
+    return f'{value:.2f} s'
+
+
+def print_table(headers: list, rows: list) -> None:
+    """Вывести результаты выровненной таблицей"""
+    widths = [len(h) for h in headers]
+    for row in rows:
+        for i, cell in enumerate(row):
+            widths[i] = max(widths[i], len(str(cell)))
+    line = '  '.join(h.ljust(widths[i]) for i, h in enumerate(headers))
+    print(line)
+    print('-' * len(line))
+    for row in rows:
+        print('  '.join(str(cell).ljust(widths[i]) for i, cell in enumerate(row)))
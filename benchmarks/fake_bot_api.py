@@ -0,0 +1,92 @@
+"""Поддельный Bot API для бенчмарков telegram-bot
+
+HTTP-сервер на localhost отвечает на любой метод бота с заданной задержкой, как медленный
+api.telegram.org, и считает вызовы. telebot направляется на него через apihelper.API_URL,
+функция telegram-bot за tools/gateway.py — через TELEGRAM_API_URL.
+
+Отдельным процессом: python benchmarks/fake_bot_api.py --port 8081 [--delay-ms 50]
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeBotApi:
+    """Сервер Bot API с задержкой delay секунд на ответ"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self, port: int = 0) -> str:
+        """Запустить сервер, вернуть шаблон URL для telebot.apihelper.API_URL"""
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.respond(b'')
+
+            def do_POST(self):
+                self.respond(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+
+            def respond(self, raw: bytes):
+                url = urllib.parse.urlsplit(self.path)
+                method = url.path.rsplit('/', 1)[-1]
+                params = dict(urllib.parse.parse_qsl(url.query))
+                if raw and self.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+                    params.update(urllib.parse.parse_qsl(raw.decode('utf-8')))
+                with api.lock:
+                    api.calls[method] += 1
+                    message_id = sum(api.calls.values())
+                if api.delay:
+                    time.sleep(api.delay)
+                result = True
+                if method.startswith(('send', 'edit')):
+                    result = {
+                        'message_id': message_id,
+                        'date': int(time.time()),
+                        'chat': {'id': int(params.get('chat_id') or 0), 'type': 'private'},
+                        'text': params.get('text', ''),
+                    }
+                body = json.dumps({'ok': True, 'result': result}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self.server.server_port}/bot{{0}}/{{1}}'
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--delay-ms', type=float, default=0, help='latency of every Bot API call')
+    args = parser.parse_args()
+    api = FakeBotApi(args.delay_ms / 1000)
+    print(f'TELEGRAM_API_URL={api.start(args.port)}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        api.stop()
+        print(dict(api.calls))
+
+
+if __name__ == '__main__':
+    main()
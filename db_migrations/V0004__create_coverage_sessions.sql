@@ -0,0 +1,14 @@
+CREATE TABLE IF NOT EXISTS coverage_sessions (
+    id SERIAL PRIMARY KEY,
+    robot_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    pane_id VARCHAR(100),
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    covered_cells INTEGER NOT NULL,
+    encoding VARCHAR(20) NOT NULL,
+    bitmap BYTEA NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_coverage_sessions_robot ON coverage_sessions(robot_id, created_at DESC);
@@ -0,0 +1,6 @@
+CREATE TABLE IF NOT EXISTS facade_plans (
+    facade_hash VARCHAR(64) PRIMARY KEY,
+    pane_count INTEGER NOT NULL,
+    plan TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
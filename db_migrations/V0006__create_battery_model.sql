@@ -0,0 +1,24 @@
+CREATE TABLE IF NOT EXISTS robot_telemetry (
+    id BIGSERIAL PRIMARY KEY,
+    robot_id INTEGER NOT NULL,
+    battery_level INTEGER,
+    current_task VARCHAR(50),
+    recorded_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS battery_states (
+    robot_id INTEGER PRIMARY KEY,
+    last_level INTEGER,
+    last_task VARCHAR(50),
+    last_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    drain_rate DOUBLE PRECISION,
+    samples INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS battery_model_rates (
+    model VARCHAR(50) PRIMARY KEY,
+    drain_rate DOUBLE PRECISION NOT NULL,
+    samples INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_robot_telemetry_robot ON robot_telemetry(robot_id, recorded_at);
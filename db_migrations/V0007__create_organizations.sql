@@ -0,0 +1,24 @@
+CREATE TABLE IF NOT EXISTS organizations (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    robot_limit INTEGER,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS organization_members (
+    org_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    role VARCHAR(20) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (org_id, user_id)
+);
+
+ALTER TABLE robots ADD COLUMN IF NOT EXISTS org_id INTEGER;
+
+CREATE INDEX IF NOT EXISTS idx_organization_members_user ON organization_members(user_id);
+
+CREATE INDEX IF NOT EXISTS idx_robots_org_listing ON robots(org_id, created_at DESC, id DESC)
+WHERE org_id IS NOT NULL AND (archived IS NULL OR archived = false);
+
+CREATE INDEX IF NOT EXISTS idx_robots_user_listing ON robots(user_id, created_at DESC, id DESC)
+WHERE org_id IS NULL AND (archived IS NULL OR archived = false);
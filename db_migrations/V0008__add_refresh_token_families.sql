@@ -0,0 +1,16 @@
+ALTER TABLE refresh_tokens ADD COLUMN IF NOT EXISTS family_id VARCHAR(32);
+ALTER TABLE refresh_tokens ADD COLUMN IF NOT EXISTS rotated_at TIMESTAMP WITH TIME ZONE;
+
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_family_id ON refresh_tokens(family_id);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_expires ON refresh_tokens(expires_at);
+
+CREATE TABLE IF NOT EXISTS revoked_token_families (
+    family_id VARCHAR(32) PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    reason VARCHAR(20) NOT NULL,
+    revoked_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_revoked_token_families_revoked_at ON revoked_token_families(revoked_at);
+CREATE INDEX IF NOT EXISTS idx_revoked_token_families_expires ON revoked_token_families(expires_at);
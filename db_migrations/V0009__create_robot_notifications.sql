@@ -0,0 +1,18 @@
+CREATE TABLE IF NOT EXISTS robot_notifications (
+    id BIGSERIAL PRIMARY KEY,
+    robot_id INTEGER NOT NULL,
+    events TEXT[] NOT NULL,
+    payload JSONB NOT NULL,
+    event_count INTEGER NOT NULL DEFAULT 1,
+    first_event_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_event_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP WITH TIME ZONE,
+    delivered BOOLEAN
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_robot_notifications_pending
+    ON robot_notifications(robot_id) WHERE sent_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_robot_notifications_due
+    ON robot_notifications(first_event_at) WHERE sent_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_robot_notifications_sent
+    ON robot_notifications(sent_at) WHERE sent_at IS NOT NULL;
@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS robot_events (
+    id BIGSERIAL,
+    robot_id INTEGER NOT NULL,
+    actor_id INTEGER,
+    event_type VARCHAR(20) NOT NULL,
+    data JSONB NOT NULL,
+    recorded_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (recorded_at, id)
+) PARTITION BY RANGE (recorded_at);
+
+CREATE TABLE IF NOT EXISTS robot_events_default PARTITION OF robot_events DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_robot_events_robot ON robot_events(robot_id, id);
@@ -0,0 +1,3 @@
+ALTER TABLE robots ADD COLUMN IF NOT EXISTS serial_number VARCHAR(64);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_robots_serial_number ON robots(serial_number);
@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS telegram_updates (
+    update_id BIGINT PRIMARY KEY,
+    payload JSONB NOT NULL,
+    received_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_until TIMESTAMP WITH TIME ZONE,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    processed_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_telegram_updates_pending
+    ON telegram_updates(update_id) WHERE processed_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_telegram_updates_processed
+    ON telegram_updates(processed_at) WHERE processed_at IS NOT NULL;
@@ -11,6 +11,9 @@ import { useState, useCallback, useEffect, useRef } from "react";
 // =============================================================================
 
 const REFRESH_TOKEN_KEY = "telegram_auth_refresh_token";
+/** How long to wait for another tab to store a rotated refresh token (5 s total) */
+const ROTATION_WAIT_ATTEMPTS = 10;
+const ROTATION_WAIT_MS = 500;
 
 export interface User {
   id: number;
@@ -45,7 +48,8 @@ interface UseTelegramAuthReturn {
   login: () => void;
   /** Exchange token for JWT (call from callback page) */
   handleCallback: (token: string) => Promise<boolean>;
-  logout: () => Promise<void>;
+  /** Revoke this session, or every session of the user with { everywhere: true } */
+  logout: (options?: { everywhere?: boolean }) => Promise<void>;
   refreshToken: () => Promise<boolean>;
   getAuthHeader: () => { Authorization: string } | {};
 }
@@ -69,6 +73,18 @@ function clearStoredRefreshToken(): void {
   localStorage.removeItem(REFRESH_TOKEN_KEY);
 }
 
+/** Poll storage until another tab replaces `previous` with its rotated token. */
+async function waitForRotatedRefreshToken(previous: string): Promise<string | null> {
+  for (let attempt = 0; attempt < ROTATION_WAIT_ATTEMPTS; attempt++) {
+    await new Promise((resolve) => setTimeout(resolve, ROTATION_WAIT_MS));
+    const current = getStoredRefreshToken();
+    if (current && current !== previous) {
+      return current;
+    }
+  }
+  return null;
+}
+
 // =============================================================================
 // HOOK
 // =============================================================================
@@ -110,7 +126,9 @@ export function useTelegramAuth(options: UseTelegramAuthOptions): UseTelegramAut
 
       refreshTimerRef.current = setTimeout(async () => {
         const success = await refreshFn();
-        if (!success) {
+        // A failed refresh clears the session itself; only a stored token that
+        // disappeared (logout in another tab) is left to clean up here
+        if (!success && !getStoredRefreshToken()) {
           clearAuth();
         }
       }, refreshIn);
@@ -131,12 +149,23 @@ export function useTelegramAuth(options: UseTelegramAuthOptions): UseTelegramAut
         body: JSON.stringify({ refresh_token: storedRefreshToken }),
       });
 
+      // Another tab rotated the token a moment ago: wait for the one it stores
+      // and retry with it. The session is kept, the old token is not reused.
+      if (response.status === 409) {
+        const rotatedToken = await waitForRotatedRefreshToken(storedRefreshToken);
+        if (rotatedToken) {
+          return refreshTokenFn();
+        }
+        return false;
+      }
+
       if (!response.ok) {
         clearAuth();
         return false;
       }
 
       const data = await response.json();
+      setStoredRefreshToken(data.refresh_token);
       setAccessToken(data.access_token);
       setUser(data.user);
       scheduleRefresh(data.expires_in, refreshTokenFn);
@@ -218,14 +247,17 @@ export function useTelegramAuth(options: UseTelegramAuthOptions): UseTelegramAut
   /**
    * Logout user
    */
-  const logout = useCallback(async () => {
+  const logout = useCallback(async (options?: { everywhere?: boolean }) => {
     const storedRefreshToken = getStoredRefreshToken();
 
     try {
       await fetch(apiUrls.logout, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ refresh_token: storedRefreshToken || "" }),
+        body: JSON.stringify({
+          refresh_token: storedRefreshToken || "",
+          all: !!options?.everywhere,
+        }),
       });
     } catch {
       // Ignore errors
@@ -1,5 +1,8 @@
 const API_BASE = 'https://functions.poehali.dev';
 
+// Used when the robots function sends no X-Poll-Interval hint
+export const DEFAULT_POLL_MS = 30000;
+
 export interface User {
   id: number;
   email: string;
@@ -18,14 +21,42 @@ export interface Robot {
   is_active: boolean;
 }
 
+export interface RobotsPoll {
+  robots: Robot[];
+  // When to poll again, from the X-Poll-Interval response header
+  nextPollMs: number;
+}
+
+export class ApiError extends Error {
+  status: number;
+  // Seconds from the Retry-After header of 429/503 responses, if any
+  retryAfter: number | null;
+
+  constructor(message: string, status: number, retryAfter: number | null) {
+    super(message);
+    this.status = status;
+    this.retryAfter = retryAfter;
+  }
+}
+
+const headerSeconds = (response: Response, name: string): number | null => {
+  const seconds = Number(response.headers.get(name));
+  return response.headers.has(name) && Number.isFinite(seconds) && seconds > 0 ? seconds : null;
+};
+
+// After a write the backend returns X-Read-Primary-Until (Unix ms); sending it back with
+// reads until then keeps them on the primary database, whichever instance serves them
+const READ_PRIMARY_HEADER = 'X-Read-Primary-Until';
+
 class ApiClient {
   private token: string | null = null;
+  private readPrimaryUntil: string | null = null;
 
   constructor() {
     this.token = localStorage.getItem('auth_token');
   }
 
-  private async request(endpoint: string, options: RequestInit = {}) {
+  private async send(endpoint: string, options: RequestInit = {}): Promise<Response> {
     const headers: HeadersInit = {
       'Content-Type': 'application/json',
       ...(options.headers || {}),
@@ -35,16 +66,29 @@ class ApiClient {
       headers['Authorization'] = `Bearer ${this.token}`;
     }
 
+    if (this.readPrimaryUntil && Number(this.readPrimaryUntil) > Date.now()) {
+      headers[READ_PRIMARY_HEADER] = this.readPrimaryUntil;
+    }
+
     const response = await fetch(`${API_BASE}${endpoint}`, {
       ...options,
       headers,
     });
 
+    if (response.headers.has(READ_PRIMARY_HEADER)) {
+      this.readPrimaryUntil = response.headers.get(READ_PRIMARY_HEADER);
+    }
+
     if (!response.ok) {
       const error = await response.json().catch(() => ({ error: 'Unknown error' }));
-      throw new Error(error.error || `HTTP ${response.status}`);
+      throw new ApiError(error.error || `HTTP ${response.status}`, response.status, headerSeconds(response, 'Retry-After'));
     }
 
+    return response;
+  }
+
+  private async request(endpoint: string, options: RequestInit = {}) {
+    const response = await this.send(endpoint, options);
     return response.json();
   }
 
@@ -81,8 +125,14 @@ class ApiClient {
   }
 
   async getRobots(): Promise<Robot[]> {
-    const result = await this.request('/robots');
-    return result.robots;
+    return (await this.pollRobots()).robots;
+  }
+
+  async pollRobots(): Promise<RobotsPoll> {
+    const response = await this.send('/robots');
+    const result = await response.json();
+    const interval = headerSeconds(response, 'X-Poll-Interval');
+    return { robots: result.robots, nextPollMs: interval ? interval * 1000 : DEFAULT_POLL_MS };
   }
 
   async connectRobot(data: { name?: string; has_cleaning: boolean }): Promise<Robot> {
@@ -7,7 +7,7 @@ import { Label } from '@/components/ui/label';
 import { Progress } from '@/components/ui/progress';
 import { Separator } from '@/components/ui/separator';
 import { toast } from 'sonner';
-import { api, Robot } from '@/lib/api';
+import { api, ApiError, DEFAULT_POLL_MS, Robot } from '@/lib/api';
 import RobotCard from '@/components/RobotCard';
 
 type View = 'login' | 'register' | 'home' | 'robots' | 'schedule' | 'settings';
@@ -23,6 +23,8 @@ export default function Index() {
   const [lastName, setLastName] = useState('');
   const [birthDate, setBirthDate] = useState('');
   const [hasCleaning, setHasCleaning] = useState(true);
+  // A new object after every load re-arms the poll timer, even when the interval is unchanged
+  const [nextPoll, setNextPoll] = useState<{ ms: number } | null>(null);
 
   useEffect(() => {
     const token = localStorage.getItem('auth_token');
@@ -34,13 +36,23 @@ export default function Index() {
 
   const loadRobots = async () => {
     try {
-      const robotsList = await api.getRobots();
+      const { robots: robotsList, nextPollMs } = await api.pollRobots();
       setRobots(robotsList);
+      setNextPoll({ ms: nextPollMs });
     } catch (error) {
       console.error('Failed to load robots:', error);
+      const retryAfter = error instanceof ApiError ? error.retryAfter : null;
+      setNextPoll({ ms: retryAfter ? retryAfter * 1000 : DEFAULT_POLL_MS });
     }
   };
 
+  // Poll as often as the robots API suggests: seconds while a robot is cleaning, a minute when all are idle
+  useEffect(() => {
+    if (!nextPoll || (view !== 'home' && view !== 'robots')) return;
+    const timer = setTimeout(loadRobots, nextPoll.ms);
+    return () => clearTimeout(timer);
+  }, [nextPoll, view]);
+
   const handleLogin = async (e: React.FormEvent) => {
     e.preventDefault();
     setLoading(true);
@@ -0,0 +1,139 @@
+"""Пересчёт оценок разряда батареи по всей истории robot_telemetry
+
+Правила те же, что у онлайн-обновления в backend/robots/battery.py, но считается весь
+парк разом на numpy: интервалы мойки с падением заряда дают замеры скорости, а итог
+пошагового EWMA по роботу и по модели получается одной взвешенной суммой на группу.
+Замеры, пришедшие во время пересчёта, перезаписываются его результатом.
+
+Запуск: DATABASE_URL=... MAIN_DB_SCHEMA=... python tools/battery_refit.py [--dry-run]
+"""
+import argparse
+import os
+import sys
+
+import numpy
+import psycopg2
+from psycopg2.extras import execute_values
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend', 'robots'))
+import battery  # noqa: E402
+
+FETCH_SIZE = 50_000
+
+LOAD_TELEMETRY = """SELECT t.robot_id, COALESCE(t.battery_level, -1), t.current_task = 'cleaning',
+EXTRACT(EPOCH FROM t.recorded_at)::float8, r.model
+FROM {schema}.robot_telemetry t
+JOIN {schema}.robots r ON r.id = t.robot_id
+ORDER BY t.robot_id, t.recorded_at, t.id"""
+
+UPDATE_STATES = """UPDATE {schema}.battery_states s
+SET drain_rate = v.drain_rate, samples = v.samples
+FROM (VALUES %s) AS v (robot_id, drain_rate, samples)
+WHERE s.robot_id = v.robot_id"""
+
+UPSERT_MODEL_RATES = """INSERT INTO {schema}.battery_model_rates (model, drain_rate, samples)
+VALUES %s
+ON CONFLICT (model) DO UPDATE
+SET drain_rate = EXCLUDED.drain_rate, samples = EXCLUDED.samples"""
+
+
+def load(conn, schema: str) -> dict:
+    """Телеметрия парка колонками numpy; модели закодированы номерами"""
+    robots, levels, cleaning, times, models = [], [], [], [], []
+    codes = {}
+    with conn.cursor(name='battery_refit') as cur:
+        cur.itersize = FETCH_SIZE
+        cur.execute(LOAD_TELEMETRY.format(schema=schema))
+        for robot_id, level, is_cleaning, at, model in cur:
+            robots.append(robot_id)
+            levels.append(level)
+            cleaning.append(bool(is_cleaning))
+            times.append(at)
+            models.append(codes.setdefault(model, len(codes)) if model else -1)
+    return {
+        'robot': numpy.array(robots, dtype=numpy.int64),
+        'level': numpy.array(levels, dtype=numpy.float64),
+        'cleaning': numpy.array(cleaning, dtype=bool),
+        'at': numpy.array(times, dtype=numpy.float64),
+        'model': numpy.array(models, dtype=numpy.int64),
+        'model_names': {code: name for name, code in codes.items()},
+    }
+
+
+def drain_samples(telemetry: dict) -> dict:
+    """Замеры скорости разряда (%/ч) между соседними записями одного робота"""
+    robot, level, at = telemetry['robot'], telemetry['level'], telemetry['at']
+    hours = (at[1:] - at[:-1]) / 3600
+    drop = level[:-1] - level[1:]
+    valid = (
+        (robot[1:] == robot[:-1]) & telemetry['cleaning'][:-1]
+        & (level[:-1] >= 0) & (level[1:] >= 0) & (drop > 0)
+        & (hours >= battery.MIN_SAMPLE_HOURS) & (hours <= battery.MAX_SAMPLE_HOURS)
+    )
+    return {
+        'robot': robot[1:][valid],
+        'model': telemetry['model'][1:][valid],
+        'at': at[1:][valid],
+        'rate': drop[valid] / hours[valid],
+    }
+
+
+def ewma_by_group(groups, values) -> tuple:
+    """Итог пошагового EWMA для каждой группы; values упорядочены по группе и времени"""
+    starts = numpy.flatnonzero(numpy.r_[True, groups[1:] != groups[:-1]])
+    counts = numpy.diff(numpy.r_[starts, len(groups)])
+    from_end = numpy.repeat(starts + counts - 1, counts) - numpy.arange(len(groups))
+    weights = battery.ALPHA * (1 - battery.ALPHA) ** from_end
+    # Первая оценка группы — сам замер, дальше его вес только затухает.
+    weights[starts] = (1 - battery.ALPHA) ** (counts - 1)
+    return groups[starts], numpy.add.reduceat(weights * values, starts), counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--dry-run', action='store_true', help='print the fit without writing it')
+    args = parser.parse_args()
+
+    schema = os.environ.get('MAIN_DB_SCHEMA')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        telemetry = load(conn, schema)
+        samples = drain_samples(telemetry)
+        print(f"{len(telemetry['robot'])} telemetry rows, {len(samples['rate'])} drain samples")
+
+        if len(samples['rate']):
+            robot_ids, robot_rates, robot_counts = ewma_by_group(samples['robot'], samples['rate'])
+            order = numpy.lexsort((samples['at'], samples['model']))
+            known = samples['model'][order] >= 0
+            model_codes, model_rates, model_counts = ewma_by_group(
+                samples['model'][order][known], samples['rate'][order][known]
+            )
+        else:
+            robot_ids = model_codes = numpy.array([], dtype=numpy.int64)
+            robot_rates = model_rates = numpy.array([])
+            robot_counts = model_counts = numpy.array([], dtype=numpy.int64)
+
+        fitted = dict(zip(robot_ids.tolist(), zip(robot_rates.tolist(), robot_counts.tolist())))
+        states = [(robot_id, *fitted.get(robot_id, (None, 0))) for robot_id in numpy.unique(telemetry['robot']).tolist()]
+        names = telemetry['model_names']
+        rates = [(names[code], rate, count) for code, rate, count in zip(model_codes.tolist(), model_rates.tolist(), model_counts.tolist())]
+
+        for model, rate, count in rates:
+            print(f'{model}: {rate:.2f} %/h over {count} samples')
+        if args.dry_run:
+            return
+
+        cur = conn.cursor()
+        execute_values(cur, UPDATE_STATES.format(schema=schema), states, template='(%s::integer, %s::float8, %s::integer)')
+        if rates:
+            execute_values(cur, UPSERT_MODEL_RATES.format(schema=schema), rates)
+        conn.commit()
+        cur.close()
+        print(f'updated {len(states)} robots, {len(rates)} models')
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Выгрузка роботов или телеметрии пользователя в NDJSON/CSV из командной строки
+
+Тот же поток, что у GET /export функции robots (backend/robots/export.py): серверный курсор,
+fetchmany пачками и запись по кускам, поэтому память не растёт с размером выгрузки.
+Доступ как у API: личные роботы пользователя и роботы его организаций.
+
+Запуск: DATABASE_URL=... MAIN_DB_SCHEMA=... python tools/fleet_export.py telemetry --user-id 42 --format csv --gzip -o telemetry.csv.gz
+"""
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend', 'robots'))
+import export  # noqa: E402
+import membership  # noqa: E402
+from queries import sql  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('dataset', choices=sorted(export.DATASETS))
+    parser.add_argument('--user-id', type=int, required=True, help='export what this user can read')
+    parser.add_argument('--format', choices=sorted(export.CONTENT_TYPES), default='ndjson')
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--robot-id', help='only this robot')
+    parser.add_argument('--since', help='telemetry from this ISO 8601 timestamp')
+    parser.add_argument('--until', help='telemetry before this ISO 8601 timestamp')
+    parser.add_argument('-o', '--output', default='-', help='file to write, - for stdout')
+    args = parser.parse_args()
+
+    try:
+        request = export.parse_params({
+            'dataset': args.dataset, 'format': args.format, 'gzip': '1' if args.gzip else '',
+            'robot_id': args.robot_id, 'since': args.since, 'until': args.until,
+        })
+    except ValueError as e:
+        parser.error(str(e))
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    cur.execute(sql(membership.FIND_MEMBERSHIPS), (args.user_id,))
+    scope = (args.user_id, membership.org_ids(dict(cur.fetchall()), membership.READ_ROLES))
+    cur.close()
+
+    query, filters, values = export.build_query(request)
+    chunks = export.open_stream(conn, sql(query, filters=filters), (*scope, *values), request['format'], request['gzip'])
+    started = time.perf_counter()
+    size = 0
+    output = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+            size += len(chunk)
+    finally:
+        chunks.close()
+        if output is not sys.stdout.buffer:
+            output.close()
+    print(f'{size:,} bytes in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,440 @@
+"""Синтетический парк роботов: нагрузка на функции robots и telegram-bot через tools/gateway.py
+
+Один asyncio-процесс изображает --robots роботов и их владельцев:
+  report   робот раз в --report-seconds шлёт PUT /robots/{id} с зарядом (моет — разряжается,
+           стоит на базе — заряжается) и берёт current_task из ответа (автопауза сервера);
+  poll     --online-users владельцев раз в --poll-seconds опрашивают GET /robots/;
+  control  --command-rate команд в секунду в пропорциях --command-mix; доля --telegram-share
+           приходит нажатием кнопки ctl:<id>:<action> в webhook telegram-bot, остальные —
+           POST /robots/{id}/control с Idempotency-Key.
+Нагрузка открытая: запросы уходят по расписанию, а задержка клиента считается от момента,
+когда запрос должен был уйти, поэтому ожидание свободного соединения в неё входит. Сверх
+--connections * 100 ожидающих запросов новые пропускаются (skipped) — сервер не успевает.
+Серверные задержки — из Server-Timing ответов: handler от шлюза, app у robots, ack у webhook.
+
+Пользователи, роботы и привязка к Telegram создаются --setup (email fleet-sim-*, удаляются
+--cleanup). Шлюз запускается отдельно с теми же JWT_SECRET/JWT_KEYS и MAIN_DB_SCHEMA;
+для webhook — с ROBOTS_API_URL на шлюз и TELEGRAM_API_URL на benchmarks/fake_bot_api.py.
+
+Запуск: DATABASE_URL=... MAIN_DB_SCHEMA=public JWT_SECRET=... python tools/fleet_simulator.py --setup --robots 100000 --duration 300
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+import psycopg2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend', 'core'))
+import tokens  # noqa: E402
+
+EMAIL_PATTERN = 'fleet-sim-%@example.com'
+TELEGRAM_ID_BASE = 900_000_000
+ROBOTS_PER_USER = 2
+TOKEN_TTL_SECONDS = 24 * 3600
+MAX_HEADER_BYTES = 64 * 1024
+BACKLOG_PER_CONNECTION = 100
+DRAIN_PER_MINUTE = 1.5
+CHARGE_PER_MINUTE = 3.0
+
+
+def schema_prefix() -> str:
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+    return f'{schema}.' if schema else ''
+
+
+def setup(conn, robots: int) -> None:
+    """Пересоздать пользователей fleet-sim-* по ROBOTS_PER_USER робота с telegram_id"""
+    schema = schema_prefix()
+    cleanup(conn)
+    cur = conn.cursor()
+    users = -(-robots // ROBOTS_PER_USER)
+    cur.execute(
+        f"""INSERT INTO {schema}users (email, first_name, telegram_id)
+        SELECT 'fleet-sim-' || n || '@example.com', 'Sim ' || n, (%s + n)::text FROM generate_series(1, %s) n""",
+        (TELEGRAM_ID_BASE, users)
+    )
+    cur.execute(
+        f"""INSERT INTO {schema}robots (user_id, name, model, has_cleaning, battery_level, status, current_task, is_active)
+        SELECT u.id, 'Sim robot ' || r, 'VLM-2024', true, 50 + (random() * 50)::int, 'online', 'idle', false
+        FROM {schema}users u, generate_series(1, %s) r
+        WHERE u.email LIKE %s""",
+        (ROBOTS_PER_USER, EMAIL_PATTERN)
+    )
+    conn.commit()
+    cur.close()
+    print(f'created {users:,} users and {users * ROBOTS_PER_USER:,} robots')
+
+
+ROBOT_TABLES = ('robot_telemetry', 'battery_states', 'robot_events', 'robot_notifications', 'coverage_sessions')
+
+
+def cleanup(conn) -> None:
+    """Удалить пользователей fleet-sim-*, их роботов и всё, что симуляция за ними записала"""
+    schema = schema_prefix()
+    cur = conn.cursor()
+    cur.execute(f'SELECT id FROM {schema}users WHERE email LIKE %s', (EMAIL_PATTERN,))
+    user_ids = [row[0] for row in cur.fetchall()]
+    cur.execute(f'SELECT id FROM {schema}robots WHERE user_id = ANY(%s)', (user_ids,))
+    robot_ids = [row[0] for row in cur.fetchall()]
+    for table in ROBOT_TABLES:
+        cur.execute(f'DELETE FROM {schema}{table} WHERE robot_id = ANY(%s)', (robot_ids,))
+    cur.execute(f'DELETE FROM {schema}idempotency_keys WHERE user_id = ANY(%s)', (user_ids,))
+    cur.execute(f'DELETE FROM {schema}robots WHERE id = ANY(%s)', (robot_ids,))
+    cur.execute(f'DELETE FROM {schema}users WHERE id = ANY(%s)', (user_ids,))
+    conn.commit()
+    cur.close()
+
+
+class Robot:
+    __slots__ = ('id', 'user', 'battery', 'task', 'reported_at')
+
+    def __init__(self, robot_id: int, user: 'User', battery: int, task: str):
+        self.id = robot_id
+        self.user = user
+        self.battery = float(battery or 0)
+        self.task = task or 'idle'
+        self.reported_at = time.monotonic()
+
+    def report(self) -> dict:
+        """Заряд к моменту отчёта: моющий робот разряжается, остальные заряжаются на базе"""
+        now = time.monotonic()
+        minutes = (now - self.reported_at) / 60
+        self.reported_at = now
+        if self.task == 'cleaning':
+            self.battery = max(0.0, self.battery - DRAIN_PER_MINUTE * minutes)
+        else:
+            self.battery = min(100.0, self.battery + CHARGE_PER_MINUTE * minutes)
+        return {'battery_level': round(self.battery), 'status': 'online'}
+
+
+class User:
+    __slots__ = ('id', 'telegram_id', 'robots', 'authorization')
+
+    def __init__(self, user_id: int, telegram_id: str):
+        self.id = user_id
+        self.telegram_id = int(telegram_id)
+        self.robots = []
+        # Токены выпускаются до старта: подпись на лету съедала бы цикл событий в первые секунды
+        self.authorization = f"Bearer {tokens.issue_token({'user_id': user_id}, TOKEN_TTL_SECONDS)}"
+
+
+def load_fleet(conn, limit: int) -> list:
+    """Роботы fleet-sim-* с владельцами, не больше limit"""
+    schema = schema_prefix()
+    cur = conn.cursor()
+    cur.execute(
+        f"""SELECT r.id, r.battery_level, r.current_task, u.id, u.telegram_id
+        FROM {schema}robots r JOIN {schema}users u ON u.id = r.user_id
+        WHERE u.email LIKE %s ORDER BY r.id LIMIT %s""",
+        (EMAIL_PATTERN, limit)
+    )
+    users, robots = {}, []
+    for robot_id, battery, task, user_id, telegram_id in cur:
+        user = users.get(user_id) or users.setdefault(user_id, User(user_id, telegram_id))
+        robot = Robot(robot_id, user, battery, task)
+        user.robots.append(robot)
+        robots.append(robot)
+    cur.close()
+    return robots
+
+
+class HttpClient:
+    """HTTP/1.1 с keep-alive, не больше size соединений к одному хосту"""
+
+    def __init__(self, url: str, size: int, timeout: float):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.slots = asyncio.Queue()
+        for _ in range(size):
+            self.slots.put_nowait(None)
+
+    async def request(self, method: str, path: str, headers: dict, body: bytes = b'') -> tuple:
+        """(статус, заголовки в нижнем регистре, тело)"""
+        connection = await self.slots.get()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(self.host, self.port, limit=MAX_HEADER_BYTES)
+            status, response_headers, payload = await asyncio.wait_for(
+                self.exchange(connection, method, path, headers, body), self.timeout)
+            if response_headers.get('connection', '').lower() == 'close':
+                connection[1].close()
+                connection = None
+            return status, response_headers, payload
+        except BaseException:
+            if connection is not None:
+                connection[1].close()
+                connection = None
+            raise
+        finally:
+            self.slots.put_nowait(connection)
+
+    async def exchange(self, connection, method: str, path: str, headers: dict, body: bytes) -> tuple:
+        reader, writer = connection
+        lines = [f'{method} {self.prefix}{path} HTTP/1.1', f'Host: {self.host}:{self.port}', f'Content-Length: {len(body)}']
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        head = await reader.readuntil(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        status = int(status_line.split(' ', 2)[1])
+        response_headers = {}
+        for line in header_lines:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                response_headers[name.strip().lower()] = value.strip()
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                chunk = await reader.readexactly(size + 2)
+                if not size:
+                    break
+                chunks.append(chunk[:-2])
+            payload = b''.join(chunks)
+        else:
+            payload = await reader.readexactly(int(response_headers.get('content-length') or 0))
+        return status, response_headers, payload
+
+
+def server_timings(header: str) -> dict:
+    """'app;dur=1.2, handler;dur=3.4' → {'app': 1.2, 'handler': 3.4} в мс"""
+    timings = {}
+    for entry in header.split(','):
+        name, *params = entry.strip().split(';')
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'dur':
+                timings[name] = float(value)
+    return timings
+
+
+class Stats:
+    """Задержки и статусы по видам запросов"""
+
+    def __init__(self):
+        self.client = defaultdict(list)
+        self.server = defaultdict(lambda: defaultdict(list))
+        self.statuses = defaultdict(Counter)
+        self.skipped = Counter()
+
+    def record(self, kind: str, latency: float, status, timings: dict) -> None:
+        self.client[kind].append(latency)
+        self.statuses[kind][status] += 1
+        for name, duration in timings.items():
+            self.server[kind][name].append(duration)
+
+    def sent(self) -> int:
+        return sum(sum(counter.values()) for counter in self.statuses.values())
+
+    def table(self) -> tuple:
+        metrics = sorted({name for by_name in self.server.values() for name in by_name})
+        headers = ['request', 'sent', 'ok', 'errors', 'skipped', 'client p50', 'p95', 'p99']
+        headers += [f'{name} {q}' for name in metrics for q in ('p50', 'p99')]
+        rows = []
+        for kind in sorted(set(self.client) | set(self.skipped)):
+            statuses = self.statuses[kind]
+            ok = sum(count for status, count in statuses.items() if isinstance(status, int) and status < 400)
+            errors = ' '.join(f'{status}×{count}' for status, count in sorted(statuses.items(), key=str)
+                              if not (isinstance(status, int) and status < 400))
+            row = [kind, sum(statuses.values()), ok, errors or '-', self.skipped[kind]]
+            row += [format_ms(percentile(self.client[kind], q) * 1000) for q in (0.5, 0.95, 0.99)]
+            for name in metrics:
+                samples = self.server[kind].get(name)
+                row += [format_ms(percentile(samples, q)) if samples else '' for q in (0.5, 0.99)]
+            rows.append(row)
+        return headers, rows
+
+
+def percentile(samples: list, q: float) -> float:
+    if not samples:
+        return float('nan')
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[min(98, max(0, round(q * 100) - 1))]
+
+
+def format_ms(value: float) -> str:
+    return '' if value != value else f'{value:.1f} ms'
+
+
+def print_table(headers: list, rows: list) -> None:
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    print('  '.join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print('  '.join(str(cell).ljust(w) for cell, w in zip(row, widths)))
+
+
+class Simulator:
+    """Генераторы нагрузки по расписанию поверх одного пула соединений"""
+
+    def __init__(self, args, robots: list):
+        self.args = args
+        self.robots = robots
+        self.users = list({robot.user.id: robot.user for robot in robots}.values())
+        self.client = HttpClient(args.url, args.connections, args.timeout)
+        self.stats = Stats()
+        self.pending = 0
+        self.max_pending = args.connections * BACKLOG_PER_CONNECTION
+        self.update_ids = itertools.count(int(time.time() * 1000))
+        self.actions, self.weights = zip(*args.command_mix.items())
+        self.webhook_headers = {'Content-Type': 'application/json'}
+        if args.webhook_secret:
+            self.webhook_headers['X-Telegram-Bot-Api-Secret-Token'] = args.webhook_secret
+
+    async def run(self) -> None:
+        random.shuffle(self.robots)
+        online = self.users[:max(1, int(len(self.users) * self.args.online_users))]
+        generators = [
+            self.drive('report', len(self.robots) / self.args.report_seconds, itertools.cycle(self.robots), self.report),
+            self.drive('poll', len(online) / self.args.poll_seconds, itertools.cycle(online), self.poll),
+        ]
+        if self.args.command_rate:
+            generators.append(self.drive('control', self.args.command_rate, None, self.control))
+        tasks = [asyncio.create_task(generator) for generator in generators]
+        progress = asyncio.create_task(self.progress())
+        await asyncio.sleep(self.args.duration)
+        for task in tasks + [progress]:
+            task.cancel()
+        while self.pending:
+            await asyncio.sleep(0.05)
+
+    async def drive(self, kind: str, rate: float, items, send) -> None:
+        """Запускать send с частотой rate в секунду, не дожидаясь ответов"""
+        loop = asyncio.get_running_loop()
+        interval = 1 / rate
+        # Разнести старт генераторов, чтобы все роботы не отчитались в первую секунду разом
+        scheduled = loop.time() + random.random() * interval
+        while True:
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.pending >= self.max_pending:
+                self.stats.skipped[kind] += 1
+            else:
+                self.pending += 1
+                asyncio.create_task(self.timed(kind, scheduled, send(next(items) if items else None)))
+            scheduled += interval
+
+    async def timed(self, kind: str, scheduled: float, call) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            status, headers = await call
+        except asyncio.TimeoutError:
+            status, headers = 'timeout', {}
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+            status, headers = type(e).__name__, {}
+        finally:
+            self.pending -= 1
+        self.stats.record(kind, loop.time() - scheduled, status, server_timings(headers.get('server-timing', '')))
+
+    def auth(self, user: User, **extra) -> dict:
+        return {'Authorization': user.authorization, **extra}
+
+    async def report(self, robot: Robot) -> tuple:
+        body = json.dumps(robot.report()).encode('utf-8')
+        status, headers, payload = await self.client.request(
+            'PUT', f'/robots/{robot.id}', self.auth(robot.user, **{'Content-Type': 'application/json'}), body)
+        if status == 200:
+            robot.task = json.loads(payload).get('current_task') or robot.task
+        return status, headers
+
+    async def poll(self, user: User) -> tuple:
+        status, headers, _ = await self.client.request('GET', '/robots/', self.auth(user))
+        return status, headers
+
+    async def control(self, _) -> tuple:
+        robot = random.choice(self.robots)
+        action = random.choices(self.actions, self.weights)[0]
+        if random.random() < self.args.telegram_share:
+            update_id = next(self.update_ids)
+            update = {'update_id': update_id, 'callback_query': {
+                'id': f'sim{update_id}', 'from': {'id': robot.user.telegram_id}, 'data': f'ctl:{robot.id}:{action}',
+            }}
+            status, headers, _ = await self.client.request(
+                'POST', '/telegram-bot/', self.webhook_headers, json.dumps(update).encode('utf-8'))
+            return status, headers
+        status, headers, payload = await self.client.request(
+            'POST', f'/robots/{robot.id}/control',
+            self.auth(robot.user, **{'Content-Type': 'application/json', 'Idempotency-Key': uuid.uuid4().hex}),
+            json.dumps({'action': action}).encode('utf-8'))
+        if status == 200:
+            robot.task = json.loads(payload).get('current_task') or robot.task
+        return status, headers
+
+    async def progress(self) -> None:
+        started, sent = time.monotonic(), 0
+        while True:
+            await asyncio.sleep(self.args.progress_seconds)
+            total = self.stats.sent()
+            print(f'{time.monotonic() - started:6.0f} s  {(total - sent) / self.args.progress_seconds:8,.0f} req/s  '
+                  f'in flight {self.pending:,}  skipped {sum(self.stats.skipped.values()):,}', flush=True)
+            sent = total
+
+
+def parse_mix(value: str) -> dict:
+    """'start:3,pause:1,stop:2' → {'start': 3.0, ...}"""
+    mix = {}
+    for item in value.split(','):
+        action, _, weight = item.strip().partition(':')
+        if action not in ('start', 'pause', 'stop'):
+            raise argparse.ArgumentTypeError(f'unknown action {action!r}, expected start, pause or stop')
+        mix[action] = float(weight or 1)
+    return mix
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='tools/gateway.py base URL')
+    parser.add_argument('--robots', type=int, default=1000, help='fleet size')
+    parser.add_argument('--setup', action='store_true', help='recreate fleet-sim users and robots first')
+    parser.add_argument('--cleanup', action='store_true', help='delete fleet-sim users, their robots and robot data, and exit')
+    parser.add_argument('--duration', type=float, default=60, help='seconds of load')
+    parser.add_argument('--report-seconds', type=float, default=30, help='how often each robot reports')
+    parser.add_argument('--online-users', type=float, default=0.05, help='share of owners polling the robot list')
+    parser.add_argument('--poll-seconds', type=float, default=10, help='how often an online owner polls')
+    parser.add_argument('--command-rate', type=float, default=5, help='commands per second over the whole fleet')
+    parser.add_argument('--command-mix', type=parse_mix, default=parse_mix('start:3,pause:1,stop:2'))
+    parser.add_argument('--telegram-share', type=float, default=0.3, help='share of commands sent through the bot webhook')
+    parser.add_argument('--webhook-secret', default=os.environ.get('TELEGRAM_WEBHOOK_SECRET'))
+    parser.add_argument('--connections', type=int, default=64, help='keep-alive connections to the gateway')
+    parser.add_argument('--timeout', type=float, default=30, help='per-request timeout, seconds')
+    parser.add_argument('--progress-seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        if args.cleanup:
+            cleanup(conn)
+            return
+        if args.setup:
+            setup(conn, args.robots)
+        robots = load_fleet(conn, args.robots)
+    finally:
+        conn.close()
+    if not robots:
+        sys.exit('no fleet-sim robots, run with --setup first')
+
+    print(f'{len(robots):,} robots: ~{len(robots) / args.report_seconds:,.0f} reports/s, '
+          f'{args.command_rate:g} commands/s for {args.duration:g} s against {args.url}')
+    simulator = Simulator(args, robots)
+    try:
+        asyncio.run(simulator.run())
+    except KeyboardInterrupt:
+        pass
+    print_table(*simulator.stats.table())
+
+
+if __name__ == '__main__':
+    main()
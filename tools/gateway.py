@@ -0,0 +1,272 @@
+"""Локальный шлюз: все backend-функции в одном asyncio HTTP-сервере
+
+Функции загружаются один раз при старте и монтируются по имени:
+/auth/*, /robots/*, /telegram-auth/*, /telegram-bot/*. HTTP-запрос переводится в event
+облачного рантайма, синхронный handler выполняется в ограниченном пуле потоков, а асинхронный
+(--async-robots монтирует async_index.handler на /robots) — прямо в цикле событий шлюза.
+Если handler вернул телом итератор bytes (event.requestContext.streaming), ответ уходит
+chunked-кодированием по мере готовности кусков.
+
+Запуск: python tools/gateway.py --port 8000 --workers 16
+"""
+import argparse
+import asyncio
+import base64
+import importlib.util
+import inspect
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from types import SimpleNamespace
+from urllib.parse import parse_qsl, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FUNCTIONS = {
+    'auth': 'backend/auth',
+    'robots': 'backend/robots',
+    'telegram-auth': 'backend/extensions/telegram-bot/telegram-auth',
+    'telegram-bot': 'backend/extensions/telegram-bot/telegram-bot',
+}
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 6 * 1024 * 1024
+KEEP_ALIVE_SECONDS = 15
+
+
+def load_function(name: str, relative_path: str, entry: str = 'index'):
+    """Импортировать entry.py функции (index.py) с собственными копиями соседних модулей"""
+    path = os.path.join(ROOT, relative_path)
+    before = set(sys.modules)
+    sys.path.insert(0, path)
+    try:
+        spec = importlib.util.spec_from_file_location(f'function_{name.replace("-", "_")}', os.path.join(path, f'{entry}.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(path)
+        # Соседние модули (serializer, responses, ...) у каждой функции свои:
+        # убираем их из кеша, чтобы следующая функция импортировала собственные копии.
+        for module_name in set(sys.modules) - before:
+            module_file = getattr(sys.modules[module_name], '__file__', None) or ''
+            if module_file.startswith(path + os.sep):
+                del sys.modules[module_name]
+    return module.handler
+
+
+def load_functions(names: list, entries: dict = None) -> dict:
+    """Загрузить функции (entries: имя → модуль вместо index); недоступные из-за зависимостей пропускаются"""
+    handlers = {}
+    for name in names:
+        try:
+            handlers[name] = load_function(name, FUNCTIONS[name], (entries or {}).get(name, 'index'))
+        except Exception as e:
+            print(f'skip {name}: {e}', file=sys.stderr)
+    return handlers
+
+
+def build_event(method: str, target: str, headers: dict, body: bytes, peer: str):
+    """HTTP-запрос → (имя функции, event облачного рантайма)"""
+    url = urlsplit(target)
+    segments = [segment for segment in url.path.split('/') if segment]
+    if not segments:
+        return None, None
+    function, rest = segments[0], segments[1:]
+
+    event_headers = dict(headers)
+    # Рантайм передаёт Authorization в функции как X-Authorization.
+    for key, value in headers.items():
+        if key.lower() == 'authorization':
+            event_headers['X-Authorization'] = value
+
+    try:
+        event_body, is_base64 = body.decode('utf-8'), False
+    except UnicodeDecodeError:
+        event_body, is_base64 = base64.b64encode(body).decode('ascii'), True
+
+    path_params = {}
+    if rest and rest[0].isdigit():
+        path_params['id'] = rest[0]
+
+    event = {
+        'httpMethod': method,
+        'headers': event_headers,
+        'queryStringParameters': dict(parse_qsl(url.query, keep_blank_values=True)),
+        'params': {'path': '/' + '/'.join(rest) if rest else ''},
+        'pathParams': path_params,
+        'body': event_body,
+        'isBase64Encoded': is_base64,
+        'requestContext': {
+            'requestId': str(uuid.uuid4()),
+            'identity': {'sourceIp': peer},
+            # Шлюз умеет отдавать тело-итератор кусков байтов chunked-ответом.
+            'streaming': True,
+        },
+    }
+    return function, event
+
+
+class Gateway:
+    """HTTP/1.1 сервер с keep-alive поверх asyncio.start_server"""
+
+    def __init__(self, handlers: dict, workers: int, queue: int):
+        self.handlers = handlers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='handler')
+        self.slots = asyncio.Semaphore(workers + queue)
+
+    async def serve(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.connection, host, port, limit=MAX_HEADER_BYTES)
+        mounted = ', '.join(f'/{name}' for name in self.handlers)
+        print(f'gateway on http://{host}:{port} ({mounted})')
+        async with server:
+            await server.serve_forever()
+
+    async def connection(self, reader, writer) -> None:
+        peer = (writer.get_extra_info('peername') or ('unknown',))[0]
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE_SECONDS)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                keep_alive = await self.request(head, reader, writer, peer)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def request(self, head: bytes, reader, writer, peer: str) -> bool:
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ', 2)
+        except ValueError:
+            self.write(writer, 400, {}, b'', False)
+            return False
+
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip()] = value.strip()
+        lower = {key.lower(): value for key, value in headers.items()}
+
+        connection = lower.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+        if 'chunked' in lower.get('transfer-encoding', '').lower():
+            self.write(writer, 411, {}, b'', False)
+            return False
+        length = int(lower.get('content-length') or 0)
+        if length > MAX_BODY_BYTES:
+            self.write(writer, 413, {}, b'', False)
+            return False
+        body = await reader.readexactly(length) if length else b''
+
+        function, event = build_event(method, target, headers, body, peer)
+        handler = self.handlers.get(function)
+        if handler is None:
+            self.write(writer, 404, {'Content-Type': 'application/json'}, b'{"error":"Function not found"}', keep_alive)
+            return keep_alive
+
+        if self.slots.locked():
+            self.write(writer, 503, {'Retry-After': '1'}, b'', keep_alive)
+            return keep_alive
+
+        async with self.slots:
+            context = SimpleNamespace(request_id=event['requestContext']['requestId'], function_name=function)
+            started = time.perf_counter()
+            try:
+                if inspect.iscoroutinefunction(handler):
+                    response = await handler(event, context)
+                else:
+                    response = await asyncio.get_running_loop().run_in_executor(self.pool, handler, event, context)
+            except Exception as e:
+                print(f'{function}: unhandled {e!r}', file=sys.stderr)
+                response = {'statusCode': 502, 'body': ''}
+            elapsed = time.perf_counter() - started
+
+            response_headers = dict(response.get('headers') or {})
+            timing = f'handler;dur={elapsed * 1000:.2f}'
+            if response_headers.get('Server-Timing'):
+                timing = f"{response_headers['Server-Timing']}, {timing}"
+            response_headers['Server-Timing'] = timing
+            raw = response.get('body') or ''
+            if not isinstance(raw, str):
+                # Поток держит слот до конца: через него идут соединение с БД и поток пула.
+                return await self.stream(writer, int(response.get('statusCode', 200)), response_headers, raw, keep_alive)
+
+        payload = base64.b64decode(raw) if response.get('isBase64Encoded') else raw.encode('utf-8')
+        self.write(writer, int(response.get('statusCode', 200)), response_headers, payload, keep_alive)
+        return keep_alive
+
+    async def stream(self, writer, status: int, headers: dict, chunks, keep_alive: bool) -> bool:
+        """Отдать итератор кусков chunked-ответом; следующий кусок готовится в пуле потоков"""
+        loop = asyncio.get_running_loop()
+        headers['Transfer-Encoding'] = 'chunked'
+        self.write(writer, status, headers, None, keep_alive)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(self.pool, next, chunks, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                    # Ждём клиента, чтобы медленный получатель не копил выгрузку в памяти шлюза.
+                    await writer.drain()
+            writer.write(b'0\r\n\r\n')
+            return keep_alive
+        except ConnectionError:
+            raise
+        except Exception as e:
+            # Заголовки уже ушли: оборвать ответ без завершающего куска, чтобы клиент увидел ошибку.
+            print(f'stream: unhandled {e!r}', file=sys.stderr)
+            return False
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                await loop.run_in_executor(self.pool, close)
+
+    @staticmethod
+    def write(writer, status: int, headers: dict, body, keep_alive: bool) -> None:
+        try:
+            reason = HTTPStatus(status).phrase
+        except ValueError:
+            reason = ''
+        lines = [f'HTTP/1.1 {status} {reason}']
+        for key, value in headers.items():
+            if key.lower() not in ('content-length', 'connection'):
+                lines.append(f'{key}: {value}')
+        if body is not None:
+            lines.append(f'Content-Length: {len(body)}')
+        lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b''))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=16, help='threads running handlers')
+    parser.add_argument('--queue', type=int, default=64, help='requests waiting for a thread before 503')
+    parser.add_argument('--functions', default=','.join(FUNCTIONS), help='comma-separated functions to mount')
+    parser.add_argument('--async-robots', action='store_true', help='serve /robots with async_index.handler on the event loop')
+    args = parser.parse_args()
+
+    entries = {'robots': 'async_index'} if args.async_robots else {}
+    handlers = load_functions([name for name in args.functions.split(',') if name], entries)
+    if not handlers:
+        sys.exit('no functions could be loaded')
+    try:
+        asyncio.run(Gateway(handlers, args.workers, args.queue).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""Обслуживание журнала robot_events: месячные секции и перепроигрывание событий
+
+partitions создаёт секции на текущий и следующие месяцы; события, уже попавшие в секцию
+по умолчанию, переносятся в новую секцию в той же транзакции. Запускать раз в месяц
+(по cron), чтобы запись всегда шла в готовые секции.
+
+replay <model> сворачивает весь журнал в read model. События читаются серверным курсором
+по порядку (robot_id, id): события одного робота идут подряд, поэтому в памяти только
+состояние текущего робота и пачка результатов, сколько бы событий ни было. Порядок id
+внутри робота совпадает с порядком изменений: запись события идёт после UPDATE строки
+robots, который держит блокировку до коммита.
+
+  robots         состояние robots из событий; без --apply только сверка с таблицей
+  cleaning_daily секунды мойки и число моек по роботу и дню (UTC) в robot_cleaning_daily
+
+Новая read model — класс с методами event, robot_done и finish в PROJECTIONS.
+
+Запуск: DATABASE_URL=... MAIN_DB_SCHEMA=... python tools/robot_events.py partitions --months 3
+        DATABASE_URL=... MAIN_DB_SCHEMA=... python tools/robot_events.py replay robots [--apply]
+"""
+import argparse
+import os
+import sys
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend', 'robots'))
+import events  # noqa: E402
+
+FETCH_SIZE = 10_000
+BATCH_SIZE = 1_000
+SHOWN_DIFFS = 10
+
+STREAM_EVENTS = """SELECT robot_id, event_type, data, recorded_at
+FROM {schema}.robot_events
+ORDER BY robot_id, id"""
+
+FIND_PARTITION = 'SELECT to_regclass(%s)'
+
+CREATE_PARTITION = """CREATE TABLE {schema}.{name} (LIKE {schema}.robot_events INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"""
+
+MOVE_FROM_DEFAULT = """WITH moved AS (
+    DELETE FROM {schema}.robot_events_default WHERE recorded_at >= %s AND recorded_at < %s RETURNING *
+)
+INSERT INTO {schema}.{name} SELECT * FROM moved"""
+
+ATTACH_PARTITION = """ALTER TABLE {schema}.robot_events ATTACH PARTITION {schema}.{name} FOR VALUES FROM (%s) TO (%s)"""
+
+LOAD_ROBOTS = f"""SELECT id, {', '.join(events.STATE_FIELDS)} FROM {{schema}}.robots WHERE id = ANY(%s)"""
+
+UPDATE_ROBOTS = f"""UPDATE {{schema}}.robots r
+SET {', '.join(f'{field} = v.{field}' for field in events.STATE_FIELDS)}, updated_at = CURRENT_TIMESTAMP
+FROM (VALUES %s) AS v (id, {', '.join(events.STATE_FIELDS)})
+WHERE r.id = v.id"""
+
+ROBOT_TEMPLATE = ('(%s::integer, %s::integer, %s::varchar, %s::varchar, %s::boolean, %s::integer, '
+                  '%s::varchar, %s::varchar, %s::boolean, %s::integer, %s::boolean, %s::varchar)')
+
+CREATE_CLEANING_DAILY = """CREATE TABLE IF NOT EXISTS {schema}.robot_cleaning_daily (
+    robot_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    cleaning_seconds DOUBLE PRECISION NOT NULL,
+    runs INTEGER NOT NULL,
+    PRIMARY KEY (robot_id, day)
+)"""
+
+INSERT_CLEANING_DAILY = """INSERT INTO {schema}.robot_cleaning_daily (robot_id, day, cleaning_seconds, runs) VALUES %s"""
+
+
+def month_start(day: date) -> date:
+    """Первое число месяца"""
+    return day.replace(day=1)
+
+
+def next_month(month: date) -> date:
+    """Первое число следующего месяца"""
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def create_partitions(conn, schema: str, months: int) -> None:
+    """Секции robot_events на текущий и следующие months месяцев"""
+    cur = conn.cursor()
+    cur.execute("SET TIME ZONE 'UTC'")
+    month = month_start(datetime.now(timezone.utc).date())
+    for _ in range(months + 1):
+        name = f'robot_events_{month:%Y_%m}'
+        end = next_month(month)
+        cur.execute(FIND_PARTITION, (f'{schema}.{name}',))
+        if cur.fetchone()[0] is None:
+            cur.execute(CREATE_PARTITION.format(schema=schema, name=name))
+            cur.execute(MOVE_FROM_DEFAULT.format(schema=schema, name=name), (month, end))
+            moved = cur.rowcount
+            cur.execute(ATTACH_PARTITION.format(schema=schema, name=name), (month, end))
+            conn.commit()
+            print(f'{name}: created, {moved} events moved from robot_events_default')
+        else:
+            print(f'{name}: exists')
+        month = end
+    cur.close()
+
+
+class RobotState:
+    """Состояние robots из журнала; без apply только сверяет его с таблицей"""
+
+    def __init__(self, cur, schema: str, apply: bool):
+        self.cur = cur
+        self.schema = schema
+        self.apply = apply
+        self.state = None
+        self.batch = {}
+        self.stats = defaultdict(int)
+        self.diffs = []
+
+    def event(self, robot_id: int, event_type: str, data: dict, recorded_at: datetime) -> None:
+        if self.state is None:
+            # История без connected началась до журнала: восстановить робота из неё нельзя.
+            self.state = {'archived': False} if event_type == events.CONNECTED else False
+        if self.state is not False:
+            events.apply(self.state, data)
+
+    def robot_done(self, robot_id: int) -> None:
+        if self.state is False:
+            self.stats['partial history, skipped'] += 1
+        else:
+            self.batch[robot_id] = self.state
+        self.state = None
+        if len(self.batch) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        """Сверить пачку восстановленных роботов с таблицей и записать расхождения"""
+        if not self.batch:
+            return
+        self.cur.execute(LOAD_ROBOTS.format(schema=self.schema), (list(self.batch),))
+        current = {row[0]: dict(zip(events.STATE_FIELDS, row[1:])) for row in self.cur.fetchall()}
+        rows = []
+        for robot_id, state in self.batch.items():
+            row = current.get(robot_id)
+            if row is None:
+                self.stats['missing in robots'] += 1
+                continue
+            row['archived'] = bool(row['archived'])
+            changed = {field: (row[field], state.get(field)) for field in events.STATE_FIELDS if row[field] != state.get(field)}
+            if not changed:
+                self.stats['match'] += 1
+                continue
+            self.stats['differ'] += 1
+            if len(self.diffs) < SHOWN_DIFFS:
+                self.diffs.append((robot_id, changed))
+            rows.append((robot_id, *(state.get(field) for field in events.STATE_FIELDS)))
+        if self.apply and rows:
+            execute_values(self.cur, UPDATE_ROBOTS.format(schema=self.schema), rows, template=ROBOT_TEMPLATE)
+        self.batch = {}
+
+    def finish(self) -> None:
+        self.flush()
+        for robot_id, changed in self.diffs:
+            print(f'robot {robot_id}: ' + ', '.join(f'{field} {old!r} -> {new!r}' for field, (old, new) in changed.items()))
+        for name, count in sorted(self.stats.items()):
+            print(f'{name}: {count}')
+        if self.apply:
+            print(f"rebuilt {self.stats['differ']} robots")
+
+
+class CleaningDaily:
+    """Секунды мойки и число моек по роботу и дню; таблица пересобирается целиком"""
+
+    def __init__(self, cur, schema: str, apply: bool):
+        self.cur = cur
+        self.schema = schema
+        self.apply = apply
+        self.started = None
+        self.days = defaultdict(lambda: [0.0, 0])
+        self.rows = []
+        self.total = 0
+        if apply:
+            cur.execute(CREATE_CLEANING_DAILY.format(schema=schema))
+            cur.execute(f'TRUNCATE {schema}.robot_cleaning_daily')
+
+    def event(self, robot_id: int, event_type: str, data: dict, recorded_at: datetime) -> None:
+        task = data.get('current_task')
+        if task == 'cleaning' and self.started is None:
+            self.started = recorded_at
+            self.days[recorded_at.astimezone(timezone.utc).date()][1] += 1
+        elif task is not None and task != 'cleaning' and self.started is not None:
+            self.add_interval(self.started, recorded_at)
+            self.started = None
+
+    def add_interval(self, start: datetime, end: datetime) -> None:
+        """Разложить интервал мойки по дням UTC"""
+        start, end = start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+        while start < end:
+            day_end = datetime.combine(start.date() + timedelta(days=1), time.min, tzinfo=timezone.utc)
+            chunk_end = min(end, day_end)
+            self.days[start.date()][0] += (chunk_end - start).total_seconds()
+            start = chunk_end
+
+    def robot_done(self, robot_id: int) -> None:
+        if self.started is not None:
+            self.add_interval(self.started, datetime.now(timezone.utc))
+            self.started = None
+        self.rows.extend((robot_id, day, seconds, runs) for day, (seconds, runs) in self.days.items())
+        self.days.clear()
+        if len(self.rows) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.apply and self.rows:
+            execute_values(self.cur, INSERT_CLEANING_DAILY.format(schema=self.schema), self.rows)
+        self.total += len(self.rows)
+        self.rows = []
+
+    def finish(self) -> None:
+        self.flush()
+        print(f'{self.total} robot-days' + (' written to robot_cleaning_daily' if self.apply else ''))
+
+
+PROJECTIONS = {
+    'robots': RobotState,
+    'cleaning_daily': CleaningDaily,
+}
+
+
+def replay(conn, schema: str, projection) -> int:
+    """Прогнать журнал через projection серверным курсором; число событий"""
+    count = 0
+    robot_id = None
+    with conn.cursor(name='robot_events_replay') as stream:
+        stream.itersize = FETCH_SIZE
+        stream.execute(STREAM_EVENTS.format(schema=schema))
+        for event_robot_id, event_type, data, recorded_at in stream:
+            if event_robot_id != robot_id:
+                if robot_id is not None:
+                    projection.robot_done(robot_id)
+                robot_id = event_robot_id
+            projection.event(robot_id, event_type, data, recorded_at)
+            count += 1
+    if robot_id is not None:
+        projection.robot_done(robot_id)
+    projection.finish()
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    partitions = commands.add_parser('partitions', help='create monthly partitions ahead')
+    partitions.add_argument('--months', type=int, default=2, help='months after the current one')
+    replay_parser = commands.add_parser('replay', help='fold the event log into a read model')
+    replay_parser.add_argument('model', choices=sorted(PROJECTIONS))
+    replay_parser.add_argument('--apply', action='store_true', help='write the result instead of only reporting it')
+    args = parser.parse_args()
+
+    schema = os.environ.get('MAIN_DB_SCHEMA')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        if args.command == 'partitions':
+            create_partitions(conn, schema, args.months)
+            return
+        cur = conn.cursor()
+        count = replay(conn, schema, PROJECTIONS[args.model](cur, schema, args.apply))
+        cur.close()
+        print(f'{count} events replayed')
+        if args.apply:
+            conn.commit()
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
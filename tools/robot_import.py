@@ -0,0 +1,59 @@
+"""Заводская регистрация роботов из CSV/NDJSON (serial_number, model, owner, name)
+
+Тот же импорт, что у POST /import функции robots (backend/robots/provisioning.py): COPY во
+временную таблицу и слияние с robots по serial_number. Инструмент служебный: владельцем
+может быть любой пользователь (email или id), лимиты парков не проверяются.
+
+Запуск: DATABASE_URL=... MAIN_DB_SCHEMA=... python tools/robot_import.py robots.csv [--org-id 7] [--dry-run]
+"""
+import argparse
+import os
+import sys
+
+import psycopg2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend', 'robots'))
+import provisioning  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('file', help='CSV or NDJSON file, - for stdin')
+    parser.add_argument('--format', choices=sorted(provisioning.READERS), help='default: by file extension, else csv')
+    parser.add_argument('--org-id', type=int, help='register the robots in this organization')
+    parser.add_argument('--owner', help='email or user id for rows without owner')
+    parser.add_argument('--members-only', action='store_true', help='reject owners outside --org-id')
+    parser.add_argument('--dry-run', action='store_true', help='report without writing')
+    args = parser.parse_args()
+
+    fmt = args.format or ('ndjson' if args.file.endswith(('.ndjson', '.jsonl')) else 'csv')
+    source = sys.stdin if args.file == '-' else open(args.file, encoding='utf-8', newline='')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        records = provisioning.READERS[fmt](source)
+        cur = conn.cursor()
+        report = provisioning.import_robots(
+            cur, records, None, org_id=args.org_id, default_owner=args.owner,
+            members_only=args.members_only and args.org_id is not None
+        )
+        cur.close()
+        if args.dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except ValueError as e:
+        sys.exit(str(e))
+    finally:
+        conn.close()
+        if source is not sys.stdin:
+            source.close()
+
+    for error in report['errors']:
+        print(f"line {error['line']} ({error['serial_number'] or '-'}): {error['error']}", file=sys.stderr)
+    print(f"{report['rows']} rows: {report['created']} created, {report['updated']} updated, {report['failed']} failed"
+          + (' (dry run)' if args.dry_run else ''))
+
+
+if __name__ == '__main__':
+    main()
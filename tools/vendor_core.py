@@ -0,0 +1,138 @@
+"""Копирование общего ядра backend/core в каталоги функций
+
+Функции деплоятся каталогами без сборки пакетов, поэтому модули ядра (пул БД и маршрутизация
+на реплики, построение ответов, проверка JWT, лимиты, Server-Timing, предохранители) лежат копиями рядом
+с index.py каждой функции. Править нужно только backend/core/*.py и затем запускать скрипт
+перед деплоем. Функция получает лишь нужные ей модули (FUNCTIONS) вместе с теми модулями
+ядра, которые они импортируют, чтобы не платить за лишние импорты на холодном старте.
+
+--check ничего не пишет и завершается с кодом 1, если копия устарела, лишняя
+или в requirements.txt функции нет зависимости модуля ядра (для CI).
+
+Запуск: python tools/vendor_core.py [--check]
+"""
+import argparse
+import ast
+import os
+import re
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORE = os.path.join(ROOT, 'backend', 'core')
+
+FUNCTIONS = {
+    'backend/robots': ('dbrouter', 'instrumentation', 'ratelimit', 'responses', 'serializer', 'tokens'),
+    'backend/auth': ('dbrouter', 'ratelimit', 'responses', 'serializer', 'tokens'),
+    'backend/extensions/telegram-bot/telegram-auth': ('dbrouter', 'responses', 'tokens'),
+    'backend/extensions/telegram-bot/telegram-bot': ('dbrouter', 'instrumentation', 'responses', 'tokens'),
+}
+
+# Обязательные пакеты модулей ядра; orjson, Brotli и redis подключаются, только если установлены.
+REQUIREMENTS = {
+    'dbrouter': 'psycopg2-binary',
+    'tokens': 'PyJWT',
+}
+
+HEADER = '# Копия backend/core/{name}.py: правьте оригинал и запускайте tools/vendor_core.py\n'
+
+
+def core_modules() -> list:
+    """Имена модулей ядра"""
+    return sorted(name[:-3] for name in os.listdir(CORE) if name.endswith('.py'))
+
+
+def core_imports(name: str, modules: list) -> set:
+    """Модули ядра, которые импортирует модуль name"""
+    with open(os.path.join(CORE, f'{name}.py'), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    found = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            found.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            found.add(node.module)
+    return found & set(modules)
+
+
+def closure(names: tuple, modules: list) -> list:
+    """Модули names и все модули ядра, которые они импортируют"""
+    result, pending = set(), list(names)
+    while pending:
+        name = pending.pop()
+        if name not in result:
+            result.add(name)
+            pending.extend(core_imports(name, modules))
+    return sorted(result)
+
+
+def vendored(name: str) -> str:
+    """Текст копии модуля ядра"""
+    with open(os.path.join(CORE, f'{name}.py'), encoding='utf-8') as f:
+        return HEADER.format(name=name) + f.read()
+
+
+def read(path: str):
+    """Содержимое файла или None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def requirement_names(path: str) -> set:
+    """Имена пакетов из requirements.txt в нижнем регистре"""
+    names = set()
+    for line in (read(path) or '').splitlines():
+        match = re.match(r'[A-Za-z0-9_.-]+', line.strip())
+        if match:
+            names.add(match.group().lower())
+    return names
+
+
+def sync(check: bool) -> list:
+    """Привести копии к ядру; список проблем (при check — вместо записи)"""
+    modules = core_modules()
+    problems = []
+    for function, names in FUNCTIONS.items():
+        directory = os.path.join(ROOT, function)
+        wanted = closure(names, modules)
+        for name in wanted:
+            path = os.path.join(directory, f'{name}.py')
+            text = vendored(name)
+            if read(path) == text:
+                continue
+            if check:
+                problems.append(f'{function}/{name}.py differs from backend/core/{name}.py')
+            else:
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                print(f'{function}/{name}.py updated')
+        for name in sorted(set(modules) - set(wanted)):
+            path = os.path.join(directory, f'{name}.py')
+            if (read(path) or '').startswith(HEADER.format(name=name)):
+                if check:
+                    problems.append(f'{function}/{name}.py is vendored but not used, remove it')
+                else:
+                    os.remove(path)
+                    print(f'{function}/{name}.py removed')
+        installed = requirement_names(os.path.join(directory, 'requirements.txt'))
+        for name in wanted:
+            package = REQUIREMENTS.get(name)
+            if package and package.lower() not in installed:
+                problems.append(f'{function}/requirements.txt lacks {package} needed by {name}')
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--check', action='store_true', help='only report stale copies, exit 1 if any')
+    args = parser.parse_args()
+    problems = sync(args.check)
+    for problem in problems:
+        print(problem)
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()